@@ -36,11 +36,25 @@ class AppState(dict):
         self["xtol"] = 1e-15
         self["gtol"] = 1e-8
         self["diff_step"] = 1e-3
+        self["jac_method"] = "2-point"  # Finite differences ("2-point", "3-point") or "analytic" (symbolic derivatives)
         self["max_nfev"] = 1000
+        self["multistart_n"] = 1  # Number of starting points for trf/dogbox (1: single run from initial values)
+        self["multistart_workers"] = 0  # Worker processes for multi-start (0: one per CPU core)
+        self["progress_rate"] = 10  # Max number of optimization progress updates per second
+        self["de_workers"] = 1  # Processes for differential evolution, if it cannot evaluate the population at once
         self["weight_mag"] = 0.01
         self["weight_amp"] = 0.01
         self["weight_phase"] = 0.01
         self["weight_reg"] = 0.01
+        self["mc_samples"] = 10000  # Number of samples of the Monte Carlo analysis
+        self["mc_tolerance"] = 0.0  # Default relative tolerance of the elements without tol= argument
+        self["mc_distribution"] = "uniform"  # "uniform" or "gaussian" (tolerance is 3 sigma)
+        self["mc_percentiles"] = [5, 50, 95]  # Percentiles of the Monte Carlo bands
+        self["mc_mask_mag"] = 1.0  # Max magnitude error to the target (dB or linear) for the Monte Carlo yield
+        self["mc_mask_phase"] = 0.0  # Max phase error to the target (degrees) for the yield, 0 to ignore phase
+        self["mc_numeric_max_samples"] = 1000  # Max Monte Carlo samples with the numeric solver (one solve per sample)
+        self["mc_show_bands"] = True  # Plot the Monte Carlo bands
+        self["sens_show_plot"] = True  # Plot the sensitivities over frequency with the sensitivity table
 
         self["linestyle_original"] = ".--"
         self["linecolor_original"] = "green"
@@ -64,10 +78,23 @@ class AppState(dict):
         self["netlist_optimized"] = ""
         self["parse_while_typing"] = True
         self["solve_while_typing"] = True
+        self["parse_debounce"] = 0.3  # Seconds without typing before parsing the netlist while typing
         self["simplify_after_solve"] = False
+        self["solve_cache"] = False  # Keep symbolic solutions on disk, to reuse them on the next run (pickle files)
+        self["solve_cache_max_mb"] = 200  # Size limit of the solve cache, least recently used entries are removed
+        self["solve_isolated"] = False  # Symbolic solve in a child process, that can be stopped (see IsolatedSolver)
+        self["solve_timeout"] = 600  # Time limit of the isolated solve in seconds (0: no limit)
+        self["solve_memory_mb"] = 4096  # Memory limit of the isolated solve in MB (0: no limit, ignored on Windows)
+        self["solver_mode"] = "symbolic"  # "symbolic" (sp.linsolve), "cramer" (only the output), "numeric" (NumPy) or "auto"
+        self["solve_auto_threshold"] = 30  # Predicted symbolic solve time in seconds over which "auto" solves numerically
+        self["sparse_threshold"] = 100  # Numeric solver uses sparse LU above this number of nodes
+        self["compile_cse"] = False  # Common subexpression elimination before compiling transfer functions
+        self["sweep_product"] = True  # Sweep all combinations of the element values, or the lists in parallel
+        self["compile_mode"] = "vectorized"  # "vectorized", "rational" (polynomial coefficients) or "subs" (per frequency)
 
         # Attributes that are arrays must be handled  with care
         self["pztable"] = []
+        self["sweep"] = {}  # Batch mode: element name -> values (list or start/stop/num/log), see Batch.py
         self["minval"] = {"R": 1e-9, "L": 1e-9, "C": 10e-15, "E": 1e-6, "F": 1e-6, "G": 1e-6, "H": 1e-6, "K": 0, "T": 0}
         self["maxval"] = {"R": 1e9,  "L": 1,    "C": 1,      "E": 1e6,  "F": 1e6,  "G": 1e6,  "H": 1e6, "K": 1, "T": 1e6}
 
@@ -0,0 +1,213 @@
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from AppState import AppState
+from Engine import Engine
+
+# Batch mode for many state files
+#
+# Each state file is a job: parse -> solve -> optimize, run in a process pool.
+# The result of each job is written as one JSON line (JSONL), so that it can be
+# read by other tools without parsing the text output of the engine:
+#
+#   {"statefile": "filter1.json", "status": "ok", "exit_code": 0, "message": "...",
+#    "values": {"R1": 1000.0, ...}, "makeup_gain": 1.0, "resnorm": 12.3, "iterations": 42,
+#    "timings": {"parse": 0.01, "solve": 0.52, "optimize": 3.1}, "netlist_optimized": "..."}
+#
+# status and exit_code are the same as the exit codes of the single-file batch mode:
+# ok (0), parser_error (1), solver_error (2), optimizer_error (3), and load_error (1)
+# if the state file cannot be read. If the job fails unexpectedly, or its record cannot
+# be written as JSON (e.g. an infinite value), the line is an error record (4).
+#
+# If the state file has a "sweep" entry, the circuit is not optimized. Instead, the
+# frequency response is evaluated for a grid of element values (see Engine.sweep),
+# and saved to <statefile>_sweep.npz. Each element of "sweep" is a list of values,
+# or a range {"start": 1e3, "stop": 1e6, "num": 100, "log": true}:
+#
+#   "sweep": {"R1": {"start": 1e3, "stop": 1e6, "num": 100}, "C1": [1e-12, 2.2e-12, 4.7e-12]}
+
+def expand_statefiles(patterns: list) -> list:
+    """ Expand glob patterns, keeping the order. Patterns without matches are kept as file names. """
+
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        files.extend(matches if matches else [pattern])
+    return files
+
+
+def get_sweep_values(spec) -> np.ndarray:
+    """ Values of one swept element: a list, or a dict with start, stop, num and log (default true) """
+
+    if isinstance(spec, dict):
+        if spec.get("log", True):
+            return np.logspace(np.log10(spec["start"]), np.log10(spec["stop"]), int(spec["num"]))
+        else:
+            return np.linspace(spec["start"], spec["stop"], int(spec["num"]))
+    return np.asarray(spec, dtype=float)
+
+
+def run_sweep(engine: Engine, statefile: str):
+    """
+    Run the sweep defined in the state of a solved engine, and save it to <statefile>_sweep.npz,
+    with the frequency axis (f), the responses (b, n_points x 2 x npoints) and the value of each element.
+
+    Returns:
+        Tuple (npz file name, number of points), or None if the sweep is not valid
+    """
+
+    sweep_vals = {key: get_sweep_values(spec) for key, spec in engine.app_state.sweep.items()}
+    result = engine.sweep(sweep_vals, product=engine.app_state.sweep_product)
+    if result is None:
+        return None
+
+    points, b = result
+    filename = os.path.splitext(statefile)[0] + "_sweep.npz"
+    np.savez(filename, f=engine.get_f_axis(), b=b, **points)
+    return filename, b.shape[0]
+
+
+def json_default(obj):
+    """ Convert the NumPy values of a record for json.dumps """
+
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError("{} is not JSON serializable".format(type(obj).__name__))
+
+
+def run_batch_job(statefile: str, debug: bool = False, solve_timeout: float = 0) -> dict:
+    """
+    Load a state file, and run parse, solve and optimize on it.
+    If solve_timeout > 0, the symbolic solve runs in a child process killed after solve_timeout seconds.
+
+    Returns:
+        Dict with the results of the job (one record of the JSONL output)
+    """
+
+    record = {"statefile": statefile, "status": "ok", "exit_code": 0, "message": "",
+              "values": None, "makeup_gain": None, "resnorm": None, "iterations": None,
+              "timings": {}, "spans": None, "solve_prediction": None, "netlist_optimized": None}
+
+    app_state = AppState()
+    app_state._debug = debug
+    app_state._batch_mode = True
+
+    try:
+        app_state.load(statefile)
+    except (IOError, ValueError) as error:
+        record.update(status="load_error", exit_code=1, message=str(error))
+        return record
+
+    if solve_timeout > 0:
+        app_state.solve_isolated = True
+        app_state.solve_timeout = solve_timeout
+
+    engine = Engine(app_state, lambda s, event_type: None)
+
+    # Engine messages are not mixed with the JSON output, only the last one is kept
+    stdout = io.StringIO() if not debug else sys.stderr
+    with contextlib.redirect_stdout(stdout):
+        start_time = time.perf_counter()
+        parser_status = engine.parse(app_state.netlist)
+        record["timings"]["parse"] = time.perf_counter() - start_time
+
+        if not parser_status:
+            record.update(status="parser_error", exit_code=1, message=engine.status_msg)
+            return record
+
+        start_time = time.perf_counter()
+        solver_status = engine.solve()
+        record["timings"]["solve"] = time.perf_counter() - start_time
+        record["solve_prediction"] = engine.solve_prediction
+
+        if not solver_status:
+            record.update(status="solver_error", exit_code=2, message=engine.status_msg)
+            return record
+
+        if app_state.sweep:
+            start_time = time.perf_counter()
+            sweep_result = run_sweep(engine, statefile)
+            record["timings"]["sweep"] = time.perf_counter() - start_time
+
+            if sweep_result is None:
+                record.update(status="sweep_error", exit_code=3, message=engine.status_msg)
+            else:
+                record["sweep_file"], record["sweep_points"] = sweep_result
+                record["message"] = engine.status_msg
+            return record
+
+        start_time = time.perf_counter()
+        optimize_status = engine.optimize()
+        record["timings"]["optimize"] = time.perf_counter() - start_time
+
+    record["message"] = engine.status_msg
+    record["spans"] = engine.get_timings()
+
+    if not optimize_status:
+        record.update(status="optimizer_error", exit_code=3)
+        return record
+
+    record["values"] = {key: float(val) for key, val in engine.optimized_vals.items()}
+    record["makeup_gain"] = float(engine.makeup_gain)
+    record["resnorm"] = float(engine.resnorm) if engine.resnorm is not None else None
+    record["iterations"] = engine.iteration
+    record["netlist_optimized"] = engine.generate(engine.optimized_vals)
+
+    return record
+
+
+def run_batch(statefiles: list, jobs: int = 0, output: str = "", debug: bool = False, solve_timeout: float = 0) -> int:
+    """
+    Run all the state files in a process pool, writing one JSON line per job.
+
+    Arguments:
+        statefiles: List of state files (or glob patterns)
+        jobs: Number of worker processes (0: one per CPU core)
+        output: JSONL output file, standard output if empty
+        debug: Print engine messages (to stderr)
+        solve_timeout: Time limit of the symbolic solve of each job in seconds (0: no limit, solve in the job process)
+
+    Returns:
+        Exit code, the highest exit code of all jobs
+    """
+
+    statefiles = expand_statefiles(statefiles)
+    if jobs <= 0:
+        jobs = os.cpu_count()
+
+    out_file = open(output, "w") if output else sys.stdout
+    exit_code = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(statefiles))) as executor:
+            futures = {executor.submit(run_batch_job, statefile, debug, solve_timeout): statefile for statefile in statefiles}
+
+            for n, future in enumerate(as_completed(futures)):
+                try:
+                    record = future.result()
+                    line = json.dumps(record, default=json_default, allow_nan=False)
+                except Exception as error:
+                    record = {"statefile": futures[future], "status": "error", "exit_code": 4, "message": str(error)}
+                    line = json.dumps(record)
+
+                out_file.write(line + "\n")
+                out_file.flush()
+
+                if output:
+                    print("[{}/{}] {}: {}".format(n + 1, len(statefiles), record["statefile"], record["status"]))
+
+                exit_code = max(exit_code, record["exit_code"])
+    finally:
+        if output:
+            out_file.close()
+
+    return exit_code
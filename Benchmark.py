@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+
+from AppState import AppState
+from Engine import Engine
+from NetlistGenerator import GENERATORS
+
+# Benchmark of the hot paths of the engine
+#
+# Runs every test_netlists/*.json and synthetic circuits of growing size
+# (see NetlistGenerator), and times each phase separately:
+#
+#   parse, solve, build_output_expr, compile (prepare_optimize, where the transfer
+#   function and its jacobian are compiled), resfun (one call), optimize (full
+#   optimization) and plot (frequency responses computed by update_plots)
+#
+# Each case is run `warmup` times without timing and `repeat` times timed, with a
+# new Engine and the solve cache disabled. The median and minimum of each phase
+# are written as JSON. With --baseline, the results are compared against a saved
+# JSON file and the phases slower than the threshold are reported (exit code 1).
+#
+# Usage:
+#   python Benchmark.py -o baseline.json
+#   python Benchmark.py -o new.json --baseline baseline.json --threshold 1.25
+
+PHASES = ["parse", "solve", "build_output_expr", "compile", "resfun", "optimize", "plot"]
+
+
+# Default sizes, the symbolic solver takes minutes for bigger circuits (use --sizes with --solver-mode numeric)
+SYNTHETIC_SIZES = {"rc_ladder": [2, 4, 6], "lc_ladder": [2, 4], "sallen_key": [1, 2, 3], "mfb": [1, 2, 3],
+                   "gmc_chain": [2, 4, 6], "coupled_inductors": [2], "balanced_ladder": [2, 4]}
+
+
+def get_cases(test_dir: str, sizes: list, synthetic: list) -> list:
+    """ List of (case name, app state). If sizes is empty, SYNTHETIC_SIZES are used. """
+
+    cases = []
+    for filename in sorted(glob.glob(os.path.join(test_dir, "*.json"))):
+        app_state = AppState()
+        try:
+            app_state.load(filename)
+        except (IOError, ValueError):
+            continue
+        cases.append((os.path.splitext(os.path.basename(filename))[0], app_state))
+
+    for name in synthetic:
+        for n in (sizes or SYNTHETIC_SIZES[name]):
+            cases.append(("{}_{}".format(name, n), GENERATORS[name](n)[0]))
+
+    return cases
+
+
+def time_case(app_state: AppState, resfun_calls: int, optimize: bool):
+    """
+    Run all the phases once on a new Engine.
+
+    Returns:
+        Dict phase -> time in seconds, or None if the circuit cannot be parsed or solved.
+        Phases after a failed one are missing.
+    """
+
+    engine = Engine(app_state, lambda s, event_type: None)
+    times = {}
+
+    start_time = time.perf_counter()
+    if not engine.parse(app_state.netlist):
+        return None
+    times["parse"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if not engine.solve():
+        return None
+    times["solve"] = time.perf_counter() - start_time
+
+    if engine.solver_mode != "numeric":
+        start_time = time.perf_counter()
+        engine.build_output_expr()
+        times["build_output_expr"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    engine.get_target_freqresponse()
+    engine.get_freqresponse(engine.h_initial)
+    times["plot"] = time.perf_counter() - start_time
+
+    if len(engine.elems_initial) == 0:
+        return times  # Nothing to optimize
+
+    start_time = time.perf_counter()
+    engine.prepare_optimize()
+    times["compile"] = time.perf_counter() - start_time
+
+    x = np.array(engine.x_initial)
+    start_time = time.perf_counter()
+    for _ in range(resfun_calls):
+        engine.resfun(x)
+    times["resfun"] = (time.perf_counter() - start_time) / resfun_calls
+
+    if optimize:
+        start_time = time.perf_counter()
+        engine.optimize()
+        times["optimize"] = time.perf_counter() - start_time
+
+    return times
+
+
+def run_case(app_state: AppState, repeat: int, warmup: int, resfun_calls: int, optimize: bool):
+    """
+    Returns:
+        Dict phase -> {"median", "min"} in seconds, or None if the case fails
+    """
+
+    app_state._batch_mode = True
+    app_state.solve_cache = False  # Measure the solver, not the disk cache
+
+    runs = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(warmup + repeat):
+            times = time_case(app_state, resfun_calls, optimize)
+            if times is None:
+                return None
+            if n >= warmup:
+                runs.append(times)
+
+    return {phase: {"median": float(np.median([run[phase] for run in runs])),
+                    "min": float(np.min([run[phase] for run in runs]))}
+            for phase in PHASES if phase in runs[0]}
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_time: float) -> list:
+    """
+    Phases slower than threshold times the baseline median. Phases faster than min_time
+    seconds in both runs are not compared, they are dominated by timer noise.
+
+    Returns:
+        List of (case, phase, baseline time, new time)
+    """
+
+    slower = []
+    for case, phases in results["cases"].items():
+        base_phases = baseline.get("cases", {}).get(case)
+        if not phases or not base_phases:
+            continue
+        for phase, t in phases.items():
+            if phase not in base_phases:
+                continue
+            t_new = t["median"]
+            t_base = base_phases[phase]["median"]
+            if max(t_new, t_base) >= min_time and t_new > threshold * t_base:
+                slower.append((case, phase, t_base, t_new))
+    return slower
+
+
+def print_table(results: dict, baseline: dict = None):
+    print("{:<24s}".format("case") + "".join("{:>18s}".format(phase) for phase in PHASES))
+    for case, phases in results["cases"].items():
+        line = "{:<24s}".format(case)
+        for phase in PHASES:
+            if phases is None or phase not in phases:
+                line += "{:>18s}".format("-")
+                continue
+            txt = "{:.4g}ms".format(1000 * phases[phase]["median"])
+            base_phases = (baseline or {}).get("cases", {}).get(case)
+            if base_phases and phase in base_phases and base_phases[phase]["median"] > 0:
+                txt += " x{:.2f}".format(phases[phase]["median"] / base_phases[phase]["median"])
+            line += "{:>18s}".format(txt)
+        print(line)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Benchmark of the parse, solve, compile, optimize and plot phases.")
+    arg_parser.add_argument('-o', '--output', help='Write results to this JSON file', default="")
+    arg_parser.add_argument('-b', '--baseline', help='Compare against a saved JSON file', default="")
+    arg_parser.add_argument('--threshold', help='Slowdown ratio reported as regression (default: 1.25)',
+                            type=float, default=1.25)
+    arg_parser.add_argument('--min-time', help='Ignore phases faster than this, in seconds (default: 0.001)',
+                            type=float, default=1e-3)
+    arg_parser.add_argument('-r', '--repeat', help='Timed repetitions of each case (default: 3)', type=int, default=3)
+    arg_parser.add_argument('-w', '--warmup', help='Untimed runs before the timed ones (default: 1)',
+                            type=int, default=1)
+    arg_parser.add_argument('--resfun-calls', help='Calls to resfun per repetition (default: 100)',
+                            type=int, default=100)
+    arg_parser.add_argument('--sizes', help='Sizes of the synthetic circuits (default: depends on the circuit)',
+                            type=int, nargs="*", default=[])
+    arg_parser.add_argument('--synthetic', help='Synthetic circuits (default: all)', nargs="*",
+                            choices=list(GENERATORS.keys()), default=list(GENERATORS.keys()))
+    arg_parser.add_argument('--max-nfev', help='Max function evaluations of the optimize phase (default: 100)',
+                            type=int, default=100)
+    arg_parser.add_argument('--no-optimize', help='Skip the full optimization phase', action='store_true')
+    arg_parser.add_argument('--solver-mode', help='Override the solver mode of all cases',
+                            choices=["symbolic", "cramer", "numeric", "auto"], default="")
+    arg_parser.add_argument('-k', '--filter', help='Only run the cases containing this text', default="")
+    arg_parser.add_argument('--test-dir', help='Directory of the test state files', default="test_netlists")
+    args = arg_parser.parse_args()
+
+    results = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+               "repeat": args.repeat, "warmup": args.warmup, "cases": {}}
+
+    for name, app_state in get_cases(args.test_dir, args.sizes, args.synthetic):
+        if args.filter not in name:
+            continue
+        app_state.max_nfev = args.max_nfev
+        if args.solver_mode:
+            app_state.solver_mode = args.solver_mode
+
+        print("Running {}... ".format(name), end="", flush=True)
+        start_time = time.perf_counter()
+        results["cases"][name] = run_case(app_state, args.repeat, args.warmup, args.resfun_calls,
+                                          not args.no_optimize)
+        print("FAILED" if results["cases"][name] is None else "{:.2f}s".format(time.perf_counter() - start_time))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+
+    print()
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if baseline is not None:
+        slower = compare(results, baseline, args.threshold, args.min_time)
+        print()
+        if len(slower) == 0:
+            print("No slowdowns over x{:.2f}".format(args.threshold))
+        else:
+            print("Slowdowns over x{:.2f}:".format(args.threshold))
+            for case, phase, t_base, t_new in slower:
+                print("  {} {}: {:.4g}ms -> {:.4g}ms (x{:.2f})".format(case, phase, 1000 * t_base, 1000 * t_new,
+                                                                     t_new / t_base))
+            sys.exit(1)
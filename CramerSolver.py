@@ -0,0 +1,151 @@
+import sympy as sp
+from sympy.polys.matrices import DomainMatrix
+
+# Single-output symbolic solver based on Cramer's rule
+#
+# The output expression of the circuit usually needs only one or two
+# entries of the vector of unknowns X, but sp.linsolve computes all of them.
+# With Cramer's rule each unknown is obtained independently:
+#
+#   X[i] = det(A_i) / det(A)
+#
+# where A_i is the circuit matrix with column i replaced by the vector of
+# knowns M. det(A) is computed once, and the numerators are computed only
+# when an entry of X is requested, and then cached.
+#
+# The matrices are converted to SymPy's DomainMatrix, with entries in a
+# polynomial ring of the element symbols and s. The stamps have denominators
+# (1/R), so each row of [A | M] is first multiplied by the LCM of its
+# denominators, which does not change X. Determinants are computed with the
+# fraction-free Bareiss algorithm on sparse rows, choosing the sparsest pivot
+# row. In a rational function field instead, every step of the elimination
+# would cancel a polynomial GCD, which is orders of magnitude slower.
+#
+# Non-polynomial entries (sqrt(L1*L2) of coupled inductors) are replaced by
+# new symbols while solving, and floats (values substituted before solving)
+# by exact rationals. If the entries still do not fit in a polynomial ring,
+# CramerSolution raises ValueError and Engine.solve uses sp.linsolve.
+
+
+def bareiss_det(rows: list, n: int, K):
+    """
+    Determinant with fraction-free Gaussian elimination, exact division in each step.
+
+    Arguments:
+        rows: Sparse rows of the n x n matrix, list of dicts column -> element of K (modified)
+        K: Polynomial ring or ZZ
+
+    Returns:
+        Determinant as element of K
+    """
+
+    sign = 1
+    prev = K.one
+
+    for k in range(n):
+        # Pivot row with the fewest entries, and the fewest terms in the pivot
+        candidates = [i for i in range(k, n) if k in rows[i]]
+        if len(candidates) == 0:
+            return K.zero
+
+        p = min(candidates, key=lambda i: (len(rows[i]), len(rows[i][k]) if K.is_PolynomialRing else 0))
+        if p != k:
+            rows[k], rows[p] = rows[p], rows[k]
+            sign = -sign
+
+        pivot_row = rows[k]
+        pivot = pivot_row[k]
+
+        for i in range(k + 1, n):
+            row = rows[i]
+            a = row.pop(k, None)
+            if a is None:
+                rows[i] = {j: K.exquo(pivot * x, prev) for j, x in row.items()}
+                continue
+
+            new_row = {}
+            for j in set(row) | set(pivot_row):
+                if j != k:
+                    x = K.exquo(pivot * row.get(j, K.zero) - a * pivot_row.get(j, K.zero), prev)
+                    if x:
+                        new_row[j] = x
+            rows[i] = new_row
+
+        prev = pivot
+
+    return prev if sign > 0 else -prev
+
+
+class CramerSolution:
+    """
+    Lazy vector of unknowns, behaves like the sp.Matrix returned by sp.linsolve
+    (indexing and len), but each entry is computed on first access.
+    """
+
+    def __init__(self, A: sp.Matrix, M: sp.Matrix, simplify: bool = False):
+        self.n = A.shape[0]
+        self.simplify = simplify
+        self.entries = {}  # Already computed X[i]
+
+        AM = A.row_join(M)
+
+        # Symbols replacing the non-polynomial subexpressions, and exact floats
+        self.atoms = {p: sp.Dummy() for p in AM.atoms(sp.Pow) if not p.exp.is_Integer}
+        self.inexact = len(AM.atoms(sp.Float)) > 0
+        AM = AM.xreplace(self.atoms).xreplace({x: sp.Rational(str(x)) for x in AM.atoms(sp.Float)})
+        self.atoms = {d: p for p, d in self.atoms.items()}
+
+        # Convert A and M together, so that they share the same domain
+        AM = DomainMatrix.from_Matrix(AM)
+        if AM.domain.is_Field:
+            _, AM = AM.clear_denoms_rowwise(convert=True)
+
+        self.domain = AM.domain
+        if not (self.domain.is_PolynomialRing or self.domain.is_ZZ) or not self.domain.is_Exact:
+            raise ValueError("matrix entries in {} are not supported".format(self.domain))
+
+        sdm = AM.to_sparse().rep
+        self.rows = [dict(sdm.get(i, {})) for i in range(self.n)]  # Column n is M
+
+        self.det_A = bareiss_det([{j: x for j, x in row.items() if j < self.n} for row in self.rows],
+                                 self.n, self.domain)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self.n
+
+        if i not in self.entries:
+            # Replace column i by the vector of knowns
+            rows = []
+            for row in self.rows:
+                row_i = {j: x for j, x in row.items() if j != i and j < self.n}
+                if self.n in row:
+                    row_i[i] = row[self.n]
+                rows.append(row_i)
+            det_i = bareiss_det(rows, self.n, self.domain)
+
+            # Cancel common factors
+            K = self.domain
+            _, p, q = K.cofactors(det_i, self.det_A)
+            x = self.to_sympy(p) / self.to_sympy(q)
+
+            if self.simplify:
+                x = sp.simplify(x)
+
+            self.entries[i] = x
+
+        return self.entries[i]
+
+    def to_sympy(self, x):
+        x = self.domain.to_sympy(x).xreplace(self.atoms)
+        return x.evalf() if self.inexact else x
+
+    def is_singular(self) -> bool:
+        return self.domain.is_zero(self.det_A)
+
+    def get_det(self):
+        """ Determinant of the circuit matrix with the denominators of each row cleared, as SymPy expression """
+        return self.to_sympy(self.det_A)
@@ -4,16 +4,26 @@ import numpy as np
 import sympy as sp
 from sympy.utilities.lambdify import lambdify
 import time
+import threading
 from typing import Callable
 from sympy.parsing.sympy_parser import parse_expr
 from AppState import AppState
+from NumSolve import solve_dense, polyval, TripletMatrix, SparseSolver
+from SolveCache import SolveCache
+from CramerSolver import CramerSolution
+from IsolatedSolver import run_isolated, simplify_expr, simplify_system, solve_system
+from SolveCost import system_features, predict_solve_time
+from Timing import Timings, timed
 
 import sys, os
+from collections import defaultdict
 #sys.path.insert(0, "/home/peca/Repos/scipy-leastsquares-callback-new/build-install/lib/python3/dist-packages")
 #from scipy.optimize import least_squares
 
 from vpm_least_squares.least_squares import least_squares
 from scipy.optimize import OptimizeResult, differential_evolution, Bounds
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
 
 # The circuit solving engine is based on MNA (Modified Nodal Analysis)
 # References:
@@ -95,6 +105,7 @@ class Engine:
 
         self.minval = None
         self.maxval = None
+        self.tolerance = None  # Relative tolerance of the elements, for Monte Carlo analysis
         self.prefix = ""  # Might be needed to avoid name clash with SymPy default variables (not needed)
         self.sym = None  # Array of symbols with prefix: self.sym["Vin"] = Symbol(xVin)
         self.optimized_lines = None
@@ -116,6 +127,10 @@ class Engine:
         self.C = None       # (NxN) Capacitors, inductors, and mutual inductances
         self.M = None       # (Nx1) Independent sources (voltage & current) and zeros for GHKL elements
         self.X = None       # (Nx1) Vector of unknowns (Node voltages & Branch currents)
+        self.stamp_cache = None  # Stamps of each element in G, C and M, to patch them on the next parse (see fill_matrices)
+        self.matrix_version = 0  # Incremented each time G, C or M change
+        self.last_solve_key = None  # Everything the last symbolic solve depends on but the element values, see get_solve_key
+        self.last_elems_fixed = None  # Fixed values substituted into output_expr by the last solve
 
         # The 's' variable from Laplace transform
         self.s = sp.Symbol('s')
@@ -127,8 +142,15 @@ class Engine:
         self.b_step = None
         self.last_A_solved = None   # Last circuit matrix that was inverted, to skip inversion if we can
         self.last_M_solved = None
+        self.last_cramer_solved = False  # Last matrix was solved in "cramer" mode (maybe with the sp.linsolve fallback)
         self.stop_flag = False
+        # Solver used by the last solve, "auto" mode resolves to "symbolic" or "numeric"
+        self.solver_mode = "symbolic" if app_state.solver_mode == "auto" else app_state.solver_mode
+        self.solve_prediction = None  # Predicted and actual time of the last symbolic solve, see predict_solve
+        self.cancel_flag = False  # Set by another thread to abandon the current parse or solve at the next safe point
         self.callback = callback
+        self.sparse_solver = SparseSolver()  # Keeps sparse LU ordering between calls of the numeric solver
+        self.solve_cache = SolveCache()  # Persistent cache of symbolic solutions
         self.x_initial = None
         self.x_min = None
         self.x_max = None
@@ -136,12 +158,26 @@ class Engine:
         self.optimized_vals = None
         self.makeup_gain = None
         self.iteration = None
-        self.n = None
         self.resnorm = None
         self.h_compiled = None
+        self.h_batch = False  # h_compiled accepts arrays of parameters (broadcast against frequency)
+        self.b_step_cache = {}  # Frequency response of the last evaluations of resfun, key is x.tobytes()
+        self.b_step_lock = threading.Lock()  # resfun can be called from several threads
+        self.progress_time = 0  # Time of the last optim_step event
+        self.batch_compiled = None  # (expression, element names, compiled function) used by get_freqresponse_batch
+        self.mc_result = None  # Result of the last Monte Carlo analysis
+        self.output_expr_full = None  # output_expr before substitution of fixed element values
+        self.sens_compiled = None  # (output_expr_full, symbolic element names, compiled H, compiled dH/dx)
+        self.sens_numeric = None  # (netlist and values, frequencies, sensitivities) of the central differences
+        self.sens_result = None  # Result of the last sensitivity analysis
+        self.timings = Timings()  # Wall and CPU time spent in each phase, see get_timings
+        self.iteration_time = 0, 0  # Wall and CPU time at the last optimizer iteration
+        self.pz_cache = {}  # id(h_sym) -> (h_sym, dict with numeric polynomials and poles/zeros), see get_rational
+        self.dh_compiled = None
         self.h_final = None
         self.output_expr = None
         self.h_initial = None
+        self.multistart_results = None  # Results of multi-start optimization, sorted by cost
 
         self.syntax_strings = {
             "R": "Rnnn <node+> <node-> <val>",
@@ -173,6 +209,20 @@ class Engine:
         print("[ERROR] " + s.replace("\n", "\n[ERROR] "), end=end)
         self.callback(self, event_type)
 
+    def is_cancelled(self, where: str) -> bool:
+        """
+        Safe point of parse and solve, where the engine can stop without leaving a partial solution.
+        sp.linsolve and sp.simplify cannot be interrupted, cancel takes effect after them.
+
+        Returns:
+            True if cancel_flag is set
+        """
+
+        if self.cancel_flag:
+            self.info_print(where + ": cancelled")
+            return True
+        return False
+
     def get_node(self, s: str):
         if s[0] == '-':  # In case node has minus sign, keep only node name
             s = s[1:]
@@ -195,6 +245,7 @@ class Engine:
             self.branches.append(s.upper())
         return self.branches.index(s.upper())
 
+    @timed("parse")
     def parse(self, netlist: str):
         """
         Parse SPICE netlist and build problem matrices.
@@ -218,6 +269,7 @@ class Engine:
         self.elems_initial = {}
         self.minval = {}
         self.maxval = {}
+        self.tolerance = {}
         self.optimized_lines = {}
         self.expr_lines={}
         self.sym = {}
@@ -398,6 +450,7 @@ class Engine:
                 # Default min and max values from app_state
                 minval = self.app_state.minval[c]
                 maxval = self.app_state.maxval[c]
+                tolerance = self.app_state.mc_tolerance
 
                 # If element has min= or max= argument, that overrides the default
                 for el in self.netlist_fields[key]:
@@ -417,284 +470,387 @@ class Engine:
                             return False
                         else:
                             maxval = valf
+                    elif el.startswith("tol="):
+                        # Tolerance for Monte Carlo analysis, as percentage (tol=5%) or fraction (tol=0.05)
+                        tol = el.replace("tol=", "")
+                        valf = eng2num(tol[0:-1]) / 100 if tol.endswith("%") else eng2num(tol)
+                        if math.isnan(valf):
+                            self.error_print("parse: line " + str(self.elems_line[key]+1)
+                                             + ": invalid tolerance: " + el)
+                            return False
+                        else:
+                            tolerance = valf
 
                 self.minval[key] = minval
                 self.maxval[key] = maxval
+                self.tolerance[key] = tolerance
 
-        # These form the A matrix
-        N = len(self.nodes) - 1
-        B = len(self.branches)
+        # Second pass:
+        # Fill up design matrix
+        with self.timings.span("parse.matrix_fill"):
+            if not self.fill_matrices():
+                return False
 
-        self.G = sp.zeros(N+B,N+B)
-        self.C = sp.zeros(N+B,N+B)
+        self.debug_print("Nodes = " + str(self.nodes))
+        self.debug_print("Branches = " + str(self.branches))
 
-        # These form the vector of knowns
-        self.M = sp.zeros(N+B, 1)
+        self.debug_print("DC sources = " + str(self.sources_dc))
+        self.debug_print("AC sources = " + str(self.sources_ac))
 
-        # Second pass:
-        # Fill up design matrix
-        for key, f in self.netlist_fields.items():
-            c = f[0][0].upper()
+        # Pretty-printing big matrices takes much longer than building them, only do it when needed
+        if self.app_state._debug:
+            self.debug_print("Circuit matrix G + sC =")
+            self.debug_print(sp.pretty(self.G + self.C*self.s, wrap_line=False, num_columns=2000))
 
-            if c == 'R':  # Resistors
-                nodep = self.add_get_node(f[1])  # Node already added but we use same logic
-                noden = self.add_get_node(f[2])
+            self.debug_print("\n\n")
 
-                if key in self.branches:
-                    # Group 2, for which we need to save current because is used in a F or H source
-                    index = self.add_get_branch(f[0])  # Source is added in previous step
+            self.debug_print("Vector of knowns M = ")
+            self.debug_print(sp.pretty(self.M, wrap_line=False, num_columns=2000))
+            self.debug_print("\n\n")
 
-                    inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
-                    if f[1][0] == '-': inv = -inv
-                    if f[2][0] == '-': inv = -inv
+        return True
 
-                    if nodep != 0:
-                        self.G[nodep - 1, N + index] += 1
-                        self.G[N + index, nodep - 1] += 1
-                    if noden != 0:
-                        self.G[noden - 1, N + index] -= inv
-                        self.G[N + index, noden - 1] -= inv
+    def fill_matrices(self):
+        """
+        Build G, C and M from the stamps of all the elements.
 
-                    self.G[N + index, N + index] -= self.sym[key]
+        The stamps of the last parse are kept in stamp_cache. If the numbering of nodes and branches
+        did not change, the matrices are patched in place: the stamps of removed or modified elements
+        are subtracted, and the ones of added or modified elements are added. Otherwise, they are
+        built from scratch.
 
-                else:
-                    # Group 1, we don't need to save current
-                    g = self.sym[key] ** -1  # Conductance
-                    if nodep == 0:  # First terminal is ground
-                        self.G[noden - 1, noden - 1] += g
-                    elif noden == 0:  # Second terminal is ground
-                        self.G[nodep - 1, nodep - 1] += g
-                    else:  # No terminal is ground
-                        self.G[nodep - 1, nodep - 1] += g
-                        self.G[noden - 1, noden - 1] += g
-
-                        inv = 1  # Is any of the nodes inverted?
-                        if f[1][0] == '-': inv = -inv
-                        if f[2][0] == '-': inv = -inv
-
-                        self.G[nodep - 1, noden - 1] -= inv * g  # Matrix stays symmetric
-                        self.G[noden - 1, nodep - 1] -= inv * g
-
-            elif c == 'C': # Capacitors
-                nodep = self.add_get_node(f[1])  # Node already added but we use same logic
-                noden = self.add_get_node(f[2])
-
-                if key in self.branches:
-                    # Group 2, for which we need to save current because is used in a F or H source
-                    index = self.add_get_branch(f[0])  # Source is added in previous step
-
-                    inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
-                    if f[1][0] == '-': inv = -inv
-                    if f[2][0] == '-': inv = -inv
+        Returns:
+            True, if all the elements were stamped.
+        """
 
-                    if nodep != 0:
-                        self.G[nodep - 1, N + index] += 1
-                        self.C[N + index, nodep - 1] -= 1*self.sym[key]
+        N = len(self.nodes) - 1
+        B = len(self.branches)
 
-                    if noden != 0:
-                        self.G[noden - 1, N + index] -= inv
-                        self.C[N + index, noden - 1] += inv*self.sym[key]
+        cache = self.stamp_cache
+        self.stamp_cache = None  # Not valid until the matrices are complete
 
-                    self.G[N + index, N + index] += -1
+        if cache is not None and cache["nodes"] == self.nodes and cache["branches"] == self.branches:
+            stamps = cache["stamps"]
+            for key in list(stamps.keys()):
+                if key not in self.netlist_fields or stamps[key][0] != self.stamp_signature(key):
+                    self.add_stamp(stamps.pop(key), -1)
+                    self.matrix_version += 1
+        else:
+            # These form the A matrix
+            self.G = sp.zeros(N+B,N+B)
+            self.C = sp.zeros(N+B,N+B)
 
-                else:
-                    # Group 1, we don't need to save current
-                    g = self.sym[key]  # Capacitance
-                    if nodep == 0:  # First terminal is ground
-                        self.C[noden - 1, noden - 1] += g
-                    elif noden == 0:  # Second terminal is ground
-                        self.C[nodep - 1, nodep - 1] += g
-                    else:  # No terminal is ground
-                        self.C[nodep - 1, nodep - 1] += g
-                        self.C[noden - 1, noden - 1] += g
-
-                        inv = 1  # Is any of the nodes inverted?
-                        if f[1][0] == '-': inv = -inv
-                        if f[2][0] == '-': inv = -inv
-
-                        self.C[nodep - 1, noden - 1] -= inv * g  # Matrix stays symmetric
-                        self.C[noden - 1, nodep - 1] -= inv * g
-
-            elif c == 'L':  # Inductors
-                index = self.add_get_branch(f[0]) # Source is added in previous step
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
+            # These form the vector of knowns
+            self.M = sp.zeros(N+B, 1)
 
-                inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
-                if f[1][0] == '-': inv = -inv
-                if f[2][0] == '-': inv = -inv
+            stamps = {}
+            self.matrix_version += 1
 
-                if nodep != 0:
-                    self.G[nodep - 1, N + index] += 1
-                    self.G[N + index, nodep - 1] += 1
-                if noden != 0:
-                    self.G[noden - 1, N + index] -= inv
-                    self.G[N + index, noden - 1] -= inv
+        n_stamped = 0
+        for key, f in self.netlist_fields.items():
+            if key in stamps:
+                continue  # Unchanged element
 
-                self.C[N + index, N + index] -= self.sym[key]
+            if self.is_cancelled("parse"):
+                return False
 
-            elif c == 'V':  # Fixed V sources: V<int> <node.+> <node.-> <value>
-                index = self.add_get_branch(f[0])  # Source is added in previous step
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
+            dG, dC, dM = defaultdict(int), defaultdict(int), defaultdict(int)
+            if not self.stamp(dG, dC, dM, key, f, self.sym):
+                return False
 
-                inv = -1  # TODO implement inversion for balanced circuits
+            stamps[key] = (self.stamp_signature(key), dG, dC, dM)
+            self.add_stamp(stamps[key], 1)
+            self.matrix_version += 1
+            n_stamped += 1
 
-                # Figure 2.22 from book Farid Najm
-                # Correct V(out) & I(Vin) in simplerc
-                if nodep != 0:
-                    self.G[nodep - 1, N + index] += 1
-                    self.G[N + index, nodep - 1] += 1
-                if noden != 0:
-                    self.G[noden - 1, N + index] -= 1
-                    self.G[N + index, noden - 1] -= 1
+        self.debug_print("parse: {} of {} elements stamped".format(n_stamped, len(stamps)))
+        self.stamp_cache = {"nodes": list(self.nodes), "branches": list(self.branches), "stamps": stamps}
+        return True
 
-                self.M[N + index, 0] += self.sym[key]
+    def stamp_signature(self, key: str):
+        # Everything the stamp of an element depends on, besides the numbering of nodes and branches.
+        # Stamps hold the symbols of the elements, not their values, so fields from the value on are left out.
+        f = self.netlist_fields[key]
+        n_fields = {"R": 3, "L": 3, "C": 3, "K": 3, "V": 3, "I": 3, "F": 4, "H": 4, "O": 4}.get(key[0], 5)
+        if key[0] == 'K':
+            # Coupling needs the two inductors
+            return tuple(f[:n_fields]), f[1].upper() in self.sym, f[2].upper() in self.sym
+        return tuple(f[:n_fields])
+
+    def add_stamp(self, stamp: tuple, sign: int):
+        _, dG, dC, dM = stamp
+        for (i, j), v in dG.items():
+            self.G[i, j] += sign * v
+        for (i, j), v in dC.items():
+            self.C[i, j] += sign * v
+        for (i, j), v in dM.items():
+            self.M[i, j] += sign * v
+
+    def stamp(self, G, C, M, key: str, f: list, vals: dict):
+        """
+        Add the MNA stamp of one circuit element to the problem matrices.
 
-            elif c == 'I':  # Fixed I sources
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                if nodep != 0:
-                    self.M[nodep - 1, 0] += self.sym[key]
-                if noden != 0:
-                    self.M[noden - 1, 0] -= self.sym[key]
-
-            elif c == 'G':  # VCCS
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                nc1 = self.add_get_node(f[3])
-                nc2 = self.add_get_node(f[4])
-                if nodep != 0 and nc1 != 0:
-                    self.G[nodep - 1, nc1 - 1] += self.sym[key]
-                if nodep != 0 and nc2 != 0:
-                    self.G[nodep - 1, nc2 - 1] -= self.sym[key]
-                if noden != 0 and nc1 != 0:
-                    self.G[noden - 1, nc1 - 1] -= self.sym[key]
-                if noden != 0 and nc2 != 0:
-                    self.G[noden - 1, nc2 - 1] += self.sym[key]
-
-            elif c == 'E':  # VCVS
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                nc1 = self.add_get_node(f[3])
-                nc2 = self.add_get_node(f[4])
-                index = self.add_get_branch(f[0])
-                if nodep != 0:
-                    self.G[nodep - 1, N + index] += 1
-                    self.G[N + index, nodep - 1] += 1
-                if noden != 0:
-                    self.G[noden - 1, N + index] -= 1
-                    self.G[N + index, noden - 1] -= 1
-                if nc1 != 0:
-                    self.G[N + index, nc1 - 1] -= self.sym[key]  # This makes the matrix asymmetric!
-                if nc2 != 0:
-                    self.G[N + index, nc2 - 1] += self.sym[key]
-
-            elif c == 'F':  # CCCS
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                index_ctl = self.add_get_branch(f[3])  # Branch current used as current sensor
+        The same element rules are used to build the symbolic matrices in parse
+        (vals maps each element to its SymPy symbol) and the numeric matrices
+        (vals maps each element to its float value, G/C/M are NumPy arrays).
 
-                if nodep != 0:
-                    self.G[nodep - 1, N + index_ctl] -= self.sym[key]
-                    #self.G[nodep - 1, N + index] -= 1
+        Returns:
+            True, if the element was stamped.
+            False, if the element is invalid. The error is printed using self.error_print.
+        """
 
-                if noden != 0:
-                    self.G[noden - 1, N + index_ctl] += self.sym[key]
-                    #self.G[noden - 1, N + index] += 1
+        N = len(self.nodes) - 1
+
+        c = f[0][0].upper()
 
-            elif c == 'H':  # CCVS
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                index = self.add_get_branch(f[0])   # Current through output vsource
-                index_ctl = self.add_get_branch(f[3])  # Branch used as current sensor
+        if c == 'R':  # Resistors
+            nodep = self.add_get_node(f[1])  # Node already added but we use same logic
+            noden = self.add_get_node(f[2])
+
+            if key in self.branches:
+                # Group 2, for which we need to save current because is used in a F or H source
+                index = self.add_get_branch(f[0])  # Source is added in previous step
+
+                inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
+                if f[1][0] == '-': inv = -inv
+                if f[2][0] == '-': inv = -inv
 
                 if nodep != 0:
-                    self.G[nodep - 1, N + index] += 1
-                    self.G[N + index, nodep - 1] += 1
+                    G[nodep - 1, N + index] += 1
+                    G[N + index, nodep - 1] += 1
                 if noden != 0:
-                    self.G[noden - 1, N + index] -= 1
-                    self.G[N + index, noden - 1] -= 1
+                    G[noden - 1, N + index] -= inv
+                    G[N + index, noden - 1] -= inv
 
-                self.G[N + index, N + index_ctl] -= self.sym[key]
+                G[N + index, N + index] -= vals[key]
 
-            elif c == 'O':  # Ideal Opamp
-                nodep = self.add_get_node(f[1])
-                noden = self.add_get_node(f[2])
-                n3 = self.add_get_node(f[3])
-                index = self.add_get_branch(f[0])
+            else:
+                # Group 1, we don't need to save current
+                g = vals[key] ** -1  # Conductance
+                if nodep == 0:  # First terminal is ground
+                    G[noden - 1, noden - 1] += g
+                elif noden == 0:  # Second terminal is ground
+                    G[nodep - 1, nodep - 1] += g
+                else:  # No terminal is ground
+                    G[nodep - 1, nodep - 1] += g
+                    G[noden - 1, noden - 1] += g
+
+                    inv = 1  # Is any of the nodes inverted?
+                    if f[1][0] == '-': inv = -inv
+                    if f[2][0] == '-': inv = -inv
 
-                self.G[n3 - 1, N + index] += 1  # Current through the opamp
+                    G[nodep - 1, noden - 1] -= inv * g  # Matrix stays symmetric
+                    G[noden - 1, nodep - 1] -= inv * g
 
-                if nodep != 0:
-                    self.G[N + index, nodep - 1] += 1
-                if noden != 0:
-                    self.G[N + index, noden - 1] -= 1
+        elif c == 'C': # Capacitors
+            nodep = self.add_get_node(f[1])  # Node already added but we use same logic
+            noden = self.add_get_node(f[2])
 
-            elif c == 'K':  # Coupling coefficient between two inductors
-                index1 = self.add_get_branch(f[1])  # First coupled inductor
-                index2 = self.add_get_branch(f[2])  # Second coupled inductor
+            if key in self.branches:
+                # Group 2, for which we need to save current because is used in a F or H source
+                index = self.add_get_branch(f[0])  # Source is added in previous step
 
-                # Check if the two coupled inductors exist (must have been parsed before this)
-                if f[1].upper() not in self.sym.keys() or f[2].upper() not in self.sym.keys():
-                    self.error_print("parse: line " + str(self.elems_line[f[0].upper()])
-                                     + ": inductor not found")
-                    return False
+                inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
+                if f[1][0] == '-': inv = -inv
+                if f[2][0] == '-': inv = -inv
 
-                # Calculate mutual inductance = K * sqrt(L1 * L2)
-                mutual_l = self.sym[f[0].upper()] * sp.sqrt(self.sym[f[1].upper()] * self.sym[f[2].upper()])
-
-                self.C[N + index1, N + index2] -= mutual_l
-                self.C[N + index2, N + index1] -= mutual_l
-
-            elif c == 'T':  # Ideal transformer
-                # Source: Circuit Oriented Electromagnetic Modeling Using the PEEC Techniques, First Edition.
-                # Albert E. Ruehli, Giulio Antonini, and Lijun Jiang
-                # https://onlinelibrary.wiley.com/doi/pdf/10.1002/9781119078388.app2
-
-                node1p = self.add_get_node(f[1])  # Positive node primary side
-                node1n = self.add_get_node(f[2])  # Negative node primary side
-                node2p = self.add_get_node(f[3])  # Positive node secondary side
-                node2n = self.add_get_node(f[4])  # Negative node secondary side
-
-                index1 = self.add_get_branch(f[0] + "_1")  # Branch current primary side
-                index2 = self.add_get_branch(f[0] + "_2")  # Branch current secondary side
-
-                # Primary/secondary current ratio
-                self.G[N + index1, N + index1] += 1
-                self.G[N + index1, N + index2] -= self.sym[key]
-
-                if node1p != 0:
-                    self.G[node1p-1, N + index1] += 1
-                    self.G[N + index2, node1p-1] -= self.sym[key]  # Primary/secondary voltage ratio
-                if node1n != 0:
-                    self.G[node1n-1, N + index1] -= 1
-                    self.G[N + index2, node1n-1] += self.sym[key]  # Primary/secondary voltage ratio
-                if node2p != 0:
-                    self.G[node2p-1, N + index2] += 1
-                    self.G[N + index2, node2p-1] += 1  # Primary/secondary voltage ratio
-                if node2n != 0:
-                    self.G[node2n-1, N + index2] -= 1
-                    self.G[N + index2, node2n-1] -= 1  # Primary/secondary voltage ratio
+                if nodep != 0:
+                    G[nodep - 1, N + index] += 1
+                    C[N + index, nodep - 1] -= 1*vals[key]
 
-            else:
-                self.error_print("parse: unknown component in filling up matrix")
-                return False
+                if noden != 0:
+                    G[noden - 1, N + index] -= inv
+                    C[N + index, noden - 1] += inv*vals[key]
 
-        self.debug_print("Nodes = " + str(self.nodes))
-        self.debug_print("Branches = " + str(self.branches))
+                G[N + index, N + index] += -1
 
-        self.debug_print("DC sources = " + str(self.sources_dc))
-        self.debug_print("AC sources = " + str(self.sources_ac))
+            else:
+                # Group 1, we don't need to save current
+                g = vals[key]  # Capacitance
+                if nodep == 0:  # First terminal is ground
+                    C[noden - 1, noden - 1] += g
+                elif noden == 0:  # Second terminal is ground
+                    C[nodep - 1, nodep - 1] += g
+                else:  # No terminal is ground
+                    C[nodep - 1, nodep - 1] += g
+                    C[noden - 1, noden - 1] += g
+
+                    inv = 1  # Is any of the nodes inverted?
+                    if f[1][0] == '-': inv = -inv
+                    if f[2][0] == '-': inv = -inv
 
-        self.debug_print("Circuit matrix G + sC =")
-        self.debug_print(sp.pretty(self.G + self.C*self.s, wrap_line=False, num_columns=2000))
+                    C[nodep - 1, noden - 1] -= inv * g  # Matrix stays symmetric
+                    C[noden - 1, nodep - 1] -= inv * g
+
+        elif c == 'L':  # Inductors
+            index = self.add_get_branch(f[0]) # Source is added in previous step
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+
+            inv = 1  # Is any of the nodes inverted? TODO Check this, formulas seem correct
+            if f[1][0] == '-': inv = -inv
+            if f[2][0] == '-': inv = -inv
+
+            if nodep != 0:
+                G[nodep - 1, N + index] += 1
+                G[N + index, nodep - 1] += 1
+            if noden != 0:
+                G[noden - 1, N + index] -= inv
+                G[N + index, noden - 1] -= inv
+
+            C[N + index, N + index] -= vals[key]
+
+        elif c == 'V':  # Fixed V sources: V<int> <node.+> <node.-> <value>
+            index = self.add_get_branch(f[0])  # Source is added in previous step
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+
+            inv = -1  # TODO implement inversion for balanced circuits
+
+            # Figure 2.22 from book Farid Najm
+            # Correct V(out) & I(Vin) in simplerc
+            if nodep != 0:
+                G[nodep - 1, N + index] += 1
+                G[N + index, nodep - 1] += 1
+            if noden != 0:
+                G[noden - 1, N + index] -= 1
+                G[N + index, noden - 1] -= 1
+
+            M[N + index, 0] += vals[key]
+
+        elif c == 'I':  # Fixed I sources
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            if nodep != 0:
+                M[nodep - 1, 0] += vals[key]
+            if noden != 0:
+                M[noden - 1, 0] -= vals[key]
+
+        elif c == 'G':  # VCCS
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            nc1 = self.add_get_node(f[3])
+            nc2 = self.add_get_node(f[4])
+            if nodep != 0 and nc1 != 0:
+                G[nodep - 1, nc1 - 1] += vals[key]
+            if nodep != 0 and nc2 != 0:
+                G[nodep - 1, nc2 - 1] -= vals[key]
+            if noden != 0 and nc1 != 0:
+                G[noden - 1, nc1 - 1] -= vals[key]
+            if noden != 0 and nc2 != 0:
+                G[noden - 1, nc2 - 1] += vals[key]
+
+        elif c == 'E':  # VCVS
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            nc1 = self.add_get_node(f[3])
+            nc2 = self.add_get_node(f[4])
+            index = self.add_get_branch(f[0])
+            if nodep != 0:
+                G[nodep - 1, N + index] += 1
+                G[N + index, nodep - 1] += 1
+            if noden != 0:
+                G[noden - 1, N + index] -= 1
+                G[N + index, noden - 1] -= 1
+            if nc1 != 0:
+                G[N + index, nc1 - 1] -= vals[key]  # This makes the matrix asymmetric!
+            if nc2 != 0:
+                G[N + index, nc2 - 1] += vals[key]
+
+        elif c == 'F':  # CCCS
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            index_ctl = self.add_get_branch(f[3])  # Branch current used as current sensor
+
+            if nodep != 0:
+                G[nodep - 1, N + index_ctl] -= vals[key]
+                #G[nodep - 1, N + index] -= 1
+
+            if noden != 0:
+                G[noden - 1, N + index_ctl] += vals[key]
+                #G[noden - 1, N + index] += 1
+
+        elif c == 'H':  # CCVS
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            index = self.add_get_branch(f[0])   # Current through output vsource
+            index_ctl = self.add_get_branch(f[3])  # Branch used as current sensor
+
+            if nodep != 0:
+                G[nodep - 1, N + index] += 1
+                G[N + index, nodep - 1] += 1
+            if noden != 0:
+                G[noden - 1, N + index] -= 1
+                G[N + index, noden - 1] -= 1
+
+            G[N + index, N + index_ctl] -= vals[key]
+
+        elif c == 'O':  # Ideal Opamp
+            nodep = self.add_get_node(f[1])
+            noden = self.add_get_node(f[2])
+            n3 = self.add_get_node(f[3])
+            index = self.add_get_branch(f[0])
+
+            G[n3 - 1, N + index] += 1  # Current through the opamp
+
+            if nodep != 0:
+                G[N + index, nodep - 1] += 1
+            if noden != 0:
+                G[N + index, noden - 1] -= 1
+
+        elif c == 'K':  # Coupling coefficient between two inductors
+            index1 = self.add_get_branch(f[1])  # First coupled inductor
+            index2 = self.add_get_branch(f[2])  # Second coupled inductor
+
+            # Check if the two coupled inductors exist (must have been parsed before this)
+            if f[1].upper() not in self.sym.keys() or f[2].upper() not in self.sym.keys():
+                self.error_print("parse: line " + str(self.elems_line[f[0].upper()])
+                                 + ": inductor not found")
+                return False
 
-        self.debug_print("\n\n")
+            # Calculate mutual inductance = K * sqrt(L1 * L2)
+            l1_l2 = vals[f[1].upper()] * vals[f[2].upper()]
+            if isinstance(l1_l2, sp.Expr):
+                mutual_l = vals[key] * sp.sqrt(l1_l2)
+            else:
+                mutual_l = vals[key] * np.sqrt(l1_l2)
+
+            C[N + index1, N + index2] -= mutual_l
+            C[N + index2, N + index1] -= mutual_l
+
+        elif c == 'T':  # Ideal transformer
+            # Source: Circuit Oriented Electromagnetic Modeling Using the PEEC Techniques, First Edition.
+            # Albert E. Ruehli, Giulio Antonini, and Lijun Jiang
+            # https://onlinelibrary.wiley.com/doi/pdf/10.1002/9781119078388.app2
+
+            node1p = self.add_get_node(f[1])  # Positive node primary side
+            node1n = self.add_get_node(f[2])  # Negative node primary side
+            node2p = self.add_get_node(f[3])  # Positive node secondary side
+            node2n = self.add_get_node(f[4])  # Negative node secondary side
+
+            index1 = self.add_get_branch(f[0] + "_1")  # Branch current primary side
+            index2 = self.add_get_branch(f[0] + "_2")  # Branch current secondary side
+
+            # Primary/secondary current ratio
+            G[N + index1, N + index1] += 1
+            G[N + index1, N + index2] -= vals[key]
+
+            if node1p != 0:
+                G[node1p-1, N + index1] += 1
+                G[N + index2, node1p-1] -= vals[key]  # Primary/secondary voltage ratio
+            if node1n != 0:
+                G[node1n-1, N + index1] -= 1
+                G[N + index2, node1n-1] += vals[key]  # Primary/secondary voltage ratio
+            if node2p != 0:
+                G[node2p-1, N + index2] += 1
+                G[N + index2, node2p-1] += 1  # Primary/secondary voltage ratio
+            if node2n != 0:
+                G[node2n-1, N + index2] -= 1
+                G[N + index2, node2n-1] -= 1  # Primary/secondary voltage ratio
 
-        self.debug_print("Vector of knowns M = ")
-        self.debug_print(sp.pretty(self.M, wrap_line=False, num_columns=2000))
-        self.debug_print("\n\n")
+        else:
+            self.error_print("parse: unknown component in filling up matrix")
+            return False
 
         return True
 
@@ -743,6 +899,7 @@ class Engine:
             txt = txt + l + "\n"
         return txt
 
+    @timed("solve")
     def solve(self):
 
         # Validate input expression
@@ -751,6 +908,23 @@ class Engine:
                 self.error_print("solve: invalid input expression")
                 return False
 
+        self.solve_prediction = None
+        self.stop_flag = False  # Stop pressed after the previous solve or optimization finished
+
+        if self.app_state.solver_mode == "numeric":
+            # No symbolic solution, the circuit is solved for each set of element values
+            self.last_solve_key = None
+            return self.solve_numeric()
+
+        # Only element values changed since the last solve: the solution and the output expression with the
+        # element symbols (output_expr_full) are still valid, only the values must be substituted again
+        solve_key = self.get_solve_key()
+        if solve_key == self.last_solve_key and self.output_expr_full is not None:
+            self.info_print("solve: only element values changed, solving not needed")
+            return self.substitute_values(fixed_changed=self.elems_fixed != self.last_elems_fixed)
+
+        self.last_solve_key = None
+
         # Superposition principle, substitute by 0 all sources that are not the input
         subs_zero = []
         for key in self.sources_dc.keys():
@@ -767,7 +941,10 @@ class Engine:
 
         # TODO: Maybe use copy here?
         A = self.G + self.C*self.s  # Circuit matrix in complex
-        M = self.M  # Vector of knowns
+        M = self.M.copy()  # Vector of knowns, copy as parse patches self.M in place
+
+        # Slow SymPy calls run in a child process that can be stopped (sp.linsolve cannot, in cramer mode)
+        isolated = self.app_state.solve_isolated and self.app_state.solver_mode != "cramer"
 
         # Subtitute before solve is active
         # Substitute:
@@ -775,18 +952,26 @@ class Engine:
         # - Independent V and I sources that are not selected as input expression
         # - Expressions in elements value by its value
         if self.app_state.subs_before_solve:
-            for el in subs_zero:
-                M = M.subs(self.sym[el], 0)
+            with self.timings.span("solve.substitution"):
+                for el in subs_zero:
+                    M = M.subs(self.sym[el], 0)
 
-            # Substitute expressions in element values
-            for key, el in self.elems_expr.items():
-                A = A.subs(self.sym[key], el)
+                # Substitute expressions in element values
+                for key, el in self.elems_expr.items():
+                    A = A.subs(self.sym[key], el)
 
-            for key, el in self.elems_fixed.items():
-                A = A.subs(self.sym[key], el)
+                for key, el in self.elems_fixed.items():
+                    A = A.subs(self.sym[key], el)
 
-            M = sp.simplify(M)
-            A = sp.simplify(A)
+                if isolated:
+                    # Same simplified system as in-process, for last_A_solved and the solve cache
+                    system = self.simplify_system_isolated(A, M)
+                    if system is None:
+                        return False
+                    A, M = system
+                else:
+                    M = sp.simplify(M)
+                    A = sp.simplify(A)
 
         # self.debug_print("Circuit matrix G + sC = ")
         # self.debug_print("\n" + sp.pretty(A, wrap_line=False, num_columns=2000))
@@ -797,48 +982,126 @@ class Engine:
         # self.debug_print("\n" + sp.pretty(M, wrap_line=False, num_columns=2000))
         # self.debug_print("\n")
 
+        if self.is_cancelled("solve"):
+            return False
+
+        already_solved = (self.last_A_solved is not None and self.last_A_solved == A) and \
+            (self.last_M_solved is not None and self.last_M_solved == M) and \
+            self.last_cramer_solved == (self.app_state.solver_mode == "cramer")  # Needed if sources change but matrix stay
+
+        # Predict the time of sp.linsolve, in "auto" mode use the numeric solver if it is too long
+        if self.app_state.solver_mode in ("symbolic", "auto") and not already_solved:
+            if self.predict_solve(A, M):
+                return self.solve_numeric()
+
         # Heart of the algorithm: Solution of the system of equations
         ################################################
-        if (self.last_A_solved is not None and self.last_A_solved == A) and \
-            (self.last_M_solved is not None and self.last_M_solved == M):  # Needed if sources change but matrix stay
+        X_cramer = None
+        if self.app_state.solver_mode == "cramer" and not already_solved:
+            # Only det(A) is computed here, entries of X are computed on demand by build_output_expr
+            self.info_print("solve: computing determinant, this may take some time... ")
+            start_time = time.time()
+            with self.timings.span("solve.determinant"):
+                try:
+                    X_cramer = CramerSolution(A, M, self.app_state.simplify_after_solve)
+                except ValueError as error:
+                    self.info_print("solve: {}, solving with sp.linsolve".format(error))
+
+        if already_solved:
+            self.solver_mode = "cramer" if isinstance(self.X, CramerSolution) else "symbolic"
+        else:
+            self.solver_mode = "cramer" if X_cramer is not None else "symbolic"
+
+        if already_solved:
             self.info_print("solve: solving matrix not needed")
+        elif X_cramer is not None:
+            X = X_cramer
+            if X.is_singular():
+                self.error_print("solve: unsolvable system")
+                return False
+
+            self.info_print("solve: computing determinant finished ({:.2f}s)".format(time.time() - start_time))
+            self.X = X
+
+            self.last_A_solved = A
+            self.last_M_solved = M
+            self.last_cramer_solved = True
+
+            if self.app_state._debug:
+                self.debug_print("Determinant of circuit matrix det(A) =")
+                self.debug_print(sp.pretty(self.X.get_det(), wrap_line=False, num_columns=2000))
+                self.debug_print("\n")
         else:
-            self.info_print("solve: solving matrix, this may take some time... ")
-            start_time = time.time()
-            system = A, M
-            solutions = sp.linsolve(system)
+            cache_key = None
+            X_cached = None
+
+            if self.app_state.solve_cache:
+                cache_key = self.solve_cache.get_key(A, M, self.app_state.subs_before_solve,
+                                                     self.app_state.simplify_after_solve)
+                X_cached = self.solve_cache.load(cache_key)
+
+            if X_cached is not None:
+                self.info_print("solve: solution loaded from cache")
+                self.X = X_cached
+            elif isolated:
+                X = self.solve_isolated(A, M)
+                if X is None:
+                    return False
+
+                self.X = X
+                if cache_key is not None:
+                    self.solve_cache.store(cache_key, self.X, self.app_state.solve_cache_max_mb)
+            else:
+                self.info_print("solve: solving matrix, this may take some time... ")
+                start_time = time.time()
+                system = A, M
+                with self.timings.span("solve.linsolve"):
+                    solutions = sp.linsolve(system)
 
-            X = None
+                X = None
+
+                for solution in solutions:
+                    if X is None:
+                        X = solution  # Pick only first solution
+                    else:
+                        self.error_print("solve: system has not an unique solution")
+                        return False
 
-            for solution in solutions:
                 if X is None:
-                    X = solution  # Pick only first solution
-                else:
-                    self.error_print("solve: system has not an unique solution")
+                    self.error_print("solve: unsolvable system")
                     return False
 
-            if X is None:
-                self.error_print("solve: unsolvable system")
-                return False
+                self.info_print("solve: solving matrix finished " + self.solve_time_msg(time.time() - start_time))
 
-            self.info_print("solve: solving matrix finished ({:.2f}s)".format(time.time() - start_time))
+                # self.X is still the previous solution, matching last_A_solved
+                if self.is_cancelled("solve"):
+                    return False
 
-            # Simplify solution if enabled (can take more time than solving!)
-            if self.app_state.simplify_after_solve:
-                self.info_print("solve: simplification, this may take some time... ")
-                start_time = time.time()
-                self.X = sp.simplify(sp.Matrix(X))
-                self.info_print("solve: simplification finished ({:.2f}s)".format(time.time() - start_time))
-            else:
-                self.X = sp.Matrix(X)
+                # Simplify solution if enabled (can take more time than solving!)
+                if self.app_state.simplify_after_solve:
+                    self.info_print("solve: simplification, this may take some time... ")
+                    start_time = time.time()
+                    with self.timings.span("solve.simplify"):
+                        self.X = sp.simplify(sp.Matrix(X))
+                    self.info_print("solve: simplification finished ({:.2f}s)".format(time.time() - start_time))
+                else:
+                    self.X = sp.Matrix(X)
+
+                if cache_key is not None:
+                    self.solve_cache.store(cache_key, self.X, self.app_state.solve_cache_max_mb)
 
             # Save last one solved to see if we need to solve it again on the future
             self.last_A_solved = A
             self.last_M_solved = M
+            self.last_cramer_solved = self.app_state.solver_mode == "cramer"
+
+            if self.app_state._debug:
+                self.debug_print("Solution vector X =")
+                self.debug_print(sp.pretty(self.X, wrap_line=False, num_columns=2000))
+                self.debug_print("\n")
 
-            self.debug_print("Solution vector X =")
-            self.debug_print(sp.pretty(self.X, wrap_line=False, num_columns=2000))
-            self.debug_print("\n")
+        if self.is_cancelled("solve"):
+            return False
 
         # Handle output expression
         self.output_expr = self.build_output_expr()
@@ -855,21 +1118,66 @@ class Engine:
         self.debug_print(sp.pretty(self.output_expr, wrap_line=False, num_columns=2000))
         self.debug_print("")
 
-        # Substitute expressions in element values
-        for key, el in self.elems_expr.items():
-            self.output_expr = self.output_expr.subs(self.sym[key], el)
+        with self.timings.span("solve.substitution"):
+            # Substitute expressions in element values
+            for key, el in self.elems_expr.items():
+                self.output_expr = self.output_expr.subs(self.sym[key], el)
+
+            # Substitute everything in case "substitute before solving" or current output was not selected
+            # Substitute variables that are zero
+            if isolated and len(subs_zero) > 0:
+                self.output_expr = self.simplify_isolated(
+                    self.output_expr.subs({self.sym[key]: 0 for key in subs_zero}))
+                if self.output_expr is None:
+                    return False
+            else:
+                for key in subs_zero:
+                    self.output_expr = sp.simplify(self.output_expr.subs(self.sym[key], 0))
+
+            # Keep expression with fixed elements as symbols (unless substituted before solve), for Monte Carlo,
+            # sensitivities and value-only edits
+            self.output_expr_full = self.output_expr
+
+        if not self.substitute_values():
+            return False
 
-        # Substitute everything in case "substitute before solving" or current output was not selected
-        # Substitute variables that are zero
-        for key in subs_zero:
-            self.output_expr = sp.simplify(self.output_expr.subs(self.sym[key], 0))
+        self.last_solve_key = solve_key
+        return True
+
+    def get_solve_key(self):
+        """
+        Everything the symbolic solution and output_expr_full depend on, but the element values
+        (fixed values too, unless they are substituted before solving). If it does not change,
+        solve only substitutes the new values.
+        """
+
+        fixed = self.elems_fixed.copy() if self.app_state.subs_before_solve else None
+        return (self.matrix_version, self.app_state.inexpr.upper(), self.app_state.outexpr,
+                self.app_state.subs_before_solve, self.app_state.simplify_after_solve, self.app_state.solver_mode,
+                self.elems_expr.copy(), fixed)
+
+    def substitute_values(self, fixed_changed: bool = True):
+        """
+        Substitute the fixed values in output_expr_full to get output_expr, and the initial values
+        in output_expr to get h_initial. If the fixed values did not change, output_expr is kept.
+
+        Returns:
+            True, if all the symbols but s were substituted
+        """
+
+        if fixed_changed:
+            self.output_expr = self.output_expr_full
+
+            # Substitute fixed component values
+            with self.timings.span("solve.substitution"):
+                for key, el in self.elems_fixed.items():
+                    self.output_expr = self.output_expr.subs(self.sym[key], el)
 
-        # Substitute fixed component values
-        for key, el in self.elems_fixed.items():
-            self.output_expr = self.output_expr.subs(self.sym[key], el)
+            # Collect terms together as coefficients of s variable.
+            with self.timings.span("solve.collect"):
+                self.output_expr = sp.collect(self.output_expr, self.s)
 
-        # Collect terms together as coefficients of s variable.
-        self.output_expr = sp.collect(self.output_expr, self.s)
+        self.last_elems_fixed = self.elems_fixed.copy()
 
         # Create symbolic expression for initial transfer function
         self.h_initial = self.output_expr
@@ -878,13 +1186,15 @@ class Engine:
         for key, el in self.elems_initial.items():
             self.h_initial = self.h_initial.subs(self.sym[key], el)
 
-        self.debug_print("Output expression (after substitution):")
-        self.debug_print(sp.pretty(self.output_expr, wrap_line=False, num_columns=2000))
-        self.debug_print("")
+        # Pretty-printing takes longer than the substitution, only do it when needed
+        if self.app_state._debug:
+            self.debug_print("Output expression (after substitution):")
+            self.debug_print(sp.pretty(self.output_expr, wrap_line=False, num_columns=2000))
+            self.debug_print("")
 
-        self.debug_print("Initial transfer function:")
-        self.debug_print(sp.pretty(self.h_initial, wrap_line=False, num_columns=2000))
-        self.debug_print("")
+            self.debug_print("Initial transfer function:")
+            self.debug_print(sp.pretty(self.h_initial, wrap_line=False, num_columns=2000))
+            self.debug_print("")
 
         for sym in list(self.h_initial.free_symbols):
             if sym != self.s:
@@ -893,6 +1203,38 @@ class Engine:
 
         return True
 
+    def solve_numeric(self):
+        """
+        Numeric counterpart of solve, used when solver_mode is "numeric".
+
+        The symbolic system is not solved. Instead, h_initial holds the initial
+        element values, and the transfer function is obtained by get_numeric_response
+        solving (G + jwC) * X = M for all frequency points at once.
+        """
+
+        self.info_print("solve: solving numeric matrix... ")
+        start_time = time.time()
+
+        self.solver_mode = "numeric"
+
+        self.output_expr = None
+        self.output_expr_full = None
+        self.h_initial = self.elems_initial.copy()
+
+        h_vec = self.get_numeric_response(self.h_initial, self.get_f_axis())
+        if h_vec is None:
+            return False
+
+        if not np.all(np.isfinite(h_vec)):
+            self.error_print("solve: unsolvable system")
+            return False
+
+        msg = "solve: solving numeric matrix finished ({:.2f}s)".format(time.time() - start_time)
+        if self.solve_prediction is not None:
+            msg += ", symbolic solve predicted {:.3g}s".format(self.solve_prediction["predicted"])
+        self.info_print(msg)
+        return True
+
     def validate_input_expr(self):
         # Validate input expression
         if self.app_state.inexpr.upper() not in self.sources_dc.keys():
@@ -1001,6 +1343,109 @@ class Engine:
 
 
 
+    def run_isolated(self, fun, args: tuple):
+        """
+        Call a function of IsolatedSolver in a child process, with the time and memory limits of the
+        app state. The child is killed if stop_flag or cancel_flag is set meanwhile.
+
+        Returns:
+            Result of fun, or None on error
+        """
+
+        with self.timings.span("solve.isolated"):
+            status, result = run_isolated(fun, args, self.app_state.solve_timeout, self.app_state.solve_memory_mb,
+                                          should_abort=lambda: self.stop_flag or self.cancel_flag)
+
+        if status == "aborted":
+            self.stop_flag = False
+            self.info_print("solve: cancelled" if self.cancel_flag else "solve: stopped")
+            return None
+
+        if status != "ok":
+            self.error_print("solve: " + result)
+            return None
+
+        return result
+
+    def solve_isolated(self, A: sp.Matrix, M: sp.Matrix):
+        """
+        Solve the system in a child process (see IsolatedSolver.solve_system)
+
+        Returns:
+            Solution vector X, or None on error
+        """
+
+        self.info_print("solve: solving matrix in a separate process, this may take some time... ")
+        start_time = time.time()
+
+        X = self.run_isolated(solve_system, (A, M, self.app_state.simplify_after_solve))
+        if X is not None:
+            self.info_print("solve: solving matrix finished " + self.solve_time_msg(time.time() - start_time))
+        return X
+
+    def simplify_system_isolated(self, A: sp.Matrix, M: sp.Matrix):
+        """
+        sp.simplify of the circuit matrix and the vector of knowns in a child process
+
+        Returns:
+            Tuple (A, M) simplified, or None on error
+        """
+
+        self.info_print("solve: simplification of the system in a separate process... ")
+        return self.run_isolated(simplify_system, (A, M))
+
+    def simplify_isolated(self, expr):
+        """
+        sp.simplify in a child process
+
+        Returns:
+            Simplified expression, or None on error
+        """
+
+        self.info_print("solve: simplification in a separate process, this may take some time... ")
+        start_time = time.time()
+
+        expr = self.run_isolated(simplify_expr, (expr,))
+        if expr is not None:
+            self.info_print("solve: simplification finished ({:.2f}s)".format(time.time() - start_time))
+        return expr
+
+    def predict_solve(self, A: sp.Matrix, M: sp.Matrix) -> bool:
+        """
+        Predict the time of the symbolic solve (see SolveCost), kept in solve_prediction with the
+        features of the system, to compare with the actual time.
+
+        Returns:
+            True if the numeric solver should be used instead ("auto" solver mode, predicted time over
+            solve_auto_threshold, and the solution is not in the solve cache)
+        """
+
+        features = system_features(A, M)
+        predicted = predict_solve_time(features)
+        self.solve_prediction = {"predicted": predicted, "actual": None, "features": features}
+        self.debug_print("solve: predicted time {:.3g}s, {}".format(predicted, features))
+
+        if self.app_state.solver_mode != "auto" or predicted <= self.app_state.solve_auto_threshold:
+            return False
+
+        if self.app_state.solve_cache:
+            cache_key = self.solve_cache.get_key(A, M, self.app_state.subs_before_solve,
+                                                 self.app_state.simplify_after_solve)
+            if self.solve_cache.contains(cache_key):
+                return False
+
+        self.info_print("solve: symbolic solve predicted to take {:.3g}s, using the numeric solver".format(predicted))
+        return True
+
+    def solve_time_msg(self, actual: float) -> str:
+        # Actual time of the symbolic solve, and the predicted one if any
+        if self.solve_prediction is None:
+            return "({:.2f}s)".format(actual)
+
+        self.solve_prediction["actual"] = actual
+        return "({:.2f}s, predicted {:.2f}s)".format(actual, self.solve_prediction["predicted"])
+
+    @timed("solve.output_expr")
     def build_output_expr(self):
         """ Check if self.app_state.outexpr is valid and return symbolic expression
 
@@ -1107,37 +1552,194 @@ class Engine:
 
         return None
 
-    def get_list_input_output_expressions(self):
-        # Get a (non-complete) list of input/output expressions
-        # to fill the UI combo boxes
-
-        input_exprs = []
-        output_exprs = []
+    def build_output_numeric(self, X: np.ndarray, s_vec: np.ndarray, vals: dict):
+        """ Numeric counterpart of build_output_expr
 
-        # Node Voltages as output expressions
-        for el in self.nodes:
-            if not el == "0":
-                output_exprs.append("V(" + el + ")")
+        Arguments:
+            X: Solution of the numeric problem (npoints x N), with input source value equal to 1
+            s_vec: Complex frequencies (npoints)
+            vals: Numeric element values used to fill up the problem matrices
 
-        # Element voltages and currents as output expressions
-        for key, f in self.netlist_fields.items():
-            c = f[0][0].upper()
-            if c in "RLCEFGH":
-                output_exprs.append("V(" + f[0] + ")")
-                output_exprs.append("I(" + f[0] + ")")
+        Returns:
+            None, if self.app_state.outexpr is not valid
+            Complex transfer function (npoints), if self.app_state.outexpr is valid
+        """
 
-        # Fixed Vsource: V as input expression, I as output expression
-        # Fixed Isource: I as input expresssion, V as output expression
-        for key, f in self.netlist_fields.items():
-            c = f[0][0].upper()
-            if c == 'V':
-                input_exprs.append(f[0])
-                output_exprs.append("I(" + f[0] + ")")
-            elif c == 'I':
-                input_exprs.append(f[0])
-                output_exprs.append("V(" + f[0] + ")")
+        if not self.validate_input_expr():
+            return None
 
-        return input_exprs, output_exprs
+        valid = self.validate_output_expr()
+
+        if valid is None:
+            return None
+
+        # Same conventions as build_output_expr
+        if valid[0] == 'V':
+            out_n = valid[1]
+            out_p = valid[2]
+
+            if out_n == 0:
+                return X[:, out_p-1]
+            elif out_p == 0:
+                return -X[:, out_n-1]
+            else:
+                return X[:, out_p-1] - X[:, out_n-1]
+
+        elif valid[0] == 'Ibranch':
+            idx = len(self.nodes) - 1 + self.branches.index(valid[1])
+            return X[:, idx]
+
+        elif valid[0] == 'Ielem':
+            f = self.netlist_fields[valid[1]]
+            c = f[0][0].upper()
+
+            out_p = self.get_node(f[1])
+            out_n = self.get_node(f[2])
+
+            if c == 'R': gg = 1 / vals[valid[1]]  # R
+            else: gg = s_vec * vals[valid[1]]  # C
+
+            if out_n == 0:
+                return X[:, out_p-1] * gg
+            elif out_p == 0:
+                return -X[:, out_n-1] * gg
+            else:
+                return (X[:, out_p-1] - X[:, out_n-1]) * gg
+
+        elif valid[0] in 'ZYLC':
+            input_type = valid[1]
+
+            if input_type == "V":
+                voltage = np.ones_like(s_vec)
+                idx = len(self.nodes) - 1 + self.branches.index(valid[2].upper())
+                current = X[:, idx]
+
+            elif input_type == "I":
+                current = np.ones_like(s_vec)
+                f = self.netlist_fields[valid[2]]
+
+                out_p = self.get_node(f[1])
+                out_n = self.get_node(f[2])
+
+                if out_n == 0:
+                    voltage = X[:, out_p-1]
+                elif out_p == 0:
+                    voltage = -X[:, out_n-1]
+                else:
+                    voltage = X[:, out_p-1] - X[:, out_n-1]
+            else:
+                assert 0
+
+            if valid[0].upper() == "Z":
+                return -voltage / current
+            elif valid[0].upper() == "Y":
+                return -current / voltage
+            elif valid[0].upper() == "L":
+                return -voltage / current / s_vec
+            elif valid[0].upper() == "C":
+                return -current / voltage / s_vec
+
+        return None
+
+    def get_numeric_values(self, elems: dict):
+        """
+        Return a dict with the numeric value of every element, to fill up the numeric problem matrices.
+
+        Arguments:
+            elems: Values of the non-fixed elements (initial or optimized values)
+        """
+
+        vals = {}
+
+        # Superposition principle, the input source is 1 and the other sources are 0
+        for key in list(self.sources_dc.keys()) + list(self.sources_ac.keys()):
+            vals[key] = 1.0 if key == self.app_state.inexpr.upper() else 0.0
+
+        vals.update(self.elems_fixed)
+        vals.update(elems)
+
+        # Evaluate expressions in element values
+        for key, el in self.elems_expr.items():
+            vals[key] = float(el.subs({self.sym[k]: v for k, v in vals.items()}))
+
+        return vals
+
+    @timed("numeric_response")
+    def get_numeric_response(self, elems: dict, f_vec: np.ndarray):
+        """
+        Fill up the MNA matrices with numeric values and solve them for all frequencies.
+
+        Arguments:
+            elems: Values of the non-fixed elements (initial or optimized values)
+            f_vec: Frequency points
+
+        Returns:
+            Complex transfer function evaluated in f_vec, or None if the circuit cannot be solved.
+        """
+
+        try:
+            vals = self.get_numeric_values(elems)
+
+            n = len(self.nodes) - 1 + len(self.branches)
+            s_vec = 2 * np.pi * 1j * f_vec
+
+            # Big circuits use sparse matrices, small ones a dense batched solve
+            use_sparse = len(self.nodes) - 1 > self.app_state.sparse_threshold
+
+            if use_sparse:
+                G = TripletMatrix()
+                C = TripletMatrix()
+            else:
+                G = np.zeros((n, n))
+                C = np.zeros((n, n))
+            M = np.zeros((n, 1))
+
+            for key, f in self.netlist_fields.items():
+                if not self.stamp(G, C, M, key, f, vals):
+                    return None
+
+            if use_sparse:
+                X = self.sparse_solver.solve(G, C, M, s_vec)
+            else:
+                X = solve_dense(G, C, M, s_vec)
+
+        except (np.linalg.LinAlgError, RuntimeError, ZeroDivisionError, TypeError) as error:
+            self.error_print("solve: unsolvable system: " + str(error))
+            return None
+
+        return self.build_output_numeric(X, s_vec, vals)
+
+    def get_list_input_output_expressions(self):
+        # Get a (non-complete) list of input/output expressions
+        # to fill the UI combo boxes
+
+        input_exprs = []
+        output_exprs = []
+
+        # Node Voltages as output expressions
+        for el in self.nodes:
+            if not el == "0":
+                output_exprs.append("V(" + el + ")")
+
+        # Element voltages and currents as output expressions
+        for key, f in self.netlist_fields.items():
+            c = f[0][0].upper()
+            if c in "RLCEFGH":
+                output_exprs.append("V(" + f[0] + ")")
+                output_exprs.append("I(" + f[0] + ")")
+
+        # Fixed Vsource: V as input expression, I as output expression
+        # Fixed Isource: I as input expresssion, V as output expression
+        for key, f in self.netlist_fields.items():
+            c = f[0][0].upper()
+            if c == 'V':
+                input_exprs.append(f[0])
+                output_exprs.append("I(" + f[0] + ")")
+            elif c == 'I':
+                input_exprs.append(f[0])
+                output_exprs.append("V(" + f[0] + ")")
+
+        return input_exprs, output_exprs
 
 
         ################################################################################################################
@@ -1167,117 +1769,294 @@ class Engine:
 
         return optimized_vals, makeup_gain
 
-    def optimize(self):
+    @timed("compile.lambdify")
+    def compile_expr(self, args: list, expr):
+        """
+        Compile a symbolic expression (or list of expressions) into a NumPy function of args.
 
-        # Added for batch mode, redundant in GUI mode
-        self.f_vec = self.get_f_axis()
-        self.b_target  = self.get_freqresponse(self.get_h_target())
+        If app_state.compile_cse is enabled, common subexpressions are extracted with
+        sp.cse before compiling, so repeated products of element symbols are evaluated only once.
+        """
 
-        def resfun(xin):
-            """
-            Called by optimization on each iteration to calculate the residues.
+        if not self.app_state.compile_cse:
+            return lambdify(args, expr, 'numpy')
 
-            Also called by outfun to calculate the frequency response at each step (b_step)
+        start_time = time.time()
+        is_list = isinstance(expr, list)
+        replacements, reduced = sp.cse(expr, list=is_list)
 
-            When called by the least squares algorithm, we use lambda to keep only first return variable.
+        # Report operation count reduction
+        ops_before = sp.count_ops(expr) if not is_list else sum(sp.count_ops(el) for el in expr)
+        ops_after = sum(sp.count_ops(el) for _, el in replacements)
+        ops_after += sp.count_ops(reduced) if not is_list else sum(sp.count_ops(el) for el in reduced)
+        self.debug_print("compile_expr: cse reduced {} operations to {} ({} subexpressions, {:.2f}s)".format(
+            ops_before, ops_after, len(replacements), time.time() - start_time))
 
-            Shape of the residue vector can change depending on which features are enabled:
-                mag_residue[npoints], ph_residue[npoints], regularization[residues_reg], makeup_gain[1]
-            """
+        return lambdify(args, expr, 'numpy', cse=lambda e: (replacements, reduced))
 
-            if self.app_state.makeup_gain:
-                x = xin[0:-1]
-                if self.app_state.log_transform:
-                    makeup_gain_db = 20*np.log10(np.exp(xin[-1]))
-                else:
-                    makeup_gain_db = 20*np.log10(xin[-1])
+    def compile_rational(self, h_expr, h_syms: list):
+        """
+        Split a transfer function into numerator and denominator polynomials in s,
+        and compile their coefficients as functions of the element symbols.
+
+        Arguments:
+            h_expr: Symbolic rational function of s and the symbols in h_syms
+            h_syms: List of element symbols, in the same order as the arguments of the compiled functions
+
+        Returns:
+            Tuple of two functions (num_coeffs(*x), den_coeffs(*x)) returning the list of coefficients
+            of the numerator and denominator, highest power of s first (same order as np.polyval).
+            None, if h_expr is not a rational function of s.
+        """
+
+        num, den = sp.fraction(sp.together(h_expr))
+
+        try:
+            num_coeffs = sp.Poly(num, self.s).all_coeffs()
+            den_coeffs = sp.Poly(den, self.s).all_coeffs()
+        except sp.PolynomialError:
+            self.debug_print("compile_rational: transfer function is not a rational function of s")
+            return None
+
+        return self.compile_expr(h_syms, num_coeffs), self.compile_expr(h_syms, den_coeffs)
+
+    def compile_h(self, h_expr, h_syms: list):
+        """
+        Compile a symbolic transfer function for fast evaluation over self.f_vec.
+
+        Arguments:
+            h_expr: Symbolic expression of s and the symbols in h_syms
+            h_syms: List of element symbols, in the same order as the arguments of the compiled function
+
+        Returns:
+            A function h(*x) returning the complex frequency response for the element values x.
+        """
+
+        if self.app_state.compile_mode == "rational":
+            # Evaluate numerator and denominator polynomials in s with Horner's method
+            h_coeffs = self.compile_rational(h_expr, h_syms)
+
+            if h_coeffs is not None:
+                s_vec = 2 * np.pi * 1j * self.f_vec
+                num_coeffs, den_coeffs = h_coeffs
+
+                def h_rational(*x):
+                    return polyval(num_coeffs(*x), s_vec) / polyval(den_coeffs(*x), s_vec)
+
+                return h_rational
+
+        if self.app_state.compile_mode == "subs":
+            # Substitute each frequency point and compile a list of npoints expressions.
+            # Compile time and size of the generated function grow with npoints.
+            h_vec = []
+            for f in self.f_vec:
+                h_vec.append(h_expr.subs(self.s, 2 * sp.pi * 1j * f))
+
+            return self.compile_expr(h_syms, h_vec)
+
+        else:
+            # Compile once as a function of the elements and s, evaluate all frequency points in one call
+            s_vec = 2 * np.pi * 1j * self.f_vec
+            h_lambd = self.compile_expr(h_syms + [self.s], h_expr)
+
+            def h_vectorized(*x):
+                # Multiply by ones in case h_expr does not depend on s
+                return h_lambd(*x, s_vec) * np.ones_like(s_vec)
+
+            return h_vectorized
+
+    def compile_jac(self, h_expr, h_syms: list):
+        """
+        Compile the derivatives of a transfer function with respect to each element symbol.
+
+        Arguments:
+            h_expr: Symbolic expression of s and the symbols in h_syms
+            h_syms: List of element symbols, in the same order as the arguments of the compiled function
+
+        Returns:
+            A function dh(*x) returning a complex (len(h_syms) x npoints) array,
+            where row i is dH/dx_i evaluated over self.f_vec.
+        """
+
+        s_vec = 2 * np.pi * 1j * self.f_vec
+        dh_exprs = [sp.diff(h_expr, el) for el in h_syms]
+        dh_lambd = self.compile_expr(h_syms + [self.s], dh_exprs)
+
+        def dh_vectorized(*x):
+            # Multiply by ones in case a derivative does not depend on s
+            dh = [el * np.ones_like(s_vec) for el in dh_lambd(*x, s_vec)]
+            return np.reshape(np.array(dh), (len(h_syms), len(s_vec)))
+
+        return dh_vectorized
+
+    @timed("resfun")
+    def resfun(self, xin):
+        """
+        Called by optimization on each iteration to calculate the residues.
+
+        Also called by outfun to calculate the frequency response at each step (b_step)
+
+        When called by the least squares algorithm, we use lambda to keep only first return variable.
+
+        Shape of the residue vector can change depending on which features are enabled:
+            mag_residue[npoints], ph_residue[npoints], regularization[residues_reg], makeup_gain[1]
+
+        xin can also be a (n_candidates x n_params) array, to evaluate a whole population at once
+        (differential evolution). Then residues is (n_candidates x n_residues) and b_step is
+        (n_candidates x 2 x npoints).
+        """
+
+        xin = np.asarray(xin)
+
+        if self.app_state.makeup_gain:
+            x = xin[..., 0:-1]
+            if self.app_state.log_transform:
+                makeup_gain_db = 20*np.log10(np.exp(xin[..., -1]))
             else:
-                x = xin
-                makeup_gain_db = 0
+                makeup_gain_db = 20*np.log10(xin[..., -1])
+        else:
+            x = xin
+            makeup_gain_db = np.zeros(xin.shape[:-1])
 
+        if xin.ndim == 1:
             # asterisk=unpack elements of list and pass them as separate parameters
             h_vec = self.h_compiled(*x)
+        elif self.h_batch:
+            # Each parameter as a column vector, broadcast against the frequency axis
+            h_vec = self.h_compiled(*x.T[:, :, np.newaxis])
+            h_vec = np.broadcast_to(h_vec, (x.shape[0], len(self.f_vec)))
+        else:
+            h_vec = np.array([self.h_compiled(*el) for el in x])
 
-            # Calculate frequency response (b_step)
-            if self.app_state.magnitude_in_dB:
-                b_step = np.vstack((20 * np.log10(np.abs(h_vec)),
-                                         np.unwrap(np.angle(h_vec)) * 180 / np.pi))
-            else:
-                b_step = np.vstack((np.abs(h_vec),
-                                         np.unwrap(np.angle(h_vec)) * 180 / np.pi))
-
-            residues = []
-
-            # Magnitude optimization
-            if self.app_state.optimize_mag:
-                residues_mag = b_step[0, :] - self.b_target[0, :] + makeup_gain_db
-                residues = np.concatenate((residues, self.app_state.weight_mag * residues_mag))
-
-            # Phase optimization
-            if self.app_state.optimize_phase:
-                residues_phase = b_step[1, :] - self.b_target[1, :]
-                residues = np.concatenate((residues, self.app_state.weight_phase * residues_phase))
-
-            # Regularization: Minimize difference between optimized and initial value
-            npoints = float(len(b_step[0, :]))
-            if self.app_state.optimize_reg:
-                if self.app_state.makeup_gain:
-                    x_initial_nogain = self.x_initial[0:-1]
-                else:
-                    x_initial_nogain = self.x_initial
+        # Calculate frequency response (b_step)
+        if self.app_state.magnitude_in_dB:
+            b_step = np.stack((20 * np.log10(np.abs(h_vec)),
+                               np.unwrap(np.angle(h_vec)) * 180 / np.pi), axis=-2)
+        else:
+            b_step = np.stack((np.abs(h_vec),
+                               np.unwrap(np.angle(h_vec)) * 180 / np.pi), axis=-2)
+
+        residues = np.zeros(xin.shape[:-1] + (0,))
 
-                residues_reg = np.array(x - x_initial_nogain)
-                residues = np.concatenate((residues, self.app_state.weight_reg * residues_reg
-                                           * np.sqrt(npoints / float(len(residues_reg)))))
+        # Magnitude optimization
+        if self.app_state.optimize_mag:
+            residues_mag = b_step[..., 0, :] - self.b_target[0, :] + makeup_gain_db[..., np.newaxis]
+            residues = np.concatenate((residues, self.app_state.weight_mag * residues_mag), axis=-1)
 
-            # The residue corresponding to the make up gain
+        # Phase optimization
+        if self.app_state.optimize_phase:
+            residues_phase = b_step[..., 1, :] - self.b_target[1, :]
+            residues = np.concatenate((residues, self.app_state.weight_phase * residues_phase), axis=-1)
+
+        # Regularization: Minimize difference between optimized and initial value
+        npoints = float(b_step.shape[-1])
+        if self.app_state.optimize_reg:
             if self.app_state.makeup_gain:
-                residues = np.concatenate((residues, [self.app_state.weight_amp * makeup_gain_db * np.sqrt(npoints)]))
+                x_initial_nogain = self.x_initial[0:-1]
+            else:
+                x_initial_nogain = self.x_initial
 
-            # Optimization algorithms from SciPy only need the residues,
-            # so you need to wrap this function as lambda(x): outfun(x)[0] when passing it to the optimization algorithm
-            # We can use returned b_step for plotting so we do not have to repeat the code elsewhere
-            return residues, b_step
+            residues_reg = x - np.array(x_initial_nogain)
+            residues = np.concatenate((residues, self.app_state.weight_reg * residues_reg
+                                       * np.sqrt(npoints / float(residues_reg.shape[-1]))), axis=-1)
 
-        def outfun(intermediate_result: OptimizeResult):
-            """
-            Called on each iteration of the optimizaton to plot the intermediate results
-            """
+        # The residue corresponding to the make up gain
+        if self.app_state.makeup_gain:
+            residues = np.concatenate((residues, self.app_state.weight_amp * makeup_gain_db[..., np.newaxis]
+                                       * np.sqrt(npoints)), axis=-1)
+
+        # Keep the frequency response of the last evaluations, so that outfun can reuse it
+        if xin.ndim == 1:
+            with self.b_step_lock:
+                self.b_step_cache[xin.tobytes()] = b_step
+                if len(self.b_step_cache) > 2 * len(xin) + 2:  # Enough for the finite differences Jacobian
+                    del self.b_step_cache[next(iter(self.b_step_cache))]
+
+        # Optimization algorithms from SciPy only need the residues,
+        # so you need to wrap this function as lambda(x): outfun(x)[0] when passing it to the optimization algorithm
+        # We can use returned b_step for plotting so we do not have to repeat the code elsewhere
+        return residues, b_step
+
+    def get_b_step(self, x):
+        """ Frequency response for the optimization variables x, reusing resfun evaluations if possible """
+
+        with self.b_step_lock:
+            b_step = self.b_step_cache.get(np.asarray(x).tobytes())
+        if b_step is None:
+            _, b_step = self.resfun(x)
+        return b_step
+
+    @timed("jacfun")
+    def jacfun(self, xin):
+        """
+        Analytic Jacobian of the residues returned by resfun, using the compiled derivatives of
+        the transfer function (self.dh_compiled). Called by least squares instead of finite differences.
+
+        With dlogH = (dH/dx) / H for each optimized element:
+            d(20*log10|H|)/dx = 20/ln(10) * Re(dlogH)
+            d|H|/dx = |H| * Re(dlogH)
+            d(phase in degrees)/dx = 180/pi * Im(dlogH)
+        If log_transform is enabled, the derivatives are already with respect to log(x).
+        """
 
-            self.iteration = intermediate_result.nit
-            if hasattr(intermediate_result, "cost"):
-                self.resnorm = intermediate_result.cost
+        if self.app_state.makeup_gain:
+            x = xin[0:-1]
+            if self.app_state.log_transform:
+                d_makeup_gain_db = 20 / np.log(10)
             else:
-                self.resnorm = np.sqrt(np.sum(np.power(intermediate_result.fun, 2)))
+                d_makeup_gain_db = 20 / (np.log(10) * xin[-1])
+        else:
+            x = xin
+            d_makeup_gain_db = 0
 
-            self.optimized_vals, self.makeup_gain = self.unpack_x(intermediate_result.x)
-            self.n, self.b_step = resfun(intermediate_result.x)
+        h_vec = np.asarray(self.h_compiled(*x))
+        d_log_h = self.dh_compiled(*x) / h_vec
 
-            # Print make-up gain if enabled
-            str_makeup = " makeup_gain: {:.2f}".format(self.makeup_gain) if self.app_state.makeup_gain else ""
+        npoints = float(len(h_vec))
+        gain_cols = 1 if self.app_state.makeup_gain else 0
+        jac = []
 
-            self.info_print("optimize: step " + str(self.iteration) +
-                            ": resnorm={:.2f}".format(self.resnorm) + str_makeup,
-                            event_type="optim_step")
+        # Magnitude optimization
+        if self.app_state.optimize_mag:
+            if self.app_state.magnitude_in_dB:
+                jac_mag = 20 / np.log(10) * np.real(d_log_h)
+            else:
+                jac_mag = np.abs(h_vec) * np.real(d_log_h)
+            jac_gain = np.full((1, len(h_vec)), d_makeup_gain_db)[0:gain_cols]
+            jac.append(self.app_state.weight_mag * np.vstack((jac_mag, jac_gain)).T)
+
+        # Phase optimization
+        if self.app_state.optimize_phase:
+            jac_phase = 180 / np.pi * np.imag(d_log_h)
+            jac_gain = np.zeros((gain_cols, len(h_vec)))
+            jac.append(self.app_state.weight_phase * np.vstack((jac_phase, jac_gain)).T)
+
+        # Regularization
+        if self.app_state.optimize_reg:
+            jac_reg = np.hstack((np.eye(len(x)), np.zeros((len(x), gain_cols))))
+            jac.append(self.app_state.weight_reg * jac_reg * np.sqrt(npoints / float(len(x))))
+
+        # The residue corresponding to the make up gain
+        if self.app_state.makeup_gain:
+            jac_gain = np.zeros((1, len(xin)))
+            jac_gain[0, -1] = self.app_state.weight_amp * d_makeup_gain_db * np.sqrt(npoints)
+            jac.append(jac_gain)
 
-            # Print values on each iteration
-            if self.app_state._debug:
-                s = ""
-                for key, val in self.optimized_vals.items():
-                    s = s + key + "=" + num2eng(val, ndigits=3) + ", "
-                s = s[0:-2]  # Remove last comma
-                self.debug_print(s)
+        return np.vstack(jac)
 
-            # Check if the stop flag is set to cancel ongoing optimization
-            if self.stop_flag:
-                self.stop_flag = False
-                #raise StopIteration
-                return True
-            else:
-                # This is to avoid the UI becoming unresponsive
-                if not self.app_state._batch_mode:
-                    time.sleep(0.5)
-                return False
+    @timed("compile")
+    def prepare_optimize(self):
+        """
+        Build the vectors of initial values and bounds, the target response and the
+        compiled transfer function used by resfun. Needs a successful parse and solve.
+
+        Returns:
+            The jac argument for least squares (jacfun, or the finite differences method)
+        """
+
+        # Added for batch mode, redundant in GUI mode
+        self.f_vec = self.get_f_axis()
+        self.b_target = self.get_target_freqresponse()
 
         # Prepare initial vectors to call optimization function
         self.x_initial = []
@@ -1294,10 +2073,7 @@ class Engine:
             self.names.append(key)
 
         # Do logarithmic transform
-        h_compiled_expr = self.output_expr  # .copy() removed
         if self.app_state.log_transform:
-            for el in h_compiled_syms:
-                h_compiled_expr = h_compiled_expr.subs(el, sp.exp(el))
             for i, x in enumerate(self.x_initial):
                 self.x_initial[i] = math.log(x)
             for i, x in enumerate(self.x_min):
@@ -1305,13 +2081,28 @@ class Engine:
             for i, x in enumerate(self.x_max):
                 self.x_max[i] = math.log(x)
 
-        # Get a big vector that depends on component values
-        h_compiled_vec = []
-        for f in self.f_vec:
-            h_compiled_vec.append(h_compiled_expr.subs(self.s, 2 * sp.pi * 1j * f))
+        if self.solver_mode == "numeric":
+            # No symbolic expression, solve the numeric matrices on each call
+            def h_numeric(*x):
+                if self.app_state.log_transform:
+                    x = np.exp(x)
+                return self.get_numeric_response(dict(zip(self.names, x)), self.f_vec)
 
-        # Compile sympy function for fast evaluation
-        self.h_compiled = lambdify(h_compiled_syms, h_compiled_vec, 'numpy')
+            self.h_compiled = h_numeric
+            self.h_batch = False
+        else:
+            h_compiled_expr = self.output_expr  # .copy() removed
+            if self.app_state.log_transform:
+                for el in h_compiled_syms:
+                    h_compiled_expr = h_compiled_expr.subs(el, sp.exp(el))
+
+            # Compile sympy function for fast evaluation
+            self.h_compiled = self.compile_h(h_compiled_expr, h_compiled_syms)
+            self.h_batch = self.app_state.compile_mode != "subs"  # One expression per frequency point
+
+            # Compile derivatives for the analytic Jacobian
+            if self.app_state.jac_method == "analytic":
+                self.dh_compiled = self.compile_jac(h_compiled_expr, h_compiled_syms)
 
         # If make up gain is enabled, add initial, max and min to the vectors
         if self.app_state.makeup_gain:
@@ -1323,42 +2114,287 @@ class Engine:
                 self.x_min[-1] = math.log(self.x_min[-1])
                 self.x_max[-1] = math.log(self.x_max[-1])
 
+        # Jacobian: Analytic from the symbolic derivatives, or finite differences as fallback
+        if self.app_state.jac_method == "analytic":
+            if self.solver_mode == "numeric":
+                # No symbolic expression to differentiate
+                self.debug_print("optimize: analytic Jacobian needs a symbolic solver, using finite differences")
+                return '2-point'
+            else:
+                return self.jacfun
+        else:
+            return self.app_state.jac_method
+
+    def run_least_squares(self, x0, jac, callback=None):
+        """ One least squares run (trf or dogbox) starting from x0 """
+
+        return least_squares(fun=lambda x: self.resfun(x)[0],
+                             jac=jac,
+                             x0=x0,
+                             bounds=(self.x_min, self.x_max),
+                             method=self.app_state.optim_method,
+                             loss='soft_l1',
+                             args=(),  # Needed variables accessed via self.xxx
+                             xtol=self.app_state.xtol, ftol=self.app_state.ftol, gtol=self.app_state.gtol,
+                             x_scale='jac',
+                             max_nfev=self.app_state.max_nfev, diff_step=self.app_state.diff_step,
+                             callback=callback)
+
+    def run_differential_evolution(self, callback=None, seed=None):
+        """
+        Differential evolution over the bounds.
+
+        If the compiled transfer function broadcasts (h_batch), the whole population is
+        evaluated in one call of resfun (vectorized=True). Otherwise, candidates can be
+        evaluated in de_workers processes (see MultiStart.de_cost), each one with its own Engine.
+        The population is updated once per generation in all cases, so the result does not
+        depend on the number of workers.
+
+        Arguments:
+            callback: Called after each generation, stops the optimization if it returns True
+            seed: Seed of the random generator, for reproducible runs
+        """
+
+        def cost(x):
+            # With vectorized=True, x is (n_params x n_candidates)
+            return np.sum(np.power(self.resfun(np.transpose(x))[0], 2), axis=-1)
+
+        n_workers = int(self.app_state.de_workers)
+        if n_workers <= 0:
+            n_workers = os.cpu_count()
+
+        if self.h_batch:
+            return differential_evolution(func=cost,
+                                          x0=self.x_initial,
+                                          bounds=Bounds(lb=self.x_min, ub=self.x_max),
+                                          vectorized=True, updating='deferred',
+                                          seed=seed, callback=callback)
+        elif n_workers > 1:
+            # Imported here, MultiStart imports Engine
+            from MultiStart import multistart_init, de_cost
+
+            # Spawn instead of fork, the GUI process has running threads
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx,
+                                     initializer=multistart_init,
+                                     initargs=self.get_worker_initargs(ctx.Event())) as executor:
+
+                def workers(func, population):
+                    # Compiled functions cannot be pickled, the workers evaluate de_cost with their
+                    # own Engine instead of func (cost). The final polish runs cost in this process.
+                    chunksize = max(1, len(population) // n_workers)
+                    return executor.map(de_cost, population, chunksize=chunksize)
+
+                return differential_evolution(func=cost,
+                                              x0=self.x_initial,
+                                              bounds=Bounds(lb=self.x_min, ub=self.x_max),
+                                              workers=workers, updating='deferred',
+                                              seed=seed, callback=callback)
+        else:
+            return differential_evolution(func=cost,
+                                          x0=self.x_initial,
+                                          bounds=Bounds(lb=self.x_min, ub=self.x_max),
+                                          updating='deferred',
+                                          seed=seed, callback=callback)
+
+    def get_worker_initargs(self, abort):
+        """ Arguments of MultiStart.multistart_init, to build the Engine of a worker process """
+
+        # Workers get a copy of the state without the private attributes (callbacks cannot be pickled)
+        state = {key: val for key, val in self.app_state.items() if not key.startswith("_")}
+        state["solver_mode"] = self.solver_mode  # Solver chosen in "auto" mode
+
+        return state, "\n".join(self.lines), self.output_expr, abort
+
+    def optimize_multistart(self):
+        """
+        Run multistart_n least squares problems from different starting points in parallel
+        worker processes (see MultiStart), and keep the best one.
+
+        The first start is x_initial, the others a Latin hypercube sample of the bounds.
+        All results are stored in self.multistart_results, sorted by cost.
+
+        Returns:
+            OptimizeResult of the best run, or None if stopped by the user
+        """
+
+        # Imported here, MultiStart imports Engine
+        from MultiStart import get_starting_points, multistart_init, multistart_run
+
+        n_starts = int(self.app_state.multistart_n)
+        n_workers = int(self.app_state.multistart_workers)
+        if n_workers <= 0:
+            n_workers = os.cpu_count()
+
+        x_starts = get_starting_points(self.x_initial, self.x_min, self.x_max, n_starts,
+                                       log_space=not self.app_state.log_transform)
+
+        self.info_print("optimize: multi-start, {} starting points on {} processes".format(n_starts, n_workers))
+        start_time = time.time()
+
+        # Spawn instead of fork, the GUI process has running threads
+        ctx = multiprocessing.get_context("spawn")
+        abort = ctx.Event()  # Stops the running starts
+        executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx,
+                                       initializer=multistart_init,
+                                       initargs=self.get_worker_initargs(abort))
+
+        futures = {executor.submit(multistart_run, x0): idx for idx, x0 in enumerate(x_starts)}
+        pending = set(futures.keys())
+        results = []
+
+        while len(pending) > 0:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+            # Check if the stop flag is set to cancel ongoing optimization, the running starts
+            # finish their current iteration, and the workers exit
+            if self.stop_flag:
+                self.stop_flag = False
+                abort.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+                return None
+
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as error:
+                    result = {"x": x_starts[futures[future]], "cost": np.inf, "nfev": 0,
+                              "success": False, "message": str(error)}
+
+                result["start"] = futures[future]
+                results.append(result)
+
+                # Report best result so far
+                best = min(results, key=lambda r: r["cost"])
+                self.iteration = len(results)
+                self.resnorm = best["cost"]
+                self.optimized_vals, self.makeup_gain = self.unpack_x(best["x"])
+                self.b_step = self.get_b_step(best["x"])
+
+                self.info_print("optimize: start {} of {} finished: cost={:.4g}, best={:.4g}".format(
+                    len(results), n_starts, result["cost"], best["cost"]), event_type="optim_step")
+
+        executor.shutdown()
+
+        results.sort(key=lambda r: r["cost"])
+        for result in results:
+            result["values"], result["makeup_gain"] = self.unpack_x(result["x"])
+        self.multistart_results = results
+
+        self.info_print("optimize: multi-start finished ({:.2f}s), best cost={:.4g} from start {}".format(
+            time.time() - start_time, results[0]["cost"], results[0]["start"]))
+        self.debug_print(self.multistart_table())
+
+        best = results[0]
+        return OptimizeResult(x=best["x"], cost=best["cost"], nfev=best["nfev"],
+                              success=best["success"], message=best["message"])
+
+    def multistart_table(self):
+        """ Text table of the multi-start results, best first """
+
+        txt = "Rank  Start        Cost   nfev  Values\n"
+        for rank, result in enumerate(self.multistart_results):
+            values = ", ".join(key + "=" + num2eng(val, ndigits=3) for key, val in result["values"].items())
+            if self.app_state.makeup_gain:
+                values += ", makeup_gain={:.3f}".format(result["makeup_gain"])
+            txt += "{:4d}  {:5d}  {:10.4g}  {:5d}  {}\n".format(rank + 1, result["start"], result["cost"],
+                                                               result["nfev"], values)
+        return txt
+
+    @timed("optimize")
+    def optimize(self):
+
+        def outfun(intermediate_result: OptimizeResult):
+            """
+            Called on each iteration of the optimizaton to plot the intermediate results
+
+            Progress is published at most progress_rate times per second, and without
+            evaluating the residues again if the optimizer already did it for this step.
+            """
+
+            now = time.perf_counter(), time.process_time()
+            self.timings.record("optimize.iteration", now[0] - self.iteration_time[0], now[1] - self.iteration_time[1])
+            self.iteration_time = now
+
+            self.iteration = intermediate_result.nit
+            if hasattr(intermediate_result, "cost"):
+                self.resnorm = intermediate_result.cost
+            else:
+                self.resnorm = np.sqrt(np.sum(np.power(intermediate_result.fun, 2)))
+
+            # Check if the stop flag is set to cancel ongoing optimization
+            if self.stop_flag:
+                self.stop_flag = False
+                #raise StopIteration
+                return True
+
+            now = time.time()
+            if now - self.progress_time < 1.0 / self.app_state.progress_rate:
+                return False
+            self.progress_time = now
+
+            self.optimized_vals, self.makeup_gain = self.unpack_x(intermediate_result.x)
+            self.b_step = self.get_b_step(intermediate_result.x)
+
+            # Print make-up gain if enabled
+            str_makeup = " makeup_gain: {:.2f}".format(self.makeup_gain) if self.app_state.makeup_gain else ""
+
+            self.info_print("optimize: step " + str(self.iteration) +
+                            ": resnorm={:.2f}".format(self.resnorm) + str_makeup,
+                            event_type="optim_step")
+
+            # Print values on each iteration
+            if self.app_state._debug:
+                s = ""
+                for key, val in self.optimized_vals.items():
+                    s = s + key + "=" + num2eng(val, ndigits=3) + ", "
+                s = s[0:-2]  # Remove last comma
+                self.debug_print(s)
+
+            return False
+
+        self.stop_flag = False  # Stop pressed after the previous solve finished
+        jac = self.prepare_optimize()
+        self.multistart_results = None
+        self.b_step_cache = {}
+        self.progress_time = 0
+        self.iteration_time = time.perf_counter(), time.process_time()
+
         # Run optimization algorithm
         try:
             if self.app_state.optim_method == 'trf' or self.app_state.optim_method == 'dogbox':
-                res = least_squares(fun=lambda x: resfun(x)[0],
-                                    x0=self.x_initial,
-                                    bounds=(self.x_min, self.x_max),
-                                    method=self.app_state.optim_method,
-                                    loss='soft_l1',
-                                    args=(),  # Needed variables accessed via self.xxx
-                                    xtol=self.app_state.xtol, ftol=self.app_state.ftol, gtol=self.app_state.gtol,
-                                    x_scale='jac',
-                                    max_nfev=self.app_state.max_nfev, diff_step=self.app_state.diff_step,
-                                    callback=outfun)
+                if int(self.app_state.multistart_n) > 1:
+                    res = self.optimize_multistart()
+                    if res is None:
+                        self.info_print("optimize: stopped", event_type="optim_cancelled")
+                        return True
+                else:
+                    res = self.run_least_squares(self.x_initial, jac, callback=outfun)
             elif self.app_state.optim_method == "differential_evolution":
-                res = differential_evolution(func=lambda x: np.sum(np.power(resfun(x)[0], 2)),
-                                             x0 = self.x_initial,
-                                             bounds=Bounds(lb=self.x_min, ub=self.x_max),
-                                             callback=outfun)
+                res = self.run_differential_evolution(callback=outfun)
             else:
                 self.error_print("optimize: unknown method", event_type="optim_error")
                 return
 
             self.optimized_vals, self.makeup_gain = self.unpack_x(res.x)
 
-            self.h_final = self.output_expr  # .copy() removed
+            if self.solver_mode == "numeric":
+                # Numeric transfer function is represented by its element values
+                self.h_final = self.optimized_vals.copy()
+            else:
+                self.h_final = self.output_expr  # .copy() removed
 
-            for key, val in self.optimized_vals.items():
-                self.h_final = self.h_final.subs(self.sym[key], val)
+                for key, val in self.optimized_vals.items():
+                    self.h_final = self.h_final.subs(self.sym[key], val)
 
-            self.h_final = sp.simplify(self.h_final)
+                self.h_final = sp.simplify(self.h_final)
 
             if res.success:
                 str_makeup = " makeup_gain: {:.2f}".format(self.makeup_gain) if self.app_state.makeup_gain else ""
                 self.info_print("optimize: " + res.message + str_makeup, event_type="optim_ok")
                 self.debug_print("Optimized transfer function:")
-                self.debug_print(sp.pretty(self.h_final, wrap_line=False, num_columns=2000))
+                self.debug_print(sp.pretty(self.h_final, wrap_line=False, num_columns=2000)
+                                 if isinstance(self.h_final, sp.Expr) else str(self.h_final))
                 return True
             else:
                 self.info_print("optimize: stopped", event_type="optim_cancelled")
@@ -1384,8 +2420,67 @@ class Engine:
                            np.log10(self.app_state.freqmax),
                            int(self.app_state.npoints))
 
+    def get_target_response(self, f_vec: np.ndarray):
+        """
+        Evaluate the target transfer function (magnitude, phase and pztable) over f_vec.
+
+        Each row of pztable is a first or second order section evaluated directly on the
+        s = jw grid, and the sections are multiplied together. Same result as evaluating
+        get_h_target, without building and parsing the symbolic expression.
+
+        Returns:
+            Complex target response evaluated in f_vec
+        """
+
+        if self.app_state.phase == 0:
+            h_vec = np.full(len(f_vec), self.app_state.magnitude, dtype=complex)
+        elif self.app_state.phase == 180 or self.app_state.phase == -180:
+            h_vec = np.full(len(f_vec), -self.app_state.magnitude, dtype=complex)
+        else:
+            h_vec = np.full(len(f_vec), self.app_state.magnitude * np.exp(1j * self.app_state.phase / 180.0 * np.pi))
+
+        s_vec = 2 * np.pi * 1j * np.asarray(f_vec)
+
+        for p in self.app_state.pztable:
+            w0 = 2 * math.pi * p[1]
+            if math.isnan(w0):
+                continue
+
+            if p[0] == 'Pole real' or p[0] == 'Zero real':
+                section = s_vec if w0 == 0.0 else 1 + s_vec / w0
+            elif p[0] == 'Pole pair' or p[0] == 'Zero pair':
+                if w0 == 0.0:
+                    section = s_vec ** 2
+                elif not math.isnan(p[2]):
+                    section = 1 + s_vec / (w0 * p[2]) + (s_vec / w0) ** 2
+                else:
+                    continue
+            else:
+                continue
+
+            if p[0].startswith('Pole'):
+                h_vec /= section
+            else:
+                h_vec *= section
+
+        return h_vec
+
+    def get_target_freqresponse(self):
+        """ Magnitude and phase of the target response over the frequency axis, see get_freqresponse """
+
+        h_vec = self.get_target_response(self.get_f_axis())
+        if self.app_state.magnitude_in_dB and np.any(h_vec == 0):
+            self.error_print("get_freqresponse: transfer function is zero and magnitude is in dB")
+            return None
+        return self.freqresponse_from_h(h_vec)
+
     def get_h_target(self):
-        """Build and return symbolic expression for the target transfer function"""
+        """
+        Build and return symbolic expression for the target transfer function.
+
+        Only needed when the symbolic expression itself is used, the target response
+        is evaluated with get_target_response.
+        """
 
         if self.app_state.phase == 0:
             s = str(self.app_state.magnitude)
@@ -1428,13 +2523,16 @@ class Engine:
 
     def compute_target_freqresponse(self):  # Only used in update_plots
         self.f_vec = self.get_f_axis()
-        self.b_target = self.get_freqresponse(self.get_h_target())
+        self.b_target = self.get_target_freqresponse()
 
 
     def get_freqresponse(self, h_sym):
         """
         Evaluate a symbolic expression over a frequency range.
 
+        With the numeric solver, h_sym is a dict with the values of the non-fixed
+        elements, and the response is obtained by solving the numeric MNA matrices.
+
         Returns:
             A matrix with two rows. First row is the magnitude (in dB or linear)
             and second row the unwrapped phase in degrees.
@@ -1446,7 +2544,11 @@ class Engine:
             self.error_print("get_freqresponse: h_sym is None")
             return None
 
-        if h_sym == 1:
+        if isinstance(h_sym, dict):
+            h_vec = self.get_numeric_response(h_sym, f_vec)
+            if h_vec is None:
+                return None
+        elif h_sym == 1:
             h_vec = np.ones_like(f_vec)
         elif isinstance(h_sym, sp.Float):
             if float(h_sym) == 0:
@@ -1462,8 +2564,14 @@ class Engine:
                         return None
                 h_vec = complex(h_sym) * np.ones_like(f_vec)
             else:
-                h_lambd = lambdify(self.s, h_sym, 'numpy')
-                h_vec = h_lambd(2 * np.pi * 1j * f_vec)
+                rational = self.get_rational(h_sym)
+                if rational is not None:
+                    # Numerator and denominator polynomials, much faster than compiling the expression
+                    s_vec = 2 * np.pi * 1j * f_vec
+                    h_vec = polyval(rational["num"], s_vec) / polyval(rational["den"], s_vec)
+                else:
+                    h_lambd = self.compile_expr([self.s], h_sym)
+                    h_vec = h_lambd(2 * np.pi * 1j * f_vec)
 
                 if isinstance(h_vec, np.ndarray):
                     if h_vec.dtype != np.complex128:
@@ -1486,7 +2594,441 @@ class Engine:
         #if type(h_vec) != list:
         #    h_vec = h_vec * np.ones_like(f_vec)
 
+        return self.freqresponse_from_h(h_vec)
+
+    def freqresponse_from_h(self, h_vec: np.ndarray):
+        """ Magnitude (in dB or linear) and unwrapped phase in degrees of a complex response """
+
         if self.app_state.magnitude_in_dB:
             return np.vstack((20 * np.log10(np.abs(h_vec)), np.unwrap(np.angle(h_vec)) * 180 / np.pi))
         else:
-            return np.vstack((np.abs(h_vec), np.unwrap(np.angle(h_vec)) * 180 / np.pi))
\ No newline at end of file
+            return np.vstack((np.abs(h_vec), np.unwrap(np.angle(h_vec)) * 180 / np.pi))
+
+    def get_rational(self, h_sym):
+        """
+        Numerator and denominator polynomials in s, with numeric coefficients, of a transfer function
+        where s is the only symbol (h_initial or h_final). Cached per expression.
+
+        Returns:
+            Dict with "num" and "den" (complex coefficients, highest power of s first), or None
+            if h_sym is not a rational function of s with numeric coefficients.
+        """
+
+        entry = self.pz_cache.pop(id(h_sym), None)
+        if entry is not None and entry[0] is h_sym:
+            self.pz_cache[id(h_sym)] = entry  # Most recently used last
+            return entry[1]
+
+        if not isinstance(h_sym, sp.Expr) or not h_sym.free_symbols <= {self.s}:
+            return None
+
+        num, den = sp.fraction(sp.together(h_sym))
+        try:
+            num_coeffs = np.array([complex(c) for c in sp.Poly(num, self.s).all_coeffs()])
+            den_coeffs = np.array([complex(c) for c in sp.Poly(den, self.s).all_coeffs()])
+        except (sp.PolynomialError, TypeError):
+            self.debug_print("get_rational: transfer function is not a rational function of s")
+            return None
+
+        if not np.any(den_coeffs != 0):
+            return None
+
+        rational = {"num": num_coeffs, "den": den_coeffs}
+
+        # Only the last few expressions are kept (h_initial, h_final, target), least recently used is removed
+        if len(self.pz_cache) >= 8:
+            self.pz_cache.pop(next(iter(self.pz_cache)))
+        self.pz_cache[id(h_sym)] = (h_sym, rational)
+
+        return rational
+
+    @staticmethod
+    def roots_to_rows(roots: np.ndarray, row_real: str, row_pair: str):
+        """
+        Convert roots in s to rows of pztable, with the same convention as get_h_target:
+        a real root r is (1 + s/w0) with w0 = -r, a complex pair is (1 + s/(w0*q) + s^2/w0^2),
+        and a root at the origin is s. Right half-plane roots get negative frequency or q.
+        """
+
+        rows = []
+        for r in roots:
+            if abs(r.imag) <= 1e-9 * abs(r):
+                rows.append([row_real, -r.real / (2 * math.pi), 1])
+            elif r.imag > 0:
+                # One row per complex conjugate pair
+                w0 = abs(r)
+                rows.append([row_pair, w0 / (2 * math.pi), w0 / (-2 * r.real) if r.real != 0 else math.inf])
+        return rows
+
+    def get_polezero(self, h_sym):
+        """
+        Poles and zeros of a transfer function where s is the only symbol (h_initial or h_final),
+        from the roots of its numerator and denominator polynomials. Cached per expression.
+
+        Returns:
+            Dict with:
+            - "magnitude", "phase": Gain (as app_state.magnitude and phase) at low frequency,
+              without the poles and zeros at the origin
+            - "pztable": Rows [type, freq, q] like app_state.pztable, sorted by frequency
+            - "poles", "zeros": Roots in s
+            None, if h_sym is not a rational function of s (e.g. numeric solver).
+        """
+
+        rational = self.get_rational(h_sym)
+        if rational is None:
+            self.error_print("pole/zero: transfer function is not a rational function of s")
+            return None
+
+        if "pztable" not in rational:
+            num = np.trim_zeros(rational["num"], "f")
+            den = np.trim_zeros(rational["den"], "f")
+
+            zeros = np.roots(num) if len(num) > 0 else np.array([])
+            poles = np.roots(den)
+
+            # Gain with the (1 + s/w0) sections normalized: ratio of the lowest order non-zero coefficients
+            num_nz = np.trim_zeros(num, "b")
+            den_nz = np.trim_zeros(den, "b")
+            k = num_nz[-1] / den_nz[-1] if len(num_nz) > 0 else 0
+
+            rational["zeros"] = zeros
+            rational["poles"] = poles
+            rational["magnitude"] = abs(k)
+            rational["phase"] = np.angle(k, deg=True)
+            rational["pztable"] = sorted(self.roots_to_rows(poles, "Pole real", "Pole pair") +
+                                         self.roots_to_rows(zeros, "Zero real", "Zero pair"),
+                                         key=lambda row: abs(row[1]))
+
+        return rational
+
+    def polezero_table(self, pz: dict):
+        """ Text table of the result of get_polezero """
+
+        txt = "Gain: {}, phase: {:.4g} deg\n".format(num2eng(pz["magnitude"]), pz["phase"])
+        txt += "Type            Freq          Q\n"
+        for row_type, freq, q in pz["pztable"]:
+            q_txt = num2eng(q) if "pair" in row_type else ""
+            txt += "{:<12s} {:>9s}Hz {:>10s}\n".format(row_type, num2eng(freq), q_txt)
+        return txt
+
+    def get_freqresponse_batch(self, values: np.ndarray, names: list = None, chunk_size: int = 10000):
+        """
+        Evaluate the frequency response for many sets of element values at once
+        (parameter sweeps and Monte Carlo analysis), without solving again.
+
+        With the numeric solver, the circuit is solved again for each set of values.
+
+        Arguments:
+            values: (n_points x n_elements) array, columns in the order of names
+            names: Elements of the columns of values (default: the non-fixed elements, self.elems_initial).
+                Fixed elements can be included if they are symbols in output_expr_full.
+            chunk_size: Number of points evaluated in each vectorized call, to limit memory usage
+
+        Returns:
+            (n_points x 2 x npoints) array: for each point, magnitude (in dB or linear)
+            and unwrapped phase in degrees, same as get_freqresponse.
+        """
+
+        f_vec = self.get_f_axis()
+        s_vec = 2 * np.pi * 1j * f_vec
+        if names is None:
+            names = list(self.elems_initial.keys())
+            expr = self.output_expr
+        else:
+            expr = self.output_expr_full  # Fixed elements as symbols
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        n_points = values.shape[0]
+
+        if self.solver_mode != "numeric":
+            # Compile output expression once, it is reused while the expression does not change
+            if self.batch_compiled is None or self.batch_compiled[0] is not expr or self.batch_compiled[1] != names:
+                h_syms = [self.sym[key] for key in names]
+                self.batch_compiled = (expr, names, self.compile_expr(h_syms + [self.s], expr))
+            h_lambd = self.batch_compiled[2]
+
+        b = np.empty((n_points, 2, len(f_vec)))
+
+        for start in range(0, n_points, chunk_size):
+            x = values[start:start + chunk_size]
+
+            if self.solver_mode == "numeric":
+                h_vec = np.array([self.get_numeric_response(dict(zip(names, el)), f_vec) for el in x])
+            else:
+                # Each element as a column vector, broadcast against the frequency axis
+                h_vec = np.broadcast_to(h_lambd(*x.T[:, :, np.newaxis], s_vec), (x.shape[0], len(f_vec)))
+
+            if self.app_state.magnitude_in_dB:
+                b[start:start + chunk_size, 0, :] = 20 * np.log10(np.abs(h_vec))
+            else:
+                b[start:start + chunk_size, 0, :] = np.abs(h_vec)
+            b[start:start + chunk_size, 1, :] = np.unwrap(np.angle(h_vec)) * 180 / np.pi
+
+        return b
+
+    def sweep(self, sweep_vals: dict, product: bool = True):
+        """
+        Frequency response for a grid of element values, using the solved output expression.
+
+        Arguments:
+            sweep_vals: Dict of element name -> list of values. Elements not in the dict keep their initial value.
+            product: If True, sweep the Cartesian product of all the lists (first element varies slowest).
+                If False, all lists must have the same length, and are swept together.
+
+        Returns:
+            Tuple (points, b):
+            - points: Dict of element name -> (n_points) array with the element values of each point
+            - b: (n_points x 2 x npoints) array with magnitude and phase, see get_freqresponse_batch
+            None, if the sweep is not valid.
+        """
+
+        if self.elems_initial is None or (self.output_expr is None and self.solver_mode != "numeric"):
+            self.error_print("sweep: circuit not solved")
+            return None
+
+        names = list(self.elems_initial.keys())
+        grids = {}
+        for key, vals in sweep_vals.items():
+            if key.upper() not in names:
+                self.error_print("sweep: element not found or fixed: " + key)
+                return None
+            grids[key.upper()] = np.ravel(np.asarray(vals, dtype=float))
+
+        if product:
+            mesh = np.meshgrid(*grids.values(), indexing="ij")
+            cols = [el.ravel() for el in mesh]
+        else:
+            cols = list(grids.values())
+            if len(set(len(el) for el in cols)) > 1:
+                self.error_print("sweep: all value lists must have the same length")
+                return None
+
+        n_points = len(cols[0]) if len(cols) > 0 else 1
+
+        # Elements not swept keep the initial value
+        values = np.tile(np.array([self.elems_initial[key] for key in names], dtype=float), (n_points, 1))
+        for key, col in zip(grids.keys(), cols):
+            values[:, names.index(key)] = col
+
+        start_time = time.time()
+        b = self.get_freqresponse_batch(values)
+        self.info_print("sweep: {} points ({:.2f}s)".format(n_points, time.time() - start_time))
+
+        points = {key: values[:, idx] for idx, key in enumerate(names)}
+        return points, b
+
+    def monte_carlo(self, n_samples: int = None, vals: dict = None):
+        """
+        Monte Carlo tolerance analysis of the solved circuit.
+
+        Draws n_samples sets of values of the elements around their nominal values, with the
+        relative tolerance of each element (tol= argument, or app_state.mc_tolerance), and evaluates
+        all of them at once with get_freqresponse_batch. Fixed elements are varied too, unless they
+        were substituted before solving (subs_before_solve).
+
+        With the numeric solver, there is no expression to evaluate for all the samples at once, and
+        the circuit is solved for each sample, so at most app_state.mc_numeric_max_samples are allowed.
+
+        The distribution (app_state.mc_distribution) is "uniform" (value * (1 + tol * U(-1, 1))) or
+        "gaussian" (tolerance is 3 standard deviations).
+
+        A sample passes the mask if its magnitude is within mc_mask_mag (dB or linear) of the target
+        response at all frequencies, and also its phase within mc_mask_phase degrees if that is not 0.
+
+        Returns:
+            Dict stored in self.mc_result, with:
+            - "f": Frequency points
+            - "percentiles": Percentiles of the bands (app_state.mc_percentiles)
+            - "bands": (n_percentiles x 2 x npoints) array, percentiles of magnitude and phase at each frequency
+            - "yield": Fraction of the samples that pass the mask, None if there is no valid target response
+            None, if the circuit is not solved.
+
+        Arguments:
+            n_samples: Number of samples (default: app_state.mc_samples)
+            vals: Nominal values of the non-fixed elements, e.g. optimized values (default: initial values)
+        """
+
+        if self.elems_initial is None or (self.output_expr is None and self.solver_mode != "numeric"):
+            self.error_print("monte_carlo: circuit not solved", event_type="mc_error")
+            return None
+
+        if n_samples is None:
+            n_samples = int(self.app_state.mc_samples)
+
+        if self.solver_mode == "numeric" and n_samples > self.app_state.mc_numeric_max_samples:
+            self.error_print("monte_carlo: the numeric solver solves the circuit for each sample, "
+                             "{} samples is over mc_numeric_max_samples ({})".format(
+                                 n_samples, self.app_state.mc_numeric_max_samples), event_type="mc_error")
+            return None
+
+        # Fixed elements that are still symbols in the solution, all of them with the numeric solver
+        names = list(self.elems_initial.keys())
+        for key in self.elems_fixed.keys():
+            if self.solver_mode == "numeric" or self.sym[key] in self.output_expr_full.free_symbols:
+                names.append(key)
+
+        all_vals = dict(self.elems_fixed)
+        all_vals.update(self.elems_initial)
+        if vals is not None:
+            all_vals.update(vals)
+        x_nominal = np.array([all_vals[key] for key in names], dtype=float)
+        tol = np.array([self.tolerance[key] for key in names], dtype=float)
+
+        start_time = time.time()
+
+        rng = np.random.default_rng()
+        if self.app_state.mc_distribution == "gaussian":
+            deviation = rng.standard_normal((n_samples, len(names))) * tol / 3
+        else:
+            deviation = rng.uniform(-1, 1, (n_samples, len(names))) * tol
+
+        b = self.get_freqresponse_batch(x_nominal * (1 + deviation), names)
+
+        percentiles = list(self.app_state.mc_percentiles)
+        bands = np.percentile(b, percentiles, axis=0)
+
+        # Check mask around the target response
+        b_target = self.get_target_freqresponse()
+        if b_target is None:
+            mc_yield = None
+        else:
+            passed = np.all(np.abs(b[:, 0, :] - b_target[0, :]) <= self.app_state.mc_mask_mag, axis=-1)
+            if self.app_state.mc_mask_phase > 0:
+                passed &= np.all(np.abs(b[:, 1, :] - b_target[1, :]) <= self.app_state.mc_mask_phase, axis=-1)
+            mc_yield = np.count_nonzero(passed) / n_samples
+
+        self.mc_result = {"f": self.get_f_axis(),
+                          "percentiles": percentiles,
+                          "bands": bands,
+                          "yield": mc_yield}
+
+        yield_txt = "no target response" if mc_yield is None else "yield {:.1f}%".format(100 * mc_yield)
+        self.info_print("monte_carlo: {} samples ({:.2f}s), {}".format(
+            n_samples, time.time() - start_time, yield_txt), event_type="mc_ok")
+
+        return self.mc_result
+
+    def get_timings(self) -> dict:
+        """
+        Wall and CPU time spent in each phase since the engine was created or the timings reset
+
+        Returns:
+            Dict span name -> {"count", "wall", "cpu", "max", "hist"}, see Timing.Timings.as_dict.
+            Child spans (e.g. "solve.linsolve") are also counted in their parent ("solve").
+        """
+
+        return self.timings.as_dict()
+
+    def get_sensitivities(self, vals: dict = None):
+        """
+        Normalized sensitivities S = (x/H) * dH/dx of the transfer function to each element value.
+
+        Re(S) is the relative change of |H| for a relative change of x, and Im(S) the change of the
+        phase (in radians). The derivatives of the solved expression are computed and compiled once
+        per solve, and reused in the following calls. Elements that are not symbols in the solved
+        expression (fixed elements substituted before solving, or numeric solver) are differentiated
+        numerically with the numeric MNA solver, and kept until the circuit, the values or the
+        frequency axis change.
+
+        Arguments:
+            vals: Values of the non-fixed elements, e.g. optimized values (default: initial values)
+
+        Returns:
+            Dict of element name -> complex array with S over the frequency axis (get_f_axis).
+            None, if the circuit is not solved.
+        """
+
+        if self.elems_initial is None or (self.output_expr is None and self.solver_mode != "numeric"):
+            self.error_print("sensitivity: circuit not solved")
+            return None
+
+        f_vec = self.get_f_axis()
+        s_vec = 2 * np.pi * 1j * f_vec
+
+        all_vals = dict(self.elems_fixed)
+        all_vals.update(self.elems_initial)
+        if vals is not None:
+            all_vals.update(vals)
+
+        sens = {}
+
+        if self.output_expr_full is not None:
+            if self.sens_compiled is None or self.sens_compiled[0] is not self.output_expr_full:
+                start_time = time.time()
+                expr = self.output_expr_full
+                names = [key for key in all_vals.keys() if self.sym[key] in expr.free_symbols]
+                h_syms = [self.sym[key] for key in names]
+                dh_exprs = [sp.diff(expr, el) for el in h_syms]
+                self.sens_compiled = (expr, names,
+                                      self.compile_expr(h_syms + [self.s], expr),
+                                      self.compile_expr(h_syms + [self.s], dh_exprs))
+                self.debug_print("sensitivity: derivatives compiled ({:.2f}s)".format(time.time() - start_time))
+
+            _, names, h_lambd, dh_lambd = self.sens_compiled
+            x = [all_vals[key] for key in names]
+            h_vec = h_lambd(*x, s_vec) * np.ones_like(s_vec)
+            for key, dh in zip(names, dh_lambd(*x, s_vec)):
+                sens[key] = all_vals[key] * dh / h_vec
+
+        # Numeric central differences for the rest
+        numeric_keys = [key for key, val in all_vals.items() if key not in sens and val != 0]
+        if len(numeric_keys) > 0:
+            cache_key = (tuple(self.lines), self.app_state.inexpr.upper(), self.app_state.outexpr, all_vals)
+            if self.sens_numeric is None or self.sens_numeric[0] != cache_key or \
+                    not np.array_equal(self.sens_numeric[1], f_vec):
+                h_vec = self.get_numeric_response(all_vals, f_vec)
+                if h_vec is None:
+                    return None
+
+                step = 1e-6
+                sens_numeric = {}
+                for key in numeric_keys:
+                    vals_p = dict(all_vals)
+                    vals_p[key] = all_vals[key] * (1 + step)
+                    vals_n = dict(all_vals)
+                    vals_n[key] = all_vals[key] * (1 - step)
+                    h_p = self.get_numeric_response(vals_p, f_vec)
+                    h_n = self.get_numeric_response(vals_n, f_vec)
+                    if h_p is None or h_n is None:
+                        return None
+                    sens_numeric[key] = (h_p - h_n) / (2 * step * h_vec)
+
+                self.sens_numeric = (cache_key, f_vec, sens_numeric)
+
+            sens.update(self.sens_numeric[2])
+
+        return sens
+
+    def sensitivity(self, vals: dict = None):
+        """
+        Sensitivity analysis of the solved circuit, see get_sensitivities.
+
+        Returns:
+            Dict stored in self.sens_result, with "f" (frequency points), "sens" (element name -> S)
+            and "table" (text table, see sensitivity_table). None, if the circuit is not solved.
+        """
+
+        start_time = time.time()
+        sens = self.get_sensitivities(vals)
+        if sens is None:
+            self.error_print("sensitivity: cannot compute sensitivities", event_type="sens_error")
+            return None
+
+        self.sens_result = {"f": self.get_f_axis(), "sens": sens, "table": self.sensitivity_table(sens)}
+        self.info_print("sensitivity: {} elements ({:.2f}s)".format(len(sens), time.time() - start_time),
+                        event_type="sens_ok")
+        return self.sens_result
+
+    def sensitivity_table(self, sens: dict):
+        """ Text table with the maximum |S| of each element over frequency, most sensitive first """
+
+        f_vec = self.get_f_axis()
+        rows = []
+        for key, el in sens.items():
+            idx = int(np.argmax(np.abs(el)))
+            rows.append((key, float(np.abs(el[idx])), f_vec[idx], float(np.real(el[idx])), float(np.imag(el[idx]))))
+        rows.sort(key=lambda r: -r[1])
+
+        txt = "Element     max |S|   at freq     Re(S)     Im(S)\n"
+        for key, s_max, f, s_re, s_im in rows:
+            txt += "{:<8s} {:10.4g} {:>9s}Hz {:9.4g} {:9.4g}\n".format(key, s_max, num2eng(f, ndigits=3), s_re, s_im)
+        return txt
@@ -0,0 +1,143 @@
+import multiprocessing
+import pickle
+import time
+from typing import Callable
+import sympy as sp
+
+try:
+    import resource  # Not available on Windows, the memory limit is ignored there
+except ImportError:
+    resource = None
+
+# Symbolic solve in a child process
+#
+# sp.linsolve and sp.simplify cannot be interrupted, and for an unlucky netlist
+# they may run for tens of minutes or use all the memory. In isolated mode,
+# Engine.solve sends the system (A, M) to a child process and waits for the
+# solution vector X, which comes back pickled through a pipe. The
+# simplification of the system (values substituted before solving) and of the
+# output expression run the same way. The child is
+# killed when the wall-clock timeout expires, or when should_abort returns
+# True (Stop button, a newer netlist, Ctrl+C in batch mode). The address space
+# of the child is limited, so running out of memory fails the solve instead
+# of the whole application.
+#
+# The child is started with "spawn", which takes about a second to import
+# SymPy, so this is only worth it for big circuits.
+
+POLL_INTERVAL = 0.05  # Seconds between checks of should_abort
+
+
+def solve_system(A: sp.Matrix, M: sp.Matrix, simplify: bool):
+    """
+    Solve A X = M with sp.linsolve, same as Engine.solve
+
+    Arguments:
+        simplify: Simplify the solution
+
+    Returns:
+        Tuple (X, error message), X is None on error
+    """
+
+    X = None
+    for solution in sp.linsolve((A, M)):
+        if X is not None:
+            return None, "system has not an unique solution"
+        X = solution  # Pick only first solution
+
+    if X is None:
+        return None, "unsolvable system"
+
+    # Simplify solution if enabled (can take more time than solving!)
+    X = sp.simplify(sp.Matrix(X)) if simplify else sp.Matrix(X)
+    return X, ""
+
+
+def simplify_system(A: sp.Matrix, M: sp.Matrix):
+    """
+    Simplify A and M, same as Engine.solve when values are substituted before solving
+
+    Returns:
+        Tuple ((A, M), error message)
+    """
+
+    return (sp.simplify(A), sp.simplify(M)), ""
+
+
+def simplify_expr(expr):
+    """
+    Returns:
+        Tuple (simplified expression, error message)
+    """
+
+    return sp.simplify(expr), ""
+
+
+def child_main(conn, payload: bytes, memory_mb: float):
+    if resource is not None and memory_mb > 0:
+        limit = int(memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        fun, args = pickle.loads(payload)
+        result, msg = fun(*args)
+        if result is None:
+            conn.send(("error", msg))
+        else:
+            conn.send(("ok", pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+    except MemoryError:
+        conn.send(("memory", "out of memory (limit {:g} MB)".format(memory_mb)))
+    except Exception as error:
+        conn.send(("error", str(error)))
+    finally:
+        conn.close()
+
+
+def run_isolated(fun: Callable, args: tuple, timeout: float, memory_mb: float, should_abort: Callable = None):
+    """
+    Call fun(*args) in a child process.
+
+    Arguments:
+        fun: Function of this module, returns a tuple (result, error message), result is None on error
+        args: Arguments of fun, must be picklable
+        timeout: Wall-clock limit in seconds (0: no limit)
+        memory_mb: Address space limit of the child process in MB (0: no limit)
+        should_abort: Called every POLL_INTERVAL seconds, the child is killed if it returns True
+
+    Returns:
+        Tuple (status, result or error message), status is "ok", "error", "timeout", "memory" or "aborted"
+    """
+
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    payload = pickle.dumps((fun, args), protocol=pickle.HIGHEST_PROTOCOL)
+
+    process = ctx.Process(target=child_main, args=(child_conn, payload, memory_mb), daemon=True)
+    process.start()
+    child_conn.close()  # Only the child writes, so recv fails if it dies without answering
+
+    start_time = time.perf_counter()
+    try:
+        while not parent_conn.poll(POLL_INTERVAL):
+            if should_abort is not None and should_abort():
+                return "aborted", "stopped"
+            if 0 < timeout < time.perf_counter() - start_time:
+                return "timeout", "timeout after {:g}s".format(timeout)
+            if not process.is_alive() and not parent_conn.poll():
+                return "error", "solver process exited with code {}".format(process.exitcode)
+
+        try:
+            status, result = parent_conn.recv()
+        except EOFError:
+            return "error", "solver process exited with code {}".format(process.exitcode)
+
+        if status == "ok":
+            return status, pickle.loads(result)
+        return status, result
+
+    finally:
+        # Also reached on KeyboardInterrupt, the child never outlives the solve
+        if process.is_alive():
+            process.kill()
+        process.join()
+        parent_conn.close()
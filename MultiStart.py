@@ -0,0 +1,101 @@
+import contextlib
+import io
+import numpy as np
+from scipy.stats import qmc
+
+from AppState import AppState
+from Engine import Engine
+
+# Multi-start optimization
+#
+# Least squares (trf, dogbox) is a local method, and for higher order
+# circuits it often stops in a local minimum that depends on the initial
+# element values. In multi-start mode, Engine.optimize_multistart runs
+# independent least squares problems from several starting points spread
+# over the bounds, each one in a worker process, and keeps the best one.
+#
+# Compiled (lambdified) functions cannot be sent to other processes, so each
+# worker builds its own Engine once, from the app state, the parsed netlist
+# and the symbolic output expression, and then runs any number of starts.
+# The Stop button sets a shared event, checked by the running starts on each
+# iteration.
+#
+# The same workers evaluate the candidates of differential evolution when the
+# transfer function cannot evaluate the whole population at once (see
+# Engine.run_differential_evolution).
+
+def get_starting_points(x_initial: list, x_min: list, x_max: list, n: int, log_space: bool):
+    """
+    Starting points for multi-start optimization.
+
+    Arguments:
+        x_initial, x_min, x_max: Initial values and bounds of the optimization variables
+        n (int): Number of starting points
+        log_space (bool): Sample log(x) instead of x, for variables with positive bounds
+            (not needed if the variables are already log-transformed)
+
+    Returns:
+        (n x len(x_initial)) array. The first row is x_initial, the others are a Latin
+        hypercube sample, so each variable is spread evenly over its range.
+    """
+
+    lo = np.array(x_min, dtype=float)
+    hi = np.array(x_max, dtype=float)
+
+    log = np.full(len(lo), log_space) & (lo > 0)
+    lo = np.where(log, np.log(np.where(log, lo, 1)), lo)
+    hi = np.where(log, np.log(np.where(log, hi, 1)), hi)
+
+    sample = qmc.LatinHypercube(d=len(lo)).random(n - 1)
+    points = lo + sample * (hi - lo)
+    points = np.where(log, np.exp(points), points)
+
+    return np.vstack((np.array(x_initial, dtype=float), points))
+
+
+# Engine of the worker process, built by multistart_init
+_engine = None
+_jac = None
+_abort = None  # multiprocessing.Event set to stop the running starts
+
+
+def multistart_init(state: dict, netlist: str, output_expr, abort):
+    """ Initializer of the worker processes """
+
+    global _engine, _jac, _abort
+
+    _abort = abort
+
+    app_state = AppState()
+    for key, val in state.items():
+        app_state[key] = val
+    app_state._batch_mode = True
+
+    _engine = Engine(app_state, lambda engine, event_type: None)
+
+    # Messages of the workers are not printed, results are reported by the main process
+    with contextlib.redirect_stdout(io.StringIO()):
+        _engine.parse(netlist)
+        _engine.output_expr = output_expr  # Symbolic solution from the main process, no need to solve again
+        _jac = _engine.prepare_optimize()
+
+
+def multistart_run(x0: np.ndarray):
+    """ One least squares run in a worker process, stopped early if the abort event is set """
+
+    def callback(intermediate_result):
+        return _abort.is_set()
+
+    res = _engine.run_least_squares(x0, _jac, callback=callback)
+
+    return {"x": np.asarray(res.x),
+            "cost": float(res.cost),
+            "nfev": int(res.nfev),
+            "success": bool(res.success),
+            "message": str(res.message)}
+
+
+def de_cost(x: np.ndarray):
+    """ Cost of one differential evolution candidate in a worker process """
+
+    return np.sum(np.power(_engine.resfun(x)[0], 2))
@@ -0,0 +1,402 @@
+import argparse
+import contextlib
+import io
+import math
+import sys
+import numpy as np
+
+from AppState import AppState
+from Engine import Engine
+from NumEng import *
+
+# Synthetic netlists of controllable size, for benchmarks and scaling tests
+#
+# Each generator returns a tuple (app_state, reference):
+#   - app_state: AppState with the netlist, input/output expressions and frequency
+#     range, ready to be parsed and solved, or saved as a JSON state file
+#   - reference(f_vec): complex transfer function of the generated circuit, computed
+#     without the Engine (cascaded ABCD matrices, closed-form opamp stages, or a plain
+#     nodal analysis of the full circuit), to check the solver on big circuits
+#
+# Element values are written with 6 digits, and the reference uses the same rounded values.
+#
+# Usage:
+#   python NetlistGenerator.py rc_ladder 20 -o rc_ladder_20.json
+#   python NetlistGenerator.py all 10 --check
+
+
+def value(x: float):
+    """ Element value as written in the netlist, and the same value as float """
+    txt = num2eng(x, ndigits=6)
+    return txt, eng2num(txt)
+
+
+def make_state(netlist: str, outexpr: str, freqmin: float, freqmax: float, npoints: int = 100) -> AppState:
+    app_state = AppState()
+    app_state.netlist = netlist
+    app_state.inexpr = "Vin"
+    app_state.outexpr = outexpr
+    app_state.freqmin = freqmin
+    app_state.freqmax = freqmax
+    app_state.npoints = npoints
+    return app_state
+
+
+def nodal_response(n_nodes: int, admittances: list, f_vec: np.ndarray, fixed: dict, node_out: int,
+                   y_extra=None):
+    """
+    Output voltage of a circuit of two-terminal admittances, with nodal analysis.
+
+    Arguments:
+        n_nodes: Number of nodes, not including ground (node 0)
+        admittances: List of (node a, node b, y(s))
+        f_vec: Frequency points
+        fixed: Dict node -> voltage of the nodes driven by ideal voltage sources
+        node_out: Output node
+        y_extra: Optional function s_vec -> (nodes, Y), with Y (npoints x k x k) added to the
+            rows and columns of those nodes (e.g. coupled inductors)
+
+    Returns:
+        Complex voltage of node_out for each frequency
+    """
+
+    s_vec = 2j * np.pi * np.asarray(f_vec)
+    Y = np.zeros((len(s_vec), n_nodes + 1, n_nodes + 1), dtype=complex)
+
+    for a, b, y in admittances:
+        y_vec = y(s_vec) * np.ones_like(s_vec)
+        Y[:, a, a] += y_vec
+        Y[:, b, b] += y_vec
+        Y[:, a, b] -= y_vec
+        Y[:, b, a] -= y_vec
+
+    if y_extra is not None:
+        nodes, Y_extra = y_extra(s_vec)
+        Y[:, np.ix_(nodes, nodes)[0], np.ix_(nodes, nodes)[1]] += Y_extra
+
+    known = [0] + list(fixed.keys())
+    unknown = [n for n in range(n_nodes + 1) if n not in known]
+    v_known = np.array([0] + list(fixed.values()), dtype=complex)
+
+    Y_uu = Y[:, unknown][:, :, unknown]
+    Y_uk = Y[:, unknown][:, :, known]
+    v_unknown = np.linalg.solve(Y_uu, -(Y_uk @ v_known)[..., np.newaxis])[..., 0]
+
+    if node_out in fixed:
+        return fixed[node_out] * np.ones_like(s_vec)
+    return v_unknown[:, unknown.index(node_out)]
+
+
+def abcd_response(sections: list, f_vec: np.ndarray, r_load: float = math.inf):
+    """
+    Voltage transfer function of a cascade of two-ports.
+
+    Arguments:
+        sections: List of ("series", z(s)) or ("shunt", y(s))
+        r_load: Load resistance at the output (open circuit by default)
+    """
+
+    s_vec = 2j * np.pi * np.asarray(f_vec)
+    A = np.ones_like(s_vec)
+    B = np.zeros_like(s_vec)
+    log_scale = np.zeros(len(s_vec))
+
+    # Only the first row of the ABCD matrix is needed: V_in = A * V_out + B * I_out
+    for kind, fun in sections:
+        v = fun(s_vec) * np.ones_like(s_vec)
+        if kind == "series":
+            B = A * v + B
+        else:
+            A = A + B * v
+
+        # A and B grow as (sRC)^n and would overflow in long ladders, keep them normalized
+        scale = np.maximum(np.abs(A), np.abs(B))
+        A = A / scale
+        B = B / scale
+        log_scale += np.log(scale)
+
+    return np.exp(-log_scale) / (A + B / r_load)
+
+
+def rc_ladder(n: int, r: float = 1e3, c: float = 1e-9):
+    """ Lowpass RC ladder with n sections, output at the last capacitor """
+
+    r_txt, r_val = value(r)
+    c_txt, c_val = value(c)
+
+    lines = ["; RC ladder, {} sections".format(n), "Vin 1 0 AC 1"]
+    for i in range(1, n + 1):
+        lines.append("R{0} {0} {1} {2}".format(i, i + 1, r_txt))
+        lines.append("C{0} {1} 0 {2}".format(i, i + 1, c_txt))
+
+    def reference(f_vec):
+        return abcd_response([("series", lambda s: r_val), ("shunt", lambda s: s * c_val)] * n, f_vec)
+
+    return make_state("\n".join(lines), "V({})".format(n + 1), 1e2, 1e8), reference
+
+
+def lc_ladder(n: int, l: float = 1e-6, c: float = 1e-9, r: float = 50):
+    """ Lowpass LC ladder with n sections, terminated with r at both ends """
+
+    l_txt, l_val = value(l)
+    c_txt, c_val = value(c)
+    r_txt, r_val = value(r)
+
+    lines = ["; LC ladder, {} sections".format(n), "Vin in 0 AC 1", "RS in 1 " + r_txt]
+    for i in range(1, n + 1):
+        lines.append("L{0} {0} {1} {2}".format(i, i + 1, l_txt))
+        lines.append("C{0} {1} 0 {2}".format(i, i + 1, c_txt))
+    lines.append("RL {} 0 {}".format(n + 1, r_txt))
+
+    def reference(f_vec):
+        sections = [("series", lambda s: r_val)] + [("series", lambda s: s * l_val), ("shunt", lambda s: s * c_val)] * n
+        return abcd_response(sections, f_vec, r_load=r_val)
+
+    return make_state("\n".join(lines), "V({})".format(n + 1), 1e4, 1e8), reference
+
+
+def butterworth_q(order: int) -> list:
+    """ Q of the pole pairs of an even order Butterworth filter """
+    return [1 / (2 * math.cos((2 * k - 1) * math.pi / (2 * order))) for k in range(1, order // 2 + 1)]
+
+
+def butterworth_target(app_state: AppState, f0: float, q_list: list, gain: float = 1):
+    # The Engine gives V(out)/Vin with opposite sign (see check), so the phase is also inverted
+    app_state.magnitude = abs(gain)
+    app_state.phase = 180 if gain > 0 else 0
+    app_state.pztable = [["Pole pair", f0, q] for q in q_list]
+
+
+def sallen_key(o: int, f0: float = 10e3, r: float = 10e3):
+    """
+    Butterworth lowpass of order 2 * o, cascade of o unity gain Sallen-Key stages (one opamp each).
+    The target response of the state is the ideal Butterworth response.
+    """
+
+    w0 = 2 * math.pi * f0
+    q_list = butterworth_q(2 * o)
+    r_txt, r_val = value(r)
+
+    lines = ["; Sallen-Key lowpass, {} stages".format(o), "Vin s0o 0 AC 1"]
+    stages = []
+    for k, q in enumerate(q_list, start=1):
+        c1_txt, c1 = value(2 * q / (w0 * r))
+        c2_txt, c2 = value(1 / (2 * q * w0 * r))
+        lines.append("R{0}1 s{1}o s{0}a {2}".format(k, k - 1, r_txt))
+        lines.append("R{0}2 s{0}a s{0}b {1}".format(k, r_txt))
+        lines.append("C{0}2 s{0}b 0 {1}".format(k, c2_txt))
+        lines.append("O{0} s{0}b s{0}o s{0}o".format(k))
+        lines.append("C{0}1 s{0}o s{0}a {1}".format(k, c1_txt))
+        stages.append((c1, c2))
+
+    def reference(f_vec):
+        s = 2j * np.pi * np.asarray(f_vec)
+        h = np.ones_like(s)
+        for c1, c2 in stages:
+            h = h / (1 + s * c2 * 2 * r_val + s ** 2 * r_val ** 2 * c1 * c2)
+        return h
+
+    app_state = make_state("\n".join(lines), "V(s{}o)".format(o), f0 / 100, f0 * 100)
+    butterworth_target(app_state, f0, q_list)
+    return app_state, reference
+
+
+def mfb(o: int, f0: float = 10e3, r: float = 10e3):
+    """
+    Butterworth lowpass of order 2 * o, cascade of o multiple feedback stages (one opamp each,
+    gain -1). The target response of the state is the ideal Butterworth response.
+    """
+
+    w0 = 2 * math.pi * f0
+    q_list = butterworth_q(2 * o)
+    r_txt, r_val = value(r)
+
+    lines = ["; Multiple feedback lowpass, {} stages".format(o), "Vin s0o 0 AC 1"]
+    stages = []
+    for k, q in enumerate(q_list, start=1):
+        c1_txt, c1 = value(3 * q / (w0 * r))
+        c2_txt, c2 = value(1 / (3 * q * w0 * r))
+        lines.append("R{0}1 s{1}o s{0}a {2}".format(k, k - 1, r_txt))
+        lines.append("C{0}1 s{0}a 0 {1}".format(k, c1_txt))
+        lines.append("R{0}2 s{0}a s{0}o {1}".format(k, r_txt))
+        lines.append("R{0}3 s{0}a s{0}b {1}".format(k, r_txt))
+        lines.append("C{0}2 s{0}b s{0}o {1}".format(k, c2_txt))
+        lines.append("O{0} 0 s{0}b s{0}o".format(k))
+        stages.append((c1, c2))
+
+    def reference(f_vec):
+        s = 2j * np.pi * np.asarray(f_vec)
+        h = np.ones_like(s)
+        for c1, c2 in stages:
+            h = h * -1 / (1 + s * c2 * 3 * r_val + s ** 2 * c1 * c2 * r_val ** 2)
+        return h
+
+    app_state = make_state("\n".join(lines), "V(s{}o)".format(o), f0 / 100, f0 * 100)
+    butterworth_target(app_state, f0, q_list, gain=(-1) ** o)
+    return app_state, reference
+
+
+def gmc_chain(n: int, gm: float = 10e-6, c: float = 1e-12, r: float = 1e6):
+    """ Chain of n lossy gm-C integrators (G source loaded by C and R) """
+
+    gm_txt, gm_val = value(gm)
+    c_txt, c_val = value(c)
+    r_txt, r_val = value(r)
+
+    lines = ["; gm-C integrator chain, {} stages".format(n), "Vin 1 0 AC 1"]
+    for i in range(1, n + 1):
+        lines.append("G{0} {1} 0 {0} 0 {2}".format(i, i + 1, gm_txt))
+        lines.append("C{0} {1} 0 {2}".format(i, i + 1, c_txt))
+        lines.append("R{0} {1} 0 {2}".format(i, i + 1, r_txt))
+
+    def reference(f_vec):
+        # G sinks gm * V(in) from its output node: V(out) = -gm * V(in) / (1/R + sC)
+        s = 2j * np.pi * np.asarray(f_vec)
+        return (-gm_val / (1 / r_val + s * c_val)) ** n
+
+    return make_state("\n".join(lines), "V({})".format(n + 1), 1e2, 1e9), reference
+
+
+def coupled_inductors(n: int, l: float = 1e-6, c: float = 1e-9, r: float = 1e3, k: float = 0.5):
+    """
+    Chain of n parallel RLC resonators driven through 50 ohm, each inductor coupled to the next one.
+    The coupling coefficients are fixed values.
+    """
+
+    l_txt, l_val = value(l)
+    c_txt, c_val = value(c)
+    r_txt, r_val = value(r)
+    k_txt, k_val = value(k)
+
+    lines = ["; Coupled inductor chain, {} resonators".format(n), "Vin 1 0 AC 1", "R0 1 2 50"]
+    for i in range(1, n + 1):
+        lines.append("L{0} {1} 0 {2}".format(i, i + 1, l_txt))
+        lines.append("C{0} {1} 0 {2}".format(i, i + 1, c_txt))
+        lines.append("R{0} {1} 0 {2}".format(i, i + 1, r_txt))
+        if i > 1:
+            lines.append("K{0} L{1} L{0} {2}*".format(i, i - 1, k_txt))
+
+    def reference(f_vec):
+        # Inductance matrix, mutual inductance k * sqrt(L1 * L2) between neighbours
+        L = np.diag(np.full(n, l_val)) + k_val * l_val * (np.eye(n, k=1) + np.eye(n, k=-1))
+
+        def y_inductors(s_vec):
+            return list(range(2, n + 2)), np.linalg.inv(L)[np.newaxis, :, :] / s_vec[:, np.newaxis, np.newaxis]
+
+        admittances = [(1, 2, lambda s: 1 / 50)]
+        for i in range(2, n + 2):
+            admittances.append((i, 0, lambda s: s * c_val))
+            admittances.append((i, 0, lambda s: 1 / r_val))
+        return nodal_response(n + 1, admittances, f_vec, {1: 1}, n + 1, y_extra=y_inductors)
+
+    return make_state("\n".join(lines), "V({})".format(n + 1), 1e5, 1e8), reference
+
+
+def balanced_ladder(n: int, r: float = 1e3, c: float = 1e-9):
+    """
+    Fully differential RC ladder written as single-ended equivalent, with the minus node extension.
+    Each section has a series resistor, a capacitor to ground and a capacitor cross-connected
+    to the complementary node of the previous section.
+    """
+
+    r_txt, r_val = value(r)
+    c_txt, c_val = value(c)
+
+    lines = ["; Balanced RC ladder, {} sections".format(n), "Vin 1 0 AC 1"]
+    for i in range(1, n + 1):
+        lines.append("R{0} {0} {1} {2}".format(i, i + 1, r_txt))
+        lines.append("C{0} {1} 0 {2}".format(i, i + 1, c_txt))
+        lines.append("CX{0} {0} -{1} {2}".format(i, i + 1, c_txt))
+
+    def reference(f_vec):
+        # Full differential circuit: node i is i (positive side) and n + 1 + i (negative side),
+        # driven with +1 and -1
+        m = n + 1
+        admittances = []
+        for i in range(1, n + 1):
+            for a, b in [(i, i + 1), (m + i, m + i + 1)]:
+                admittances.append((a, b, lambda s: 1 / r_val))
+            for a in [i + 1, m + i + 1]:
+                admittances.append((a, 0, lambda s: s * c_val))
+            admittances.append((i, m + i + 1, lambda s: s * c_val))
+            admittances.append((m + i, i + 1, lambda s: s * c_val))
+        return nodal_response(2 * m, admittances, f_vec, {1: 1, m + 1: -1}, n + 1)
+
+    return make_state("\n".join(lines), "V({})".format(n + 1), 1e2, 1e8), reference
+
+
+GENERATORS = {"rc_ladder": rc_ladder, "lc_ladder": lc_ladder, "sallen_key": sallen_key, "mfb": mfb,
+              "gmc_chain": gmc_chain, "coupled_inductors": coupled_inductors, "balanced_ladder": balanced_ladder}
+
+
+def check(app_state: AppState, reference, solver_mode: str = "numeric"):
+    """
+    Solve a generated circuit with the Engine and compare it with the reference response.
+
+    Returns:
+        Max error over the frequency axis, relative to the peak of the reference response
+        (stopbands deep below the roundoff of the peak are not compared), or None if the
+        circuit cannot be solved. NaN or inf if any of the responses is not finite.
+    """
+
+    app_state.solver_mode = solver_mode
+    app_state.solve_cache = False
+    app_state._batch_mode = True
+    engine = Engine(app_state, lambda s, event_type: None)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not engine.parse(app_state.netlist) or not engine.solve():
+            return None
+
+        f_vec = engine.get_f_axis()
+        if engine.solver_mode == "numeric":
+            h_vec = engine.get_numeric_response(engine.h_initial, f_vec)
+        else:
+            h_vec = engine.compile_expr([engine.s], engine.h_initial)(2j * np.pi * f_vec)
+
+    # The Engine stamps the input voltage source with the opposite sign of SPICE,
+    # so all the responses to Vin come out inverted
+    h_ref = -reference(f_vec)
+    return float(np.max(np.abs(h_vec - h_ref)) / np.max(np.abs(h_ref)))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic SpiceMonkey netlists and state files.")
+    arg_parser.add_argument('topology', choices=list(GENERATORS.keys()) + ["all"],
+                            help='Circuit topology ("all" only with --check)')
+    arg_parser.add_argument('size', nargs="?", type=int, default=4, help='Number of sections, stages or opamps')
+    arg_parser.add_argument('-o', '--output', help='Save the state to this JSON file (default: print netlist)',
+                            default="")
+    arg_parser.add_argument('--check', help='Compare the Engine against the reference response',
+                            action='store_true')
+    arg_parser.add_argument('--solver-mode', help='Solver mode used by --check (default: numeric)',
+                            choices=["symbolic", "cramer", "numeric", "auto"], default="numeric")
+    arg_parser.add_argument('--tolerance', help='Max relative error of --check (default: 1e-6)',
+                            type=float, default=1e-6)
+    args = arg_parser.parse_args()
+
+    if args.check:
+        topologies = list(GENERATORS.keys()) if args.topology == "all" else [args.topology]
+        failed = 0
+        for name in topologies:
+            app_state, reference = GENERATORS[name](args.size)
+            error = check(app_state, reference, args.solver_mode)
+            if error is None:
+                print("{} {}: FAILED".format(name, args.size))
+                failed += 1
+            elif not error <= args.tolerance:  # Also NaN
+                print("{} {}: FAILED, max error {:.3g}".format(name, args.size, error))
+                failed += 1
+            else:
+                print("{} {}: max error {:.3g}".format(name, args.size, error))
+        if failed > 0:
+            sys.exit(1)
+    elif args.topology == "all":
+        arg_parser.error("choose one topology")
+    else:
+        app_state, reference = GENERATORS[args.topology](args.size)
+        if args.output:
+            app_state.save(args.output)
+            print("Saved '{}'".format(args.output))
+        else:
+            print(app_state.netlist)
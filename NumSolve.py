@@ -0,0 +1,152 @@
+import numpy as np
+import scipy.sparse as sp_sparse
+import scipy.sparse.linalg as sp_linalg
+
+# Numeric solvers for the MNA problem (G + sC) * X = M
+#
+# These are used by the numeric solver mode of Engine, where the matrices
+# are filled with float values instead of SymPy symbols, and the system is
+# solved directly for every frequency point.
+
+def solve_dense(G: np.ndarray, C: np.ndarray, M: np.ndarray, s_vec: np.ndarray):
+    """
+    Solve (G + sC) * X = M for all the values of s at once.
+
+    Arguments:
+        G, C (np.ndarray): Real (NxN) problem matrices
+        M (np.ndarray): Real (Nx1) vector of knowns
+        s_vec (np.ndarray): Complex frequencies (npoints)
+
+    Returns:
+        Complex (npoints x N) array, each row is the vector of unknowns
+        at one frequency point.
+
+    Raises:
+        np.linalg.LinAlgError if the circuit matrix is singular.
+    """
+
+    # Stack of (npoints, N, N) complex matrices, solved by one batched LAPACK call
+    A = G[np.newaxis, :, :] + s_vec[:, np.newaxis, np.newaxis] * C[np.newaxis, :, :]
+    b = np.broadcast_to(M.reshape(1, -1, 1), (len(s_vec), M.shape[0], 1)).astype(np.complex128)
+
+    return np.linalg.solve(A, b)[:, :, 0]
+
+
+def polyval(coeffs: list, s_vec: np.ndarray):
+    """
+    Evaluate a polynomial with Horner's method, highest power first (same as np.polyval).
+
+    Unlike np.polyval, the coefficients can be a mix of scalars and arrays,
+    and they are broadcast against s_vec.
+    """
+
+    h = 0
+    for c in coeffs:
+        h = h * s_vec + c
+    return h
+
+
+class TripletMatrix:
+    """
+    Sparse matrix under construction, stored as lists of (row, col, value) triplets.
+
+    It can be passed to Engine.stamp instead of a dense matrix: each
+    A[i, j] += v or A[i, j] -= v appends one triplet, and repeated
+    entries are added together when the matrix is assembled.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+        self.vals = []
+
+    def __getitem__(self, idx):
+        # Existing entries are never read back, so += and -= append a new triplet
+        return 0
+
+    def __setitem__(self, idx, val):
+        self.rows.append(idx[0])
+        self.cols.append(idx[1])
+        self.vals.append(val)
+
+
+class SparseSolver:
+    """
+    Solve (G + sC) * X = M with a sparse (CSC) LU factorization for each value of s.
+
+    The sparsity pattern of G + sC only depends on the netlist topology, so the
+    CSC structure and the fill-reducing column ordering are computed once,
+    and reused for all frequency points and in the following calls (optimizer
+    iterations) as long as the pattern does not change.
+    """
+
+    def __init__(self):
+        self.pattern = None  # (N, rows, cols) of the triplets used to build the structure
+        self.perm = None  # Column ordering, column j of the factorized matrix is column perm[j]
+        self.inv = None  # Position of each triplet in the CSC data array
+        self.indices = None
+        self.indptr = None
+
+    def setup(self, n: int, rows: np.ndarray, cols: np.ndarray, perm: np.ndarray):
+        # Build CSC structure of the column-permuted matrix, and remember
+        # where each triplet goes, so that repeated entries are added together
+        iperm = np.argsort(perm)
+        lin = iperm[cols] * n + rows
+        uniq, self.inv = np.unique(lin, return_inverse=True)
+        self.indices = (uniq % n).astype(np.int32)
+        self.indptr = np.searchsorted(uniq // n, np.arange(n + 1)).astype(np.int32)
+        self.perm = perm
+
+    def solve(self, G: TripletMatrix, C: TripletMatrix, M: np.ndarray, s_vec: np.ndarray):
+        """
+        Solve (G + sC) * X = M for all the values of s.
+
+        Returns:
+            Complex (npoints x N) array, each row is the vector of unknowns
+            at one frequency point.
+
+        Raises:
+            RuntimeError if the circuit matrix is singular.
+        """
+
+        n = M.shape[0]
+        rows = np.array(G.rows + C.rows, dtype=np.int64)
+        cols = np.array(G.cols + C.cols, dtype=np.int64)
+
+        pattern = (n, rows.tobytes(), cols.tobytes())
+        if pattern != self.pattern:
+            # New topology, start with natural ordering and find a better one in the first factorization
+            self.pattern = pattern
+            self.setup(n, rows, cols, np.arange(n))
+            ordering_done = False
+        else:
+            ordering_done = True
+
+        # Values of G and C in the CSC data array
+        g_vals = np.array(G.vals + [0.0] * len(C.vals), dtype=np.float64)
+        c_vals = np.array([0.0] * len(G.vals) + C.vals, dtype=np.float64)
+        nnz = len(self.indices)
+        g_data = np.bincount(self.inv, weights=g_vals, minlength=nnz)
+        c_data = np.bincount(self.inv, weights=c_vals, minlength=nnz)
+
+        b = M[:, 0].astype(np.complex128)
+        X = np.empty((len(s_vec), n), dtype=np.complex128)
+
+        for k, s in enumerate(s_vec):
+            A = sp_sparse.csc_matrix((g_data + s * c_data, self.indices, self.indptr), shape=(n, n))
+
+            if not ordering_done:
+                # COLAMD ordering depends only on the sparsity pattern: compute it once and reuse it
+                lu = sp_linalg.splu(A, permc_spec="COLAMD")
+                X[k, :] = lu.solve(b)
+
+                # Column j of A * Pc is column argsort(perm_c)[j] of A
+                self.setup(n, rows, cols, np.argsort(lu.perm_c))
+                g_data = np.bincount(self.inv, weights=g_vals, minlength=nnz)
+                c_data = np.bincount(self.inv, weights=c_vals, minlength=nnz)
+                ordering_done = True
+            else:
+                lu = sp_linalg.splu(A, permc_spec="NATURAL")
+                X[k, self.perm] = lu.solve(b)
+
+        return X
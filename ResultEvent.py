@@ -18,3 +18,10 @@ class ResultEvent(wx.PyEvent):
 
             # These are used for parser, solver & optimizer error and info messages
             self.status_msg = engine.status_msg
+
+            # Snapshot of the optimization step, the optimizer thread keeps running
+            # and overwrites these in the engine while the GUI handles the event
+            if event_type == "optim_step":
+                self.f_vec = engine.f_vec
+                self.b_step = engine.b_step
+                self.optimized_vals = dict(engine.optimized_vals)
@@ -0,0 +1,173 @@
+import hashlib
+import os
+import pickle
+import stat
+import sys
+import sympy as sp
+
+# Persistent on-disk cache of solved MNA systems
+#
+# Solving the symbolic system with sp.linsolve is by far the slowest step
+# for medium size netlists, and the same circuit is usually solved again
+# every time the application is started, or a batch job is repeated.
+#
+# The solution vector X is stored in a file named after a hash of the
+# problem (matrix A = G + sC, vector of knowns M, and the solver settings
+# that change the solution), so a cache entry is reused only when exactly
+# the same system is solved. Old entries are removed when the cache grows
+# over its size limit, least recently used first.
+#
+# Loading a pickle can run arbitrary code, so the cache is disabled by default
+# (solve_cache), and entries are only loaded if the cache directory and the
+# file are owned by the current user and not writable by others.
+
+def default_cache_dir() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+
+    return os.path.join(base, "spicemonkey", "solve")
+
+
+def is_private(path: str, regular_file: bool = False) -> bool:
+    """
+    True if path is owned by the current user and not writable by the group or others.
+    Not checked on Windows, where the cache is in the local application data of the user.
+
+    Arguments:
+        regular_file: Also require a regular file (not a symbolic link)
+    """
+
+    if not hasattr(os, "getuid"):
+        return True
+
+    try:
+        st = os.lstat(path) if regular_file else os.stat(path)
+    except OSError:
+        return False
+
+    if regular_file and not stat.S_ISREG(st.st_mode):
+        return False
+
+    return st.st_uid == os.getuid() and not (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+class SolveCache:
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+    @staticmethod
+    def get_key(A: sp.Matrix, M: sp.Matrix, subs_before_solve: bool, simplify_after_solve: bool) -> str:
+        """
+        Content hash of the system to solve.
+
+        sp.srepr is a canonical representation of the expressions, including
+        symbol names and assumptions, so two systems get the same key only
+        if they are the same system.
+        """
+
+        h = hashlib.sha256()
+        h.update(sp.srepr(A).encode())
+        h.update(b"\n")
+        h.update(sp.srepr(M).encode())
+        h.update(b"\n")
+        h.update(repr((bool(subs_before_solve), bool(simplify_after_solve))).encode())
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def contains(self, key: str) -> bool:
+        """ True if the entry exists and can be loaded (see is_private) """
+
+        return is_private(self.cache_dir) and is_private(self.path(key), regular_file=True)
+
+    def load(self, key: str):
+        """
+        Returns:
+            Cached solution vector X, or None if not in the cache (or unreadable, or not private)
+        """
+
+        filename = self.path(key)
+        if not self.contains(key):
+            return None
+
+        try:
+            with open(filename, "rb") as file:
+                X = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Corrupted entry (e.g. written by an incompatible SymPy version), forget it
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+
+        # Touch the entry so the eviction sees it as recently used
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+
+        return X
+
+    def store(self, key: str, X: sp.Matrix, max_size_mb: float):
+        """
+        Store the solution vector X, then evict old entries until the cache
+        is below max_size_mb. Errors are ignored: the cache is only an optimization.
+        """
+
+        filename = self.path(key)
+        tmp_filename = filename + ".{}.tmp".format(os.getpid())
+
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            if not is_private(self.cache_dir):
+                return
+
+            # Write to a temporary file and rename, so that concurrent
+            # processes never read a partially written entry
+            with open(tmp_filename, "wb") as file:
+                pickle.dump(X, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filename, filename)
+        except Exception:
+            try:
+                os.remove(tmp_filename)
+            except OSError:
+                pass
+            return
+
+        self.evict(max_size_mb * 1024 * 1024)
+
+    def evict(self, max_size: float):
+        entries = []
+
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".pkl"):
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            return
+
+        total = sum(e[1] for e in entries)
+
+        # Least recently used first
+        for mtime, size, filename in sorted(entries):
+            if total <= max_size:
+                break
+            try:
+                os.remove(filename)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        self.evict(0)
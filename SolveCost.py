@@ -0,0 +1,77 @@
+import math
+import sympy as sp
+
+# Predicted time of the symbolic solve
+#
+# sp.linsolve takes milliseconds for most netlists, but its time grows about
+# exponentially with the size of the circuit, and some netlists would take
+# hours. The time is predicted from the structure of the system before
+# solving, so that the "auto" solver mode can use the numeric solver instead.
+#
+# The model is a linear fit of log10(time) over these features of A = G + sC:
+#
+#   ops      Total count_ops of the matrix entries
+#   syms     Number of distinct symbols (element values and s)
+#   nonpoly  Entries that are not polynomials of the symbols (e.g. sqrt(L1*L2)
+#            of coupled inductors), which make SymPy much slower
+#
+# The coefficients are constrained to be non-negative (scipy lsq_linear), so
+# a bigger system is never predicted to be faster. fill (nonzero entries after
+# Gaussian elimination of the sparsity pattern) is kept with the features but
+# not used: the constrained fit gives it a coefficient of 0.
+#
+# Fitted on 63 symbolic solves with SymPy 1.14 on one core of a Xeon server:
+# the 20 test netlists, and the NetlistGenerator circuits of increasing size
+# until a solve took over 120s (rc_ladder, lc_ladder, sallen_key, mfb,
+# gmc_chain, coupled_inductors and balanced_ladder, 6ms to 86s). It is within
+# a factor of 2.1 on average. The worst cases are long LC ladders, up to 86
+# times slower than predicted. The constant depends on the machine. The
+# features are kept by Engine.solve together with the actual time, to tune the
+# coefficients from real usage.
+
+COEFFS = {"const": -2.72, "ops": 0.0121, "syms": 0.107, "nonpoly": 0.625}
+
+
+def structural_fill(A: sp.Matrix) -> int:
+    """ Number of nonzero entries of the L and U factors of A, eliminating in natural order without pivoting """
+
+    n = A.shape[0]
+    rows = [set(j for j in range(n) if A[i, j] != 0) for i in range(n)]
+
+    for k in range(n):
+        pivot_row = set(j for j in rows[k] if j > k)
+        for i in range(k + 1, n):
+            if k in rows[i]:
+                rows[i] |= pivot_row
+
+    return sum(len(row) for row in rows)
+
+
+def system_features(A: sp.Matrix, M: sp.Matrix) -> dict:
+    entries = [x for x in A if x != 0]
+
+    nonpoly = 0
+    for x in entries:
+        if any(not p.exp.is_Integer for p in x.atoms(sp.Pow)):
+            nonpoly += 1
+
+    return {"n": A.shape[0],
+            "nnz": len(entries),
+            "ops": int(sum(sp.count_ops(x) for x in entries)),
+            "syms": len(A.free_symbols | M.free_symbols),
+            "fill": structural_fill(A),
+            "nonpoly": nonpoly}
+
+
+def predict_solve_time(features: dict) -> float:
+    """
+    Returns:
+        Predicted time of sp.linsolve in seconds
+    """
+
+    log_t = COEFFS["const"]
+    for key, c in COEFFS.items():
+        if key != "const":
+            log_t += c * features[key]
+
+    return math.pow(10, min(log_t, 300))
@@ -0,0 +1,108 @@
+import contextlib
+import functools
+import math
+import time
+
+# Lightweight timing instrumentation of the Engine
+#
+# Each named span accumulates the number of calls, wall and CPU time, the
+# longest call, and a histogram of the wall time per call by decade
+# (<10us, <100us, ... >=10s). Spans are nested by name only ("solve.linsolve"
+# is part of "solve"), the times of a child span are also counted in the parent.
+#
+#   with self.timings.span("solve.linsolve"):
+#       ...
+#
+#   @timed("resfun")
+#   def resfun(self, xin):
+#
+# The overhead is two clock reads per call, so spans can also wrap functions
+# called thousands of times per optimization (resfun, jacfun).
+
+HIST_DECADES = list(range(-5, 2))  # Upper bounds of the histogram bins, 10^-5 s ... 10^1 s
+
+
+class Timings:
+
+    def __init__(self):
+        self.spans = {}
+
+    def reset(self):
+        self.spans = {}
+
+    def record(self, name: str, wall: float, cpu: float = 0.0):
+        s = self.spans.get(name)
+        if s is None:
+            s = self.spans[name] = {"count": 0, "wall": 0.0, "cpu": 0.0, "max": 0.0,
+                                    "hist": [0] * (len(HIST_DECADES) + 1)}
+
+        s["count"] += 1
+        s["wall"] += wall
+        s["cpu"] += cpu
+        s["max"] = max(s["max"], wall)
+
+        idx = math.floor(math.log10(wall)) + 1 - HIST_DECADES[0] if wall > 0 else 0
+        s["hist"][min(max(idx, 0), len(HIST_DECADES))] += 1
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def as_dict(self) -> dict:
+        """
+        Returns:
+            Dict span name -> {"count", "wall", "cpu", "max", "hist"} (times in seconds).
+            hist is the number of calls per decade of wall time, see hist_labels.
+        """
+        return {name: dict(s, hist=list(s["hist"])) for name, s in sorted(self.spans.items())}
+
+    @staticmethod
+    def hist_labels() -> list:
+        labels = ["<" + fmt_time(10.0 ** d) for d in HIST_DECADES]
+        return labels + [">=" + fmt_time(10.0 ** HIST_DECADES[-1])]
+
+    def table(self) -> str:
+        """ Text table of all spans, sorted by name so that child spans follow their parent """
+
+        txt = "{:<28s} {:>8s} {:>10s} {:>10s} {:>10s} {:>10s}\n".format("span", "count", "wall", "cpu", "mean",
+                                                                         "max")
+        for name, s in sorted(self.spans.items()):
+            txt += "{:<28s} {:>8d} {:>10s} {:>10s} {:>10s} {:>10s}\n".format(
+                name, s["count"], fmt_time(s["wall"]), fmt_time(s["cpu"]), fmt_time(s["wall"] / s["count"]),
+                fmt_time(s["max"]))
+
+        # Histograms only for the spans called many times
+        labels = self.hist_labels()
+        for name, s in sorted(self.spans.items()):
+            if s["count"] >= 10:
+                bins = ["{}: {}".format(label, n) for label, n in zip(labels, s["hist"]) if n > 0]
+                txt += "{} histogram: {}\n".format(name, ", ".join(bins))
+
+        return txt
+
+
+def fmt_time(t: float) -> str:
+    if t >= 1:
+        return "{:.3g}s".format(t)
+    elif t >= 1e-3:
+        return "{:.3g}ms".format(t * 1e3)
+    else:
+        return "{:.3g}us".format(t * 1e6)
+
+
+def timed(name: str):
+    """ Decorator for Engine methods, records each call in the span name of self.timings """
+
+    def decorator(fun):
+        @functools.wraps(fun)
+        def wrapper(self, *args, **kwargs):
+            with self.timings.span(name):
+                return fun(self, *args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -184,6 +184,35 @@ class WxBodePlot(wx.Panel):
             if line.get_label() == name:
                 line.remove()
 
+    def clear_band(self, name: str):
+        if not self.setup_done:
+            return
+        with self.lock:
+            for ax in [self.ax_mag, self.ax_ph]:
+                for band in list(ax.collections):
+                    if band.get_label() == name:
+                        band.remove()
+            self.finish_plot()
+
+    def plot_band(self, name: str, f_vec: np.ndarray, lower: np.ndarray, upper: np.ndarray):
+        # Shaded area between lower and upper (2 x npoints arrays: magnitude and phase), replacing the old one
+        self.clear_band(name)
+        with self.lock:
+            if not self.setup_done:
+                self.setup()
+
+            self.ax_mag.fill_between(f_vec, lower[0, :], upper[0, :], alpha=0.3,
+                                     color=self.root.app_state.linecolor_optimized, label=name)
+            self.ax_ph.fill_between(f_vec, lower[1, :], upper[1, :], alpha=0.3,
+                                    color=self.root.app_state.linecolor_optimized, label=name)
+
+            self.ax_mag.relim()
+            self.ax_mag.autoscale_view(scalex=False, scaley=True)
+            self.ax_ph.relim()
+            self.ax_ph.autoscale_view(scalex=False, scaley=True)
+            self.ax_mag.legend(loc="upper right")
+            self.finish_plot()
+
     def finish_plot(self):
         self.fig.tight_layout()
         self.fig.canvas.draw_idle() # this runs the plotter in another thread, also works.
@@ -0,0 +1,47 @@
+import wx
+
+
+class WxDialogDiagnostics(wx.Dialog):
+    # Time spent in each phase of the engine since it was created (see Engine.get_timings),
+    # with the histogram of the functions called many times (resfun, jacfun, optimizer iterations)
+
+    def __init__(self, parent, engine):
+        super(WxDialogDiagnostics, self).__init__(parent, title="Diagnostics",
+                                                  style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+
+        szr = wx.BoxSizer(wx.VERTICAL)
+        self.engine = engine
+
+        font = wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL)
+        self.text = wx.TextCtrl(self, -1, "", style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_DONTWRAP)
+        self.text.SetFont(font)
+        self.text.SetMinSize((700, 350))
+        szr.Add(self.text, proportion=1, flag=wx.EXPAND | wx.ALL, border=5)
+
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        btn_refresh = wx.Button(self, -1, label="Refresh")
+        btn_refresh.Bind(wx.EVT_BUTTON, lambda e: self.update())
+        btn_sizer.Add(btn_refresh, flag=wx.ALL, border=2)
+        btn_reset = wx.Button(self, -1, label="Reset")
+        btn_reset.Bind(wx.EVT_BUTTON, self.callback_reset)
+        btn_sizer.Add(btn_reset, flag=wx.ALL, border=2)
+
+        btn_close = wx.Button(self, wx.ID_OK, label="Close")
+        btn_close.SetDefault()
+        btn_sizer.AddStretchSpacer()
+        btn_sizer.Add(btn_close, flag=wx.ALL, border=2)
+
+        szr.Add(btn_sizer, flag=wx.EXPAND | wx.ALL, border=5)
+
+        self.update()
+        self.SetSizerAndFit(szr)
+
+    def update(self):
+        if len(self.engine.timings.spans) == 0:
+            self.text.SetValue("No timings yet, parse and solve the circuit first")
+        else:
+            self.text.SetValue(self.engine.timings.table())
+
+    def callback_reset(self, e):
+        self.engine.timings.reset()
+        self.update()
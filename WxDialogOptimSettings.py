@@ -30,6 +30,9 @@ class WxDialogOptimSettings(wx.Dialog):
                             ("gtol", "Norm of the gradient tolerance"),
                             ("max_nfev", "Max number of evaluations"),
                             ("diff_step", "Step for Jacobian computation"),
+                            ("multistart_n", "Number of starting points"),
+                            ("multistart_workers", "Worker processes (0: all cores)"),
+                            ("de_workers", "Processes for differential evolution"),
                             ("weight_mag", "Weight applied to magnitude error"),
                             ("weight_phase", "Weight applied to phase error"),
                             ("weight_amp", "Weight applied to makeup gain"),
@@ -48,6 +51,14 @@ class WxDialogOptimSettings(wx.Dialog):
 
         gsizer.Add(self.algorithm_choice, proportion=2, flag=wx.ALIGN_LEFT)
 
+        # Jacobian computation combo box
+        gsizer.Add(wx.StaticText(self, -1, "Jacobian: ", style=wx.ALIGN_LEFT), proportion=1,
+                       flag=wx.EXPAND | wx.ALL, border=5)
+
+        self.jac_choice = wx.Choice(self, id=wx.ID_ANY, choices=["2-point", "3-point", "analytic"])
+
+        gsizer.Add(self.jac_choice, proportion=2, flag=wx.ALIGN_LEFT)
+
         # The rest of the boxes
         for el in self.setting_arr:
             gsizer.Add(wx.StaticText(self, -1, el[1] + " (" + el[0] + "): ", style=wx.ALIGN_LEFT), 1,
@@ -68,12 +79,14 @@ class WxDialogOptimSettings(wx.Dialog):
 
     def load_state(self):
         self.algorithm_choice.SetSelection(self.algorithm_choice.FindString(self.app_state.optim_method))
+        self.jac_choice.SetSelection(self.jac_choice.FindString(self.app_state.jac_method))
         for el in self.texts.keys():
             self.texts[el].SetValue(str(self.app_state[el]))
 
     def callback_evt_button(self, event):
         if event.GetId() == wx.ID_OK or event.GetId() == wx.ID_APPLY:
             self.app_state.optim_method = self.algorithm_choice.GetString(self.algorithm_choice.GetSelection())
+            self.app_state.jac_method = self.jac_choice.GetString(self.jac_choice.GetSelection())
             for key, el in self.texts.items():
                 self.app_state[key] = eng2num(el.GetValue())
         event.Skip()
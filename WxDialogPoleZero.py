@@ -0,0 +1,56 @@
+import wx
+
+
+class WxDialogPoleZero(wx.Dialog):
+    # Poles and zeros of the original and optimized circuits (see Engine.get_polezero),
+    # each one can be copied to the target response in the pole/zero panel
+
+    def __init__(self, parent, engine, h_original, h_optimized):
+        super(WxDialogPoleZero, self).__init__(parent, title="Poles and zeros",
+                                               style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+
+        szr = wx.BoxSizer(wx.VERTICAL)
+        self.root = parent
+        self.pz = {}
+
+        font = wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL)
+        btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
+
+        for name, h_sym in [("Original", h_original), ("Optimized", h_optimized)]:
+            if h_sym is None:
+                continue
+
+            pz = engine.get_polezero(h_sym)
+            txt = engine.polezero_table(pz) if pz is not None else "Not available (numeric solver)"
+
+            szr.Add(wx.StaticText(self, -1, name + ":"), flag=wx.LEFT | wx.TOP, border=5)
+            text = wx.TextCtrl(self, -1, txt, style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_DONTWRAP)
+            text.SetFont(font)
+            text.SetMinSize((400, 150))
+            szr.Add(text, proportion=1, flag=wx.EXPAND | wx.ALL, border=5)
+
+            if pz is not None:
+                self.pz[name] = pz
+                btn = wx.Button(self, -1, label="Use " + name.lower() + " as target")
+                btn.Bind(wx.EVT_BUTTON, lambda e, key=name: self.callback_use_as_target(key))
+                btn_sizer.Add(btn, flag=wx.ALL, border=2)
+
+        btn_close = wx.Button(self, wx.ID_OK, label="Close")
+        btn_close.SetDefault()
+        btn_sizer.AddStretchSpacer()
+        btn_sizer.Add(btn_close, flag=wx.ALL, border=2)
+
+        szr.Add(btn_sizer, flag=wx.EXPAND | wx.ALL, border=5)
+
+        self.SetSizerAndFit(szr)
+
+    def callback_use_as_target(self, key: str):
+        pz = self.pz[key]
+        app_state = self.root.app_state
+
+        app_state.magnitude = pz["magnitude"]
+        app_state.phase = pz["phase"]
+        app_state.pztable = [list(row) for row in pz["pztable"]]
+
+        self.root.panel_polezero.load_state()
+        self.root.update_plots(do_setup=False)
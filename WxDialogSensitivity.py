@@ -0,0 +1,48 @@
+import wx
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_wxagg import (
+    FigureCanvasWxAgg as FigureCanvas)
+
+
+class WxDialogSensitivity(wx.Dialog):
+    # Table of the normalized sensitivities of the transfer function to each element,
+    # and optionally a plot of |S| over frequency (app_state.sens_show_plot)
+
+    def __init__(self, parent, app_state, result: dict):
+        super(WxDialogSensitivity, self).__init__(parent, title="Sensitivities",
+                                                  style=wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER)
+
+        szr = wx.BoxSizer(wx.VERTICAL)
+        self.app_state = app_state
+
+        text = wx.TextCtrl(self, -1, result["table"], style=wx.TE_MULTILINE | wx.TE_READONLY | wx.TE_DONTWRAP)
+        text.SetFont(wx.Font(10, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        text.SetMinSize((500, 150))
+        szr.Add(text, proportion=1, flag=wx.EXPAND | wx.ALL, border=5)
+
+        if self.app_state.sens_show_plot:
+            self.fig = Figure(figsize=(6, 3.5))
+            self.canvas = FigureCanvas(self, -1, self.fig)
+            ax = self.fig.add_subplot(1, 1, 1)
+
+            for key, el in result["sens"].items():
+                ax.semilogx(result["f"], np.abs(el), label=key)
+
+            ax.set_xlabel("Frequency (Hz)")
+            ax.set_ylabel("|S|")
+            ax.grid(True, which="both", alpha=0.3)
+            ax.legend(fontsize="small", ncol=2)
+            self.fig.tight_layout()
+
+            szr.Add(self.canvas, proportion=2, flag=wx.EXPAND | wx.ALL, border=5)
+
+        btn_bar = wx.StdDialogButtonSizer()
+        btn_close = wx.Button(self, wx.ID_OK, label="Close")
+        btn_close.SetDefault()
+        btn_bar.SetAffirmativeButton(btn_close)
+        btn_bar.Realize()
+
+        szr.Add(btn_bar, flag=wx.ALIGN_RIGHT | wx.ALL, border=5)
+
+        self.SetSizerAndFit(szr)
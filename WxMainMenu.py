@@ -39,6 +39,20 @@ class WxMainMenu(wx.MenuBar):
 
         self.root.Bind(wx.EVT_MENU, callback, d[key])
 
+    def menu_radioitems(self, m: wx.Menu, key: str, choices: list, status_label: str):
+        # One radio item for each (value, label) in choices
+        # Use the menu key as name for the parameter in app_state, the checked item sets its value
+        self.radio_items[key] = {}
+        for value, label in choices:
+            item = m.Append(wx.NewIdRef(1), label, status_label, kind=wx.ITEM_RADIO)
+            self.radio_items[key][value] = item
+
+            def callback(e, value=value):
+                self.root.app_state.__setattr__(key, value)
+                e.Skip()
+
+            self.root.Bind(wx.EVT_MENU, callback, item)
+
     def menu_examples_item(self, m: wx.Menu, d: dict, key: str, label: str, status_label: str,
                      wxid=None, enable=True):
         if wxid is None:
@@ -69,6 +83,7 @@ class WxMainMenu(wx.MenuBar):
         self.file_cir = None
 
         self.check_items = {}
+        self.radio_items = {}
 
         fileMenu = wx.Menu()
         fileItem = {}
@@ -111,6 +126,19 @@ class WxMainMenu(wx.MenuBar):
                             'Case-sensitive', 'Case-sensitive', None, enable=False)
         self.menu_checkitem(netlistMenu, self.netlistItem, "subs_before_solve", 'Substitute before solve',
                                               'Substitute fixed before solve (not necessarily faster)', None)
+        self.menu_checkitem(netlistMenu, self.netlistItem, "compile_cse", 'Eliminate common subexpressions',
+                            'Extract repeated subexpressions before compiling the transfer function', None)
+
+        # Solver submenu
+        solverMenu = wx.Menu()
+        self.menu_radioitems(solverMenu, "solver_mode", [("symbolic", "Symbolic"), ("cramer", "Symbolic (single output)"),
+                                                          ("numeric", "Numeric"), ("auto", "Automatic")],
+                             "Solve circuit symbolically or numerically for each frequency")
+        solverMenu.AppendSeparator()
+        self.menu_checkitem(solverMenu, self.netlistItem, "solve_isolated", 'Solve in a separate process',
+                            'Symbolic solve in a child process, with time and memory limits, that Stop can abort',
+                            None)
+        netlistMenu.Append(wx.ID_ANY, "Solver", solverMenu)
 
         self.Append(netlistMenu, '&Netlist')
 
@@ -150,6 +178,26 @@ class WxMainMenu(wx.MenuBar):
 
         self.Append(optimMenu, '&Optimization')
 
+        analysisMenu = wx.Menu()
+        self.analysisItem = {}
+        self.menu_item(analysisMenu, self.analysisItem, "monte_carlo", 'Monte Carlo\tF7',
+                       'Tolerance analysis with random element values (tol= argument in the netlist)', wx.ID_ANY,
+                       self.analysis_monte_carlo)
+        self.menu_checkitem(analysisMenu, self.analysisItem, "mc_show_bands", 'Show tolerance bands',
+                            'Plot the percentile bands of the Monte Carlo analysis', None,
+                            extra_callback=self.root.update_band)
+        analysisMenu.AppendSeparator()
+        self.menu_item(analysisMenu, self.analysisItem, "sensitivity", 'Sensitivities\tF8',
+                       'Normalized sensitivities of the transfer function to each element value', wx.ID_ANY,
+                       self.analysis_sensitivity)
+        self.menu_checkitem(analysisMenu, self.analysisItem, "sens_show_plot", 'Plot sensitivities',
+                            'Show a plot of the sensitivities over frequency with the table', None)
+        self.menu_item(analysisMenu, self.analysisItem, "polezero", 'Poles and zeros\tF9',
+                       'Poles and zeros of the original and optimized circuits', wx.ID_ANY,
+                       self.analysis_polezero)
+
+        self.Append(analysisMenu, '&Analysis')
+
         helpMenu = wx.Menu()
         self.helpItem = {}
 
@@ -163,6 +211,9 @@ class WxMainMenu(wx.MenuBar):
 
         # Other help menus
         self.menu_checkitem(helpMenu, self.helpItem, "_debug", 'Print debug messages', 'Print debug messages', None)
+        self.menu_item(helpMenu, self.helpItem, "diagnostics", 'Diagnostics...',
+                       'Time spent in each phase of the parser, solver and optimizer', wx.ID_ANY,
+                       self.diagnostics)
         self.menu_item(helpMenu, self.helpItem, "about", "About...", "About SpiceMonkey", wx.ID_ABOUT, self.about)
 
         self.Append(helpMenu, '&Help')
@@ -228,6 +279,9 @@ class WxMainMenu(wx.MenuBar):
     def load_state(self):
         for key, el in self.check_items.items():
             el.Check(self.root.app_state[key])
+        for key, items in self.radio_items.items():
+            if self.root.app_state[key] in items:
+                items[self.root.app_state[key]].Check(True)
         self.dialog_settings.load_state()
 
     def file_open(self, e):
@@ -337,12 +391,24 @@ class WxMainMenu(wx.MenuBar):
     def optim_run(self, e):
         self.root.panel_netlist.event_handler_btn_optimize(None)
 
+    def analysis_monte_carlo(self, e):
+        self.root.panel_netlist.event_handler_monte_carlo(None)
+
+    def analysis_sensitivity(self, e):
+        self.root.panel_netlist.event_handler_sensitivity(None)
+
+    def analysis_polezero(self, e):
+        self.root.show_polezero()
+
     def optim_parse(self, e):
         self.root.panel_netlist.event_handler_btn_parse_solve(None)
 
     def optim_stop(self, e):
         self.root.panel_netlist.event_handler_btn_optimize(None)
 
+    def diagnostics(self, e):
+        self.root.show_diagnostics()
+
     def about(self, e):
         ret = wx.MessageBox("SpiceMonkey: A self-contained circuit analysis and optimization toolbox.",
                             "About",
@@ -3,6 +3,9 @@ from WxBodePlot import WxBodePlot
 from WxPanelPoleZero import WxPanelPoleZero
 from WxMainMenu import WxMainMenu
 from WxPanelNetlist import WxPanelNetlist
+from WxDialogSensitivity import WxDialogSensitivity
+from WxDialogPoleZero import WxDialogPoleZero
+from WxDialogDiagnostics import WxDialogDiagnostics
 from AppState import AppState
 from Engine import Engine
 from ResultEvent import EVT_RESULT_ID, ResultEvent
@@ -91,16 +94,24 @@ class WxMainWindow(wx.Frame):
         self.parent.ExitMainLoop()
         self.Destroy()
 
-    def update_plots(self, do_setup=False):
-        # Updates the bode plots if the corresponding symbolic expression is not None.
-        # If the symbolic expression is not None, but it cannot compute the frequency response,
-        # because get_freqresponse returns None, update_plots returns False.
+    def update_target_plot(self, do_setup=False):
+        # Updates only the target line, fast enough to follow the pole/zero slider.
+        # Returns True if the plot axes have been set up.
 
         self.engine.compute_target_freqresponse()
         if self.engine.b_target is None:
             self.panel_bodeplot.clear_line("Target")
+            return False
         else:
             self.panel_bodeplot.plot_line("Target", self.engine.f_vec, self.engine.b_target, do_setup)
+            return do_setup
+
+    def update_plots(self, do_setup=False):
+        # Updates the bode plots if the corresponding symbolic expression is not None.
+        # If the symbolic expression is not None, but it cannot compute the frequency response,
+        # because get_freqresponse returns None, update_plots returns False.
+
+        if self.update_target_plot(do_setup):
             do_setup = False
 
         if self.h_original is None:
@@ -125,6 +136,28 @@ class WxMainWindow(wx.Frame):
         return True
 
 
+    def update_band(self):
+        # Plot the outer percentiles of the last Monte Carlo analysis as a band
+        result = self.engine.mc_result
+        if result is None or not self.app_state.mc_show_bands:
+            self.panel_bodeplot.clear_band("Monte Carlo")
+        else:
+            self.panel_bodeplot.plot_band("Monte Carlo", result["f"], result["bands"][0], result["bands"][-1])
+
+    def show_polezero(self):
+        if self.h_original is None and self.h_optimized is None:
+            self.statusbar.SetStatusText("Poles and zeros: parse and solve the circuit first")
+            return
+
+        dlg = WxDialogPoleZero(self, self.engine, self.h_original, self.h_optimized)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+    def show_diagnostics(self):
+        dlg = WxDialogDiagnostics(self, self.engine)
+        dlg.ShowModal()
+        dlg.Destroy()
+
     def load_all_states(self):
         # Called by menu when opening state file
         self.panel_polezero.load_state()
@@ -167,7 +200,10 @@ class WxMainWindow(wx.Frame):
                 self.panel_netlist.fill_combos()
                 #self.enable_parse_solve(False, False)
                 #self.enable_optimize(False, settings=True, stop=False)
-                pass
+
+                if self.app_state.solve_isolated:
+                    # Solve in a child process, which the Stop button kills
+                    self.enable_optimize(False, settings=False, stop=True)
 
             elif event.event_type == "solver_ok":
                 # Is this needed?
@@ -193,14 +229,15 @@ class WxMainWindow(wx.Frame):
                 self.enable_optimize(False, settings=True, stop=False)
 
             elif event.event_type == "optim_step":
-                self.panel_bodeplot.plot_line("Optimized", self.engine.f_vec, self.engine.b_step)
-                self.app_state.netlist_optimized = self.engine.generate(self.engine.optimized_vals)
+                self.panel_bodeplot.plot_line("Optimized", event.f_vec, event.b_step)
+                self.app_state.netlist_optimized = self.engine.generate(event.optimized_vals)
                 self.panel_netlist.txt_spice_optimized.ChangeValue(self.app_state.netlist_optimized)
 
             elif event.event_type == "optim_ok":
                 self.enable_parse_solve(True, True)
                 self.enable_optimize(True, settings=True, stop=False)
                 self.panel_netlist.parsed_tab = 1
+                self.panel_netlist.optimized_vals = self.engine.optimized_vals
 
                 self.h_optimized = self.engine.h_final  # .copy() removed
                 b_optimized = self.engine.get_freqresponse(self.h_optimized)
@@ -212,6 +249,27 @@ class WxMainWindow(wx.Frame):
                 self.enable_parse_solve(True, True)
                 self.enable_optimize(True, settings=True, stop=False)
                 self.panel_netlist.parsed_tab = 1
+                self.panel_netlist.optimized_vals = self.engine.optimized_vals
+
+            elif event.event_type == "mc_ok":
+                self.enable_parse_solve(True, True)
+                self.enable_optimize(True, settings=True, stop=False)
+                self.update_band()
+
+            elif event.event_type == "mc_error":
+                self.enable_parse_solve(True, True)
+                self.enable_optimize(self.h_original is not None, settings=True, stop=False)
+
+            elif event.event_type == "sens_ok":
+                self.enable_parse_solve(True, True)
+                self.enable_optimize(True, settings=True, stop=False)
+                dlg = WxDialogSensitivity(self, self.app_state, self.engine.sens_result)
+                dlg.ShowModal()
+                dlg.Destroy()
+
+            elif event.event_type == "sens_error":
+                self.enable_parse_solve(True, True)
+                self.enable_optimize(self.h_original is not None, settings=True, stop=False)
 
             elif event.event_type == "optim_error":
                 self.enable_parse_solve(True, True)
@@ -236,6 +294,8 @@ class WxMainWindow(wx.Frame):
         self.panel_netlist.btn_optimize.Enable(enable or stop)
         self.panel_netlist.btn_copy_optimized.Enable(enable)
         self.menubar.optimItem["run"].Enable(enable)
+        self.menubar.analysisItem["monte_carlo"].Enable(enable)  # Needs the solved circuit
+        self.menubar.analysisItem["sensitivity"].Enable(enable)
         self.menubar.optimItem["log_transform"].Enable(settings)
         self.menubar.optimItem["magnitude_in_dB"].Enable(settings)
         self.menubar.optimItem["optimize_mag"].Enable(settings)
@@ -14,8 +14,8 @@ class WxPanelNetlist(wx.Panel):
 
         self.worker_thread = None
         self.worker_lock = threading.Lock()
-        self.changed_flag = []
         self.parsed_tab = 0
+        self.optimized_vals = None  # Values of the last optimization, until the netlist is parsed again
         self.input_exprs = []
         self.output_exprs = []
 
@@ -92,6 +92,13 @@ class WxPanelNetlist(wx.Panel):
         sizer.Add(self.btn_optimize, 0, wx.EXPAND | wx.ALL, 1)
         self.SetSizer(sizer)
 
+        # Long-lived parse & solve worker, see submit_parse_solve
+        self.job_cond = threading.Condition()
+        self.job_pending = None  # Next parse & solve job, replaced by newer edits before it starts
+        self.job_running = False  # A parse & solve job holds the worker lock
+        self.parse_solve_thread = threading.Thread(target=self.parser_solver_thread_fun, daemon=True)
+        self.parse_solve_thread.start()
+
     def debug_print(self, o, end=None):
         if self.root.app_state._debug:
                 print("[GUI DEBUG] " + str(o).replace("\n", "\n[GUI DEBUG] "), end=end)
@@ -104,9 +111,6 @@ class WxPanelNetlist(wx.Panel):
         wx.CallAfter(self.event_handler_btn_parse_solve, None)
 
     def event_handler_text(self, event):
-        self.changed_flag.append(1)
-        self.debug_print("Changed flag set: " + str(len(self.changed_flag)))
-
         # Depending on which tab is selected, update netlist or netlist_optimized
         self.parsed_tab = self.notebook.GetSelection()
         if self.notebook.GetSelection() == 0:
@@ -114,13 +118,11 @@ class WxPanelNetlist(wx.Panel):
         else:
             self.root.app_state.netlist_optimized = self.txt_spice_optimized.GetValue()
 
-        # Start parse & solve thread if enabled while typing
+        # Parse & solve once the user stops typing, if enabled while typing
+        # Skipped while the optimizer or another analysis holds the worker lock
         if self.root.app_state.parse_while_typing:
-            if not self.worker_lock.locked():
-                self.root.enable_parse_solve(False, False)
-                self.parser_solver_called_while_typing = True
-                self.worker_thread = threading.Thread(target=self.parser_solver_thread_fun)
-                self.worker_thread.start()
+            if self.job_running or not self.worker_lock.locked():
+                self.submit_parse_solve(True)
 
     def event_handler_copy_optimized(self, event):
         v = self.txt_spice_optimized.GetValue()
@@ -168,20 +170,55 @@ class WxPanelNetlist(wx.Panel):
             outexpr_valid = self.engine.validate_output_expr()
             if outexpr_valid is not None:
                 # Output expression is valid, call solver
-                self.root.enable_parse_solve(False, False)
                 self.root.enable_optimize(False)
-                self.worker_thread = threading.Thread(target=self.parser_solver_thread_fun)
-                self.worker_thread.start()
+                self.submit_parse_solve(self.parser_solver_called_while_typing)
 
         event.Skip()
 
     def event_handler_btn_parse_solve(self, event):
         assert (not self.worker_lock.locked())  # Buttons are disabled while solving so should never be called
 
-        self.root.enable_parse_solve(False, False)  # TODO: Move this to callback_worker_thread_event, create event parse_solve_start
         self.root.enable_optimize(False, settings=True)  # TODO: Move this to callback_worker_thread_event, create event parse_solve_start
-        self.parser_solver_called_while_typing = False
-        self.worker_thread = threading.Thread(target=self.parser_solver_thread_fun)
+        self.submit_parse_solve(False)
+
+    def submit_parse_solve(self, while_typing: bool):
+        """
+        Queue a parse & solve of the current netlist for the worker thread.
+        While typing, the job starts parse_debounce seconds after the last edit. A newer job replaces
+        the queued one, and cancels the one running (at the next safe point of Engine.parse or solve).
+        """
+
+        self.root.enable_parse_solve(False, False)  # TODO: Move this to callback_worker_thread_event, create event parse_solve_start
+        self.parser_solver_called_while_typing = while_typing
+
+        delay = self.root.app_state.parse_debounce if while_typing else 0.0
+        with self.job_cond:
+            self.job_pending = {"while_typing": while_typing, "start": time.monotonic() + delay}
+            if self.job_running:
+                self.engine.cancel_flag = True
+            self.job_cond.notify()
+
+    def event_handler_monte_carlo(self, event):
+        if self.worker_lock.locked():
+            return  # Parser, solver or optimizer running
+
+        self.root.enable_parse_solve(False, False)
+        self.root.enable_optimize(False, settings=True)
+        self.root.statusbar.SetStatusText("Starting Monte Carlo analysis...")
+
+        # Launch Monte Carlo analysis in a separate thread
+        self.worker_thread = threading.Thread(target=self.monte_carlo_thread_fun)
+        self.worker_thread.start()
+
+    def event_handler_sensitivity(self, event):
+        if self.worker_lock.locked():
+            return  # Parser, solver or optimizer running
+
+        self.root.enable_parse_solve(False, False)
+        self.root.enable_optimize(False, settings=True)
+        self.root.statusbar.SetStatusText("Computing sensitivities...")
+
+        self.worker_thread = threading.Thread(target=self.sensitivity_thread_fun)
         self.worker_thread.start()
 
     def event_handler_btn_optimize(self, event):
@@ -203,8 +240,22 @@ class WxPanelNetlist(wx.Panel):
             self.worker_thread = threading.Thread(target=self.optimizer_thread_fun)
             self.worker_thread.start()
 
+    def monte_carlo_thread_fun(self):
+        with self.worker_lock:
+            # Around the solved circuit, with the optimized values if the optimized netlist is selected
+            # Result is sent to the GUI with the mc_ok or mc_error event
+            self.engine.monte_carlo(vals=self.optimized_vals if self.parsed_tab == 1 else None)
+
+    def sensitivity_thread_fun(self):
+        with self.worker_lock:
+            # Of the solved circuit, with the optimized values if the optimized netlist is selected
+            # Result is sent to the GUI with the sens_ok or sens_error event
+            self.engine.sensitivity(vals=self.optimized_vals if self.parsed_tab == 1 else None)
+
     def optimizer_thread_fun(self):
         with self.worker_lock:
+            self.optimized_vals = None
+
             # Depending on which tab is selected, use netlist or netlist_optimized
             if self.parsed_tab == 0:
                 self.debug_print("parser: start with original")
@@ -230,98 +281,80 @@ class WxPanelNetlist(wx.Panel):
                 wx.PostEvent(self.root, r)
 
     def parser_solver_thread_fun(self):
+        # Runs for the whole life of the panel, waiting for jobs queued by submit_parse_solve
 
-        # Do-while loop to repeat Parse & Solve if netlist has been changed after Solve
         while True:
+            # Wait for a job, and for its debounce delay. The job may be replaced meanwhile.
+            with self.job_cond:
+                while self.job_pending is None or time.monotonic() < self.job_pending["start"]:
+                    timeout = None if self.job_pending is None else self.job_pending["start"] - time.monotonic()
+                    self.job_cond.wait(timeout)
+
+            with self.worker_lock:
+                with self.job_cond:
+                    job = self.job_pending
+                    if job is None or time.monotonic() < job["start"]:
+                        continue  # Replaced by a newer edit while waiting for the lock
+                    self.job_pending = None
+                    self.job_running = True
+                    self.engine.cancel_flag = False
+
+                self.parse_solve_job(job)
+
+                with self.job_cond:
+                    self.job_running = False
+                    self.engine.cancel_flag = False
+
+    def job_superseded(self) -> bool:
+        # A newer job is queued, the result of the current one is not sent to the GUI
+        return self.job_pending is not None
+
+    def parse_solve_job(self, job: dict):
+        self.optimized_vals = None
+
+        # Depending on which tab is selected, use netlist or netlist_optimized
+        if self.parsed_tab == 0:
+            self.debug_print("parser: start with original")
+            parser_status = self.engine.parse(self.root.app_state.netlist)
+        else:
+            self.debug_print("parser: start with optimized")
+            parser_status = self.engine.parse(self.root.app_state.netlist_optimized)
 
-            # Do-while loop to repeat Parse if netlist has been changed after Parse
-            while True:
-
-                # The lock must be inside the loop.
-                # Otherwise, events are released to the GUI while the thread has the lock.
-                with self.worker_lock:
-                    self.changed_flag.clear()
-
-                    # Depending on which tab is selected, use netlist or netlist_optimized
-                    if self.parsed_tab == 0:
-                        self.debug_print("parser: start with original")
-                        parser_status = self.engine.parse(self.root.app_state.netlist)
-                    else:
-                        self.debug_print("parser: start with optimized")
-                        parser_status = self.engine.parse(self.root.app_state.netlist_optimized)
-
-                    if self.parser_solver_called_while_typing:
-                        # Delay to not call parser too often if called while typing
-                        time.sleep(0.5)
-
-                if len(self.changed_flag) == 0:
-                    # Not changed during parser, exit the parser Do-while loop, and proceed to solve
-                    break
-                else:
-                    # Netlist text changed during parser. Must parse again.
-                    # Depending on which tab is selected, update netlist or netlist_optimized
-                    if self.parsed_tab == 0:
-                        self.debug_print("parser: changed original before start of solving")
-                        self.root.app_state.netlist = self.txt_spice.GetValue()
-                    else:
-                        self.debug_print("parser: changed optimized before start of solving")
-                        self.root.app_state.netlist_optimized = self.txt_spice_optimized.GetValue()
-
-            if parser_status:
-                # Parser completed correctly
-
-                # Validate input and output expressions.
-                # If not valid, try to pick the first valid one
-                self.input_exprs, self.output_exprs = self.engine.get_list_input_output_expressions()
+        if self.job_superseded():
+            self.debug_print("parser: netlist changed, result discarded")
+            return
 
-                if self.engine.validate_output_expr() is None:
-                    # The output expression is not valid
-                    if len(self.output_exprs) != 0 and len(self.root.app_state.outexpr) == 0:
-                        self.root.app_state.outexpr = self.output_exprs[0]
+        if not parser_status:
+            wx.PostEvent(self.root, ResultEvent("parser_error", self.engine))  # Event handled by callback_engine_thread_event
+            return
 
-                if not self.engine.validate_input_expr():
-                    # The input expression is not valid
-                    if len(self.input_exprs) != 0:
-                        self.root.app_state.inexpr = self.input_exprs[0]
+        # Validate input and output expressions.
+        # If not valid, try to pick the first valid one
+        self.input_exprs, self.output_exprs = self.engine.get_list_input_output_expressions()
 
-                if self.parser_solver_called_while_typing and not self.root.app_state.solve_while_typing:
-                    # Parser was called while typing and solve while typing is disabled
-                    wx.PostEvent(self.root, ResultEvent("parser_ok", self.engine))
-                else:
-                    # Parser was not called while typing, call solver.
-                    wx.PostEvent(self.root, ResultEvent("parser_ok_solving", self.engine))
-                    with self.worker_lock:
-                        solver_status = self.engine.solve()
+        if self.engine.validate_output_expr() is None:
+            # The output expression is not valid
+            if len(self.output_exprs) != 0 and len(self.root.app_state.outexpr) == 0:
+                self.root.app_state.outexpr = self.output_exprs[0]
 
-                        if self.parser_solver_called_while_typing:
-                            # Delay to not call parser & solver too often if called while typing
-                            # TODO maybe this should go after ResultEvent
-                            time.sleep(0.5)
+        if not self.engine.validate_input_expr():
+            # The input expression is not valid
+            if len(self.input_exprs) != 0:
+                self.root.app_state.inexpr = self.input_exprs[0]
 
-                    wx.PostEvent(self.root, ResultEvent("solver_ok" if solver_status else "solver_error", self.engine))
+        if job["while_typing"] and not self.root.app_state.solve_while_typing:
+            # Parser was called while typing and solve while typing is disabled
+            wx.PostEvent(self.root, ResultEvent("parser_ok", self.engine))
+            return
 
-            else:
-                if self.parser_solver_called_while_typing:
-                    # Delay to not call parser & solver too often if called while typing
-                    # TODO maybe this should go after ResultEvent
-                    time.sleep(0.1)
+        wx.PostEvent(self.root, ResultEvent("parser_ok_solving", self.engine))
+        solver_status = self.engine.solve()
 
-                r = ResultEvent("parser_error", self.engine)
-                wx.PostEvent(self.root, r)  # Event handled by callback_engine_thread_event
+        if self.job_superseded():
+            self.debug_print("solver: netlist changed, result discarded")
+            return
 
-            if len(self.changed_flag) == 0:
-                # Not changed during solve, exit the parser & solve Do-while loop
-                break
-            else:
-                # Changed while solving, must parse & solve again
-                # Depending on which tab is selected, update netlist or netlist_optimized
-                # self.parsed_tab = self.notebook.GetSelection()
-                if self.parsed_tab == 0:
-                    self.debug_print("parser: changed original after start of solving")
-                    self.root.app_state.netlist = self.txt_spice.GetValue()
-                else:
-                    self.debug_print("parser: changed optimized after start of solving")
-                    self.root.app_state.netlist_optimized = self.txt_spice_optimized.GetValue()
+        wx.PostEvent(self.root, ResultEvent("solver_ok" if solver_status else "solver_error", self.engine))
 
     def fill_combos(self):
 
@@ -350,9 +350,13 @@ class WxPanelPoleZero(wx.Panel):
     def evt_slider(self, event):
         if self.sel_col != 0:
             rp = self.roundpos / math.pow(10, self.decade)
-            self.my_grid.SetCellValue(self.sel_row, self.sel_col, num2eng(
-                round(rp * self.sign * math.pow(10,
-                                                self.decade + self.slider.GetValue() / self.nticks)) / rp))
+            val = round(rp * self.sign * math.pow(10, self.decade + self.slider.GetValue() / self.nticks)) / rp
+            self.my_grid.SetCellValue(self.sel_row, self.sel_col, num2eng(val))
+
+            # Redraw only the target while dragging, the full update is done when the slider is released
+            if self.sel_row < len(self.root.app_state.pztable):
+                self.root.app_state.pztable[self.sel_row][self.sel_col] = val
+                self.root.update_target_plot()
 
     def evt_release_slider(self, event):
         self.set_slider()
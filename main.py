@@ -5,6 +5,7 @@ from WxMainWindow import WxMainWindow
 from Engine import Engine
 from AppState import AppState
 from RunTests import run_test
+from Batch import expand_statefiles, run_batch, run_sweep
 
 import argparse
 
@@ -16,16 +17,27 @@ if __name__ == '__main__':
     arg_parser.add_argument('-b', '--batch', help='Run in batch mode without GUI', action='store_true')
     arg_parser.add_argument('-t', '--test', help='Run tests', action='store_true')
     arg_parser.add_argument('-v', '--verbose', help='Print all debug messages', action='store_true')
-    arg_parser.add_argument('statefile', nargs="?", default="", help='Load state from JSON file (default: ./state.json)')
+    arg_parser.add_argument('-j', '--jobs', help='Number of parallel jobs in batch mode (default: one per CPU core)',
+                            type=int, default=0)
+    arg_parser.add_argument('-s', '--sensitivity', help='Print the sensitivities of the optimized circuit in batch mode',
+                            action='store_true')
+    arg_parser.add_argument('--timings', help='Print the time spent in each phase of the engine in batch mode',
+                            action='store_true')
+    arg_parser.add_argument('--solve-timeout', help='Solve in a child process, killed after this many seconds in '
+                                                    'batch mode (default: 0, no child process)', type=float, default=0)
+    arg_parser.add_argument('-o', '--output', help='Write batch results as JSON lines to this file', default="")
+    arg_parser.add_argument('statefile', nargs="*", default=[],
+                            help='Load state from JSON file (default: ./state.json). '
+                                 'Batch mode accepts several files or glob patterns')
     args = arg_parser.parse_args()
 
     if args.test:
         print("Running tests...")
-        if args.statefile == "":
+        if len(args.statefile) == 0:
             tests = ["simplerc1", "simplerc2", "group2", "transformer", "pdsm1", "pdsm2", "pdsm3", "pdsm4",
                      "inductor", "esource", "gsource", "fsource", "hsource", "opamp"]
         else:
-            tests = [args.statefile]
+            tests = args.statefile
         for test in tests:
             print("Running test: " + test + "... ", end="")
             error = run_test(test, enable_plot=args.verbose, debug=args.verbose)
@@ -41,14 +53,25 @@ if __name__ == '__main__':
         app_state._batch_mode = args.batch
 
         if args.batch:
-            if args.statefile == "":
+            statefiles = expand_statefiles(args.statefile)
+
+            if len(statefiles) == 0:
                 print("State file required for batch mode")
                 exit()
+            elif len(statefiles) > 1 or args.output:
+                # Many state files: run them in parallel, results as JSON lines
+                sys.exit(run_batch(statefiles, jobs=args.jobs, output=args.output, debug=args.verbose,
+                                   solve_timeout=args.solve_timeout))
             else:
+                statefile = statefiles[0]
                 try:
-                    app_state.load(args.statefile)
+                    app_state.load(statefile)
+
+                    print("Loaded statefile '%s'." % statefile)
 
-                    print("Loaded statefile '%s'." % args.statefile)
+                    if args.solve_timeout > 0:
+                        app_state.solve_isolated = True
+                        app_state.solve_timeout = args.solve_timeout
 
                     def engine_callback(s, event_type):
                         pass
@@ -63,20 +86,39 @@ if __name__ == '__main__':
                         # Parser completed successfully, call solver
                         solver_status = engine.solve()
 
+                        if solver_status and app_state.sweep:
+                            # Parameter sweep instead of optimization
+                            sweep_result = run_sweep(engine, statefile)
+                            if sweep_result is None:
+                                print("Sweep error: " + engine.status_msg)
+                                sys.exit(3)
+                            print("Sweep of {1} points saved to '{0}'".format(*sweep_result))
+                            sys.exit(0)
+
                         if solver_status:
                             # Solver completed successfully
                             # Call optimizer
                             optimize_status = engine.optimize()
 
                             if optimize_status:
+                                app_state.netlist_optimized = engine.generate(engine.optimized_vals)
                                 print("Optimization finished")
                                 print()
+                                if engine.multistart_results is not None:
+                                    print("Multi-start results:")
+                                    print(engine.multistart_table())
                                 print("Original netlist:")
                                 print(app_state.netlist)
                                 print()
                                 print("Optimized netlist:")
                                 print(app_state.netlist_optimized)
                                 print()
+                                if args.sensitivity and engine.sensitivity(engine.optimized_vals) is not None:
+                                    print("Sensitivities:")
+                                    print(engine.sens_result["table"])
+                                if args.timings:
+                                    print("Timings:")
+                                    print(engine.timings.table())
                                 sys.exit(0)
                             else:
                                 print("Optimization error.")
@@ -92,16 +134,16 @@ if __name__ == '__main__':
                         sys.exit(1)
 
                 except IOError:
-                    print("Cannot open file '%s'." % args.statefile)
+                    print("Cannot open file '%s'." % statefile)
                     sys.exit(1)
         else:
             print("Starting WxWidgets version: " + str(wx.version()))
 
-            if args.statefile == "":
+            if len(args.statefile) == 0:
                 print("State file not specified, trying to load state.json")
                 file_path = "state.json"
             else:
-                file_path = args.statefile
+                file_path = args.statefile[0]
 
             try:
                 app_state.load(file_path)
@@ -112,7 +154,7 @@ if __name__ == '__main__':
                 print("Cannot open file '%s'." % file_path)
 
                 # Exit if user specified file is not found
-                if args.statefile == "":
+                if len(args.statefile) == 0:
                     print("Using built-in defaults")
                 else:
                     exit()
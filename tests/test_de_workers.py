@@ -0,0 +1,35 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+
+from AppState import AppState
+from Engine import Engine
+
+NETLIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_netlists")
+
+
+def run_de(de_workers: int):
+    # The numeric solver cannot evaluate the population at once, so de_workers is used
+    app_state = AppState()
+    app_state.load(os.path.join(NETLIST_DIR, "simplerc2.json"))
+    app_state.solver_mode = "numeric"
+    app_state.de_workers = de_workers
+
+    engine = Engine(app_state, lambda engine, event_type: None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert engine.parse(app_state.netlist)
+        assert engine.solve()
+        engine.prepare_optimize()
+        return engine.run_differential_evolution(seed=1)
+
+
+def test_de_workers_same_result():
+    serial = run_de(1)
+
+    for _ in range(3):
+        parallel = run_de(2)
+        assert parallel.nfev == serial.nfev
+        np.testing.assert_array_equal(parallel.x, serial.x)
+        assert parallel.fun == serial.fun
@@ -0,0 +1,36 @@
+import contextlib
+import io
+import os
+
+from AppState import AppState
+from Engine import Engine
+
+NETLIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_netlists")
+
+
+def solve(solve_isolated: bool):
+    # Fixed elements and expressions are substituted before solving, then the system is simplified
+    app_state = AppState()
+    app_state.load(os.path.join(NETLIST_DIR, "simplerc2.json"))
+    app_state.netlist = app_state.netlist.replace("R1 1 2 10K", "R1 1 2 10K*").replace("C2 out 0 1p", "C2 out 0 {C1/10}")
+    app_state.solver_mode = "symbolic"
+    app_state.subs_before_solve = True
+    app_state.solve_isolated = solve_isolated
+
+    engine = Engine(app_state, lambda engine, event_type: None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert engine.parse(app_state.netlist)
+        assert engine.solve()
+    return engine
+
+
+def test_isolated_solve_same_system():
+    in_process = solve(False)
+    isolated = solve(True)
+
+    # The solve cache key and the last solved system are the simplified ones in both modes
+    assert isolated.last_A_solved == in_process.last_A_solved
+    assert isolated.last_M_solved == in_process.last_M_solved
+    assert isolated.solve_cache.get_key(isolated.last_A_solved, isolated.last_M_solved, True, False) == \
+        in_process.solve_cache.get_key(in_process.last_A_solved, in_process.last_M_solved, True, False)
+    assert isolated.X == in_process.X
@@ -0,0 +1,22 @@
+import sympy as sp
+
+from SolveCost import COEFFS, predict_solve_time, system_features
+
+
+def test_coefficients_not_negative():
+    for key, c in COEFFS.items():
+        if key != "const":
+            assert c >= 0, key
+
+
+def test_more_fill_not_faster():
+    R1, R2, C1, s = sp.symbols("R1 R2 C1 s")
+    A = sp.Matrix([[1 / R1, -1 / R1, 0], [-1 / R1, 1 / R1 + 1 / R2 + s * C1, -1 / R2], [0, -1 / R2, 1 / R2]])
+    features = system_features(A, sp.Matrix([1, 0, 0]))
+
+    # Each feature alone, fill included, never lowers the predicted time when it grows
+    for key in ("ops", "syms", "fill", "nonpoly"):
+        bigger = dict(features)
+        for step in (1, 10, 100):
+            bigger[key] = features[key] + step
+            assert predict_solve_time(bigger) >= predict_solve_time(features), key